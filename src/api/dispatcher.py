@@ -1,23 +1,120 @@
+import asyncio
 import json
+import time
 import uuid
 
-from fastapi import APIRouter, HTTPException
+from typing import Optional
 
-from config.application import service
-from models import Conversation
-from schemas import DispatchSchema, MessageSchema
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from config.application import manager, service
+from models import Conversation, ConversationMessage, DispatchJob
+from schemas import DispatchBatchConfig, DispatchBatchSchema, DispatchSchema, MessageSchema
+from services import DISPATCHER, ConversationService, conversation_summaries
 from utils import *
 
 router: APIRouter = APIRouter(
     tags=['DispatcherBot API']
 )
 
+CONVERSATIONS_TOPIC: str = 'conversations'
+
+
+async def publish_event(topic, event: str, client: Optional[str] = None, **data) -> None:
+    """
+    Sends the event to WebSocket clients subscribed to the topic, only to the
+    given client if provided.
+    """
+
+    await manager.publish(str(topic), json.dumps({'event': event, 'topic': str(topic), **data}, default=str), client=client)
+
+
+async def authorize_topic(client: Optional[str], topic: str) -> bool:
+    """
+    Conversation topics can be subscribed only by the client which started
+    the conversation, conversations without a client are open to everyone.
+    """
+
+    try:
+        id_conversation: uuid.UUID = uuid.UUID(topic)
+    except ValueError:
+        return True
+
+    owners: list = await Conversation.filter(id=id_conversation).values_list('client', flat=True)
+    return not owners or owners[0] in (None, client)
+
+
+manager.authorize = authorize_topic
+
 
 @router.get('/cities')
 async def get_cities():
     return await get_available_cities()
 
 
+@router.get('/pool')
+async def get_pool_stats():
+    return data_source.stats()
+
+
+@router.get('/database')
+async def get_database_stats():
+    return database_stats()
+
+
+@router.get('/websockets')
+async def get_websocket_stats():
+    return manager.stats()
+
+
+@router.get('/sync')
+async def get_sync_stats():
+    return data_sync.stats()
+
+
+@router.post('/sync')
+async def sync_data(full: bool = False):
+    return {
+        'transferred': await data_sync.sync_all(full=full)
+    }
+
+
+@router.get('/admission')
+async def get_admission_stats():
+    return admission.stats()
+
+
+@router.get('/llm')
+async def get_llm_stats():
+    return {
+        **llm.stats(),
+        'prompts': prompts.stats(),
+        'fast_path': fast_path.stats(),
+        'conversations': conversation_summaries.stats()
+    }
+
+
+@router.get('/cache')
+async def get_cache():
+    return {
+        'stats': data_cache.stats(),
+        'entries': data_cache.entries(),
+        'partner_index': partner_index.stats(),
+        'conversations': conversation_cache.stats(),
+        'options': option_cache.stats(),
+        'events': event_bus.stats()
+    }
+
+
+@router.delete('/cache')
+async def invalidate_cache(key: Optional[str] = None):
+    return {
+        'invalidated': data_cache.invalidate(key=key)
+    }
+
+
 def extract_json(response):
     response = response.replace('\n', '')
 
@@ -26,176 +123,377 @@ def extract_json(response):
     return json.loads(response[json_start:json_end + 1])
 
 
-@router.post('')
-async def start_an_order(payload: DispatchSchema):
-    load_city = payload.load_address.city
-    load_country = payload.load_address.country
-
-    unload_city = payload.unload_address.city
-    unload_country = payload.unload_address.country
-
-    def get_transports_by_supplier(supplier_id, transports):
-        return [transport for transport in transports if transport['supplierId'] == supplier_id]
-
-    transport_list: list[dict] = await get_transport_history()
-    partner_list: list[dict] = await get_partners()
-    partners_string: str = ''
-    partners: dict = dict()
-    for partner in partner_list:
-        partners[partner['id']] = {
-            'city': partner['address']['city'],
-            'country': partner['address']['country'],
-            'name': partner['name'],
-            'language': partner['language'],
-            'transports': [
-                {
-                    'load_city': transport['loadingAddress']['city'],
-                    'load_country': transport['loadingAddress']['country'],
-                    'unload_city': transport['unloadingAddress']['city'],
-                    'unload_country': transport['unloadingAddress']['country'],
-                    'price': transport['price'],
-                    'performance_score': transport['performanceScore']
-                } for transport in get_transports_by_supplier(partner['id'], transport_list)
-            ]
-        }
+@router.post('/ranking')
+async def get_ranking(payload: DispatchSchema, top_k: Optional[int] = Query(None, ge=1)):
+    index: PartnerIndex = await get_partner_index()
+    return ranker.rank(
+        index=index,
+        load_city=payload.load_address.city,
+        load_country=payload.load_address.country,
+        unload_city=payload.unload_address.city,
+        unload_country=payload.unload_address.country,
+        top_k=top_k
+    )
+
 
-    response_format: str = '{"partner_name": "...", "reason_why_you_choose_this_partner": "...", "minimal_price": "...", "direct_message": "...", "partner_language"}'
-    prompt: str = (
-        'You are a dispatcher for logistics company "Gruber Logistics"'
-        f'Partners data: {partners}\n'
-
-        f'Your task is next:'
-        f'Introduce yourself to a chat partner'
-        f'We have a request to load goods in {load_city}, {load_country} and transport it to {unload_city}, {unload_country},'
-        f'Good access is to go with partner from same city or country from loading location'
-        f'find a best suitable partner and price from provided data, '
-        f'you have a history of every partner their longitude and latitude and other specific data, '
-        f'do the calculations which partner will give a best possible results. '
-        f'Also you have to make a direct message to a partner in their language and offer them the job. Price is provided to you, '
-        f'but you can calculate minimum price with 5% profit on this job.'
-        f'You have to give thus answers '
-        f'partner_name(name of the choosen partner),'
-        f'reason_why_you_choose_this_partner(describe by which params you choosed partner),'
-        f'minimal_price(minimal price for a job, do not display it)'
-        f'direct_message(direct message to a partner in native language of the partner, which contains job offer set a price of job to be {payload.price} Euros)'
-        f'partner_language(language of the partner)'
-        f'Please give an output in JSON format({response_format})'
+@router.get('/lanes')
+async def get_lanes(
+        load_city: Optional[str] = None,
+        load_country: Optional[str] = None,
+        unload_city: Optional[str] = None,
+        unload_country: Optional[str] = None,
+        min_count: int = 0,
+        limit: int = 100
+):
+    index: PartnerIndex = await get_partner_index()
+    return index.lanes.query(
+        load_city=load_city,
+        load_country=load_country,
+        unload_city=unload_city,
+        unload_country=unload_country,
+        min_count=min_count,
+        limit=limit
     )
-    response_message = await set_task_gemini(
-        message=prompt
+
+
+def route(payload: DispatchSchema) -> dict:
+    return {
+        'load_city': payload.load_address.city,
+        'load_country': payload.load_address.country,
+        'unload_city': payload.unload_address.city,
+        'unload_country': payload.unload_address.country
+    }
+
+
+class Dispatch:
+    """
+    Prompt choosing the partner for the order from the ranked candidates,
+    and the conversation with the partner built from the answer.
+    """
+
+    def __init__(self, index: PartnerIndex, payload: DispatchSchema, candidates: list[dict]):
+        self.route: dict = route(payload)
+        self.prices: dict = index.lanes.prices(price=payload.price, **self.route)
+        self.prompt: str = prompts.dispatch(
+            index=index,
+            candidates=candidates,
+            target_price=self.prices['target_price'],
+            **self.route
+        )
+
+    def answer(self, response_message: str) -> tuple[dict, dict]:
+        """
+        Parses the chosen partner from the answer.
+
+        :param response_message: Answer of the LLM.
+        :return: Chosen partner with the message, and arguments starting the conversation.
+        """
+
+        response = extract_json(response_message)
+
+        context = dict()
+
+        context['partner_name'] = [response['partner_name']]
+        context['minimal_price'] = self.prices['minimal_price']
+        context['target_price'] = self.prices['target_price']
+        context['price_statistics'] = self.prices['statistics']
+        response.pop('minimal_price', None)
+        context['reason_why_you_choose_this_partner'] = [response['reason_why_you_choose_this_partner']]
+        context['partner_language'] = response['partner_language']
+
+        return response, {
+            'context': context,
+            'offer': response['direct_message'],
+            'price': self.prices['target_price'],
+            'prompt_tokens': prompts.estimate_tokens(self.prompt)
+        }
+
+
+async def choose_partner(index: PartnerIndex, payload: DispatchSchema, candidates: list[dict]) -> tuple[dict, dict]:
+    _dispatch: Dispatch = Dispatch(index, payload, candidates)
+
+    response_message = await llm.generate(
+        prompt=_dispatch.prompt,
+        cache='start_an_order'
     )
+    return _dispatch.answer(response_message)
 
-    response = extract_json(response_message)
 
-    context = dict()
+async def conversation_started(conversation: Conversation, response: dict) -> None:
+    """
+    Tells the client which started the conversation about it, conversations
+    started by queued jobs are reported by job_finished instead.
+    """
 
-    context['partner_name'] = [response['partner_name']]
-    context['minimal_price'] = response['minimal_price']
+    if conversation.client is None:
+        return
 
-    try:
-        if float(context['minimal_price']) > payload.price:
-            payload.price = context['minimal_price']
-    except Exception as e:
-        ...
-    context['target_price'] = payload.price
-    del response['minimal_price']
-    context['reason_why_you_choose_this_partner'] = [response['reason_why_you_choose_this_partner']]
-    context['direct_message'] = [response['direct_message']]
-    context['partner_language'] = response['partner_language']
-
-    conversation: Conversation = await Conversation.create(
-        context=context
+    await publish_event(
+        CONVERSATIONS_TOPIC,
+        'conversation_started',
+        client=conversation.client,
+        id_conversation=conversation.id,
+        partner_name=response['partner_name']
     )
 
+
+async def dispatch(payload: DispatchSchema, client: Optional[str] = None) -> dict:
+    """
+    Picks the partner for the order, generates the first message and starts
+    the conversation with the partner.
+
+    :param payload: Order to dispatch.
+    :param client: Client which started the order, only it can follow the conversation.
+    :return: Chosen partner with the message and ID of the conversation.
+    """
+
+    index: PartnerIndex = await get_partner_index()
+    candidates: list[dict] = ranker.rank(index=index, **route(payload))
+    response, start = await choose_partner(index, payload, candidates)
+
+    conversation: Conversation = await ConversationService().start(**start, client=client)
+    await conversation_started(conversation, response)
+
     response['id_conversation'] = conversation.id
     return response
 
 
-@router.patch('')
-async def send_message(payload: MessageSchema):
-    conversation = await Conversation.filter(id=payload.id_conversation).get_or_none()
-
-    if 'deal' and 'done' in payload.message.lower():
-        prompt = (
-            'You are having a conversation with the partner, you are negotiating about job specifications,'
-            f'This is a context from previous message: We(You) sent an offer:'
-            f'Context: {conversation.context},'
-            f'Consider previous messages sent by customer {conversation.context["partner_messages"]}'
-            f'Name of the choosen partner is: {conversation.context["partner_name"]}'
-            f'Write in this language: {conversation.context["partner_language"]}'
-            f'Please just close a real on a polite way positivly.'
-        )
-        response_message = await set_task_gemini(
-            message=prompt
-        )
-        return {
-            'message': response_message
-        }
+@router.post('')
+async def start_an_order(payload: DispatchSchema, request: Request):
+    client: Optional[str] = admission.client(request)
+    async with admission.slot(START_AN_ORDER, client):
+        return await dispatch(payload, client)
+
+
+@router.post('/batch')
+async def start_orders(payload: DispatchBatchSchema, request: Request):
+    """
+    Starts an order for every order of the batch. Partner data is indexed and
+    candidates of all orders are ranked at once, LLM calls run concurrently
+    up to the configured limit. Results are streamed as NDJSON lines as the
+    orders finish, with the position of the order in the batch, conversations
+    of the orders finished together are stored with a single INSERT.
+    """
+
+    index: PartnerIndex = await get_partner_index()
+    rankings: list[list[dict]] = ranker.rank_many(index, [route(order) for order in payload.orders])
+    client: Optional[str] = admission.client(request)
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(DispatchBatchConfig().concurrency)
+
+    async def choose(position: int) -> tuple[int, Optional[tuple[dict, dict]], Optional[str]]:
+        try:
+            async with semaphore, admission.slot(START_AN_ORDER):
+                return position, await choose_partner(index, payload.orders[position], rankings[position]), None
+        except HTTPException as e:
+            return position, None, str(e.detail)
+        except Exception as e:
+            return position, None, str(e) or type(e).__name__
+
+    async def results():
+        pending: set = {asyncio.create_task(choose(position)) for position in range(len(payload.orders))}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished: list = sorted((task.result() for task in done), key=lambda result: result[0])
+                chosen: list = [(position, choice) for position, choice, _ in finished if choice is not None]
+
+                conversations: list[Conversation] = await ConversationService().start_many(
+                    [{**start, 'client': client} for _, (_, start) in chosen]
+                )
+                for (position, (response, _)), conversation in zip(chosen, conversations):
+                    await conversation_started(conversation, response)
+                    yield json.dumps({'order': position, **response, 'id_conversation': conversation.id}, default=str) + '\n'
+
+                for position, _, error in finished:
+                    if error is not None:
+                        yield json.dumps({'order': position, 'error': error}) + '\n'
+        finally:
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type='application/x-ndjson')
+
+
+def job_status(job: DispatchJob) -> dict:
+    return {
+        'id_job': job.id,
+        'status': job.status,
+        'result': job.result,
+        'error': job.error,
+        'attempts': job.attempts,
+        'enqueued': job.enqueued,
+        'started': job.started,
+        'finished': job.finished
+    }
+
+
+async def run_job(payload: dict) -> dict:
+    return await dispatch(DispatchSchema(**payload))
+
+
+async def job_finished(job: DispatchJob) -> None:
+    await publish_event(job.id, 'job_finished', **job_status(job))
+
+
+@router.post('/jobs', status_code=202)
+async def enqueue_an_order(payload: DispatchSchema):
+    """
+    Same as POST /api/dispatcher, but the order is only validated and queued.
+    Status of the job is returned by GET /api/dispatcher/jobs/{id_job}, and
+    a job_finished event is sent to WebSocket clients subscribed to the job ID.
+    """
+
+    job: DispatchJob = await job_queue.enqueue(payload.dict())
+    return job_status(job)
 
-    if conversation.number_of_received_messages >= 5:
-        raise HTTPException(status_code=406, detail="I'am tired... Please just go away...")
 
-    context = conversation.context
+@router.get('/jobs/stats')
+async def get_job_stats():
+    return job_queue.stats()
 
-    partner_messages = context.get('partner_messages', [])
-    partner_messages.append(payload.message)
 
+@router.get('/jobs/{id_job}')
+async def get_job(id_job: uuid.UUID):
+    job: Optional[DispatchJob] = await DispatchJob.get_or_none(id=id_job)
+    if job is None:
+        raise HTTPException(detail='Job not found', status_code=404)
+    return job_status(job)
 
-    intro: str = (
-        f'You are chating with partner, you are dispatcher at Gruber Logistics'
-        f'You already sent him a offer message and i provide some data from that message to,'
-        f'partner name is {context["partner_name"]}'
-        f'partner language is {context["partner_language"]}'
-        f'messages you already sent to them {context["direct_message"]}'
-        f'messages that you received from them {partner_messages}'
+
+class Negotiation:
+    """
+    Reply to the partner message. Unambiguous messages are answered right away
+    by the fast path, for the others there's a prompt built from the conversation
+    summary and the latest window of conversation messages.
+    """
+
+    def __init__(self, conversations: ConversationService, conversation: Conversation, messages: list[ConversationMessage], message: str):
+        self.conversation: Conversation = conversation
+        self.message: str = message
+        self.prompt: Optional[str] = None
+        self.reply: Optional[str] = None
+
+        self.save: bool = True
+        closing: bool = 'deal' and 'done' in message.lower()
+        if closing:
+            self.save = False
+        elif conversation.number_of_received_messages >= 5:
+            raise HTTPException(status_code=406, detail="I'am tired... Please just go away...")
+
+        last_offer: Optional[float] = next(
+            (m.price for m in reversed(messages) if m.role == DISPATCHER and m.price), None
         )
-    prompt: str = (
-        'You are having a conversation with the partner, you are negotiating about job specifications,'
-        f'This is a context from previous message: We(You) sent an offer:'
-        f'Context: {conversation.context},'
-        f'Consider previous messages sent by customer {partner_messages}'
-        f'Name of the choosen partner is: {context["partner_name"]}'
-        f'Your task is next:'
-        f'partner sent next message to us: {partner_messages}'
-        f'If partner agrees on our price, dont send offers no more, dont change price, just send him a nice message about how pleasuare are you for working with them'
-        f'Keep the conversation with the partner, if he want to talk about price'
-        f'Never give a price that is greater than that one that partner offered.'
-        f'If the offered price is not fair dont go further in negotiating '
-        f'you have minimal price: {context["minimal_price"]} and target price: {context["target_price"]},'
-        f'you can change price as long as it is greater than minimal price plus 40% but dont tell that to partner,'
-        f'when you are negotiating about price you increase gradually price.'
-        f'if the price satisfy condition than you can make a deal, dont ask for a load and unload date!'
-        f'if partner agrees on our offer just close deal as positive and dont offer change price anymore!!!!'
-        f'Respond to me just like basic sales man in {context["partner_language"]} language. '
-    )
-    negotiate_prompt: str = (
-        f'Those are some rules for negotiating:'
-        f' - Most important is to try to negotiate like a human being, you cannot specify why are you doing what you are doing!'
-        f' - Be precise!'
-        f' - Ideal Price: The price you’d prefer to achieve in our case is {context["target_price"]} Euros.'
-        f' - Minimum Price: The lowest acceptable price in our case is {context["minimal_price"]}'
-        f' - Starting Offer: Set as slightly above your ideal price, allowing room for negotiation.'
-        f' -The model can make an initial offer, wait for a response, and then adjust based on the counteroffer received. The response logic could look like this'
-        f'- Counteroffer Lower than Minimum Price: Politely state that it’s below the acceptable range, and suggest a higher price close to the minimum.'
-        f'- Counteroffer Close to Ideal Price: Accept or make a minor concession to reach the final agreement.'
-        f'- Counteroffer Between Ideal and Minimum: Reduce the offer slightly, aiming for an agreeable middle ground.'
-        f'- Opening Line: “We’re looking to offer you a high-quality service at a fair price, ideally around {context["target_price"]}“'
+        decision: Optional[Decision] = fast_path.decide(conversation.context, message, last_offer)
+        if decision is not None:
+            self.reply = decision.reply
+        elif closing:
+            self.prompt = prompts.closing(
+                conversation.context,
+                conversations.history(messages),
+                summary=conversation.summary,
+                budget=conversations.conf.token_budget
+            )
+        else:
+            self.prompt = prompts.negotiation(
+                conversation.context,
+                conversations.history(messages, message),
+                summary=conversation.summary,
+                budget=conversations.conf.token_budget
+            )
+
+
+async def negotiation(payload: MessageSchema) -> Negotiation:
+    conversations: ConversationService = ConversationService()
+    conversation: Conversation = await conversations.single(payload.id_conversation)
+    messages: list[ConversationMessage] = await conversations.unsummarized(conversation)
+
+    return Negotiation(conversations, conversation, messages, payload.message)
+
+
+async def save_reply(negotiation: Negotiation, reply: str) -> None:
+    if negotiation.save:
+        await ConversationService().reply(
+            conversation=negotiation.conversation,
+            message=negotiation.message,
+            reply=reply,
+            prompt_tokens=prompts.estimate_tokens(negotiation.prompt) if negotiation.prompt else None
+        )
+
+    await publish_event(
+        negotiation.conversation.id,
+        'message',
+        client=negotiation.conversation.client,
+        message=negotiation.message,
+        reply=reply
     )
 
 
-    prompt: str = intro + negotiate_prompt
-    response_message = await set_task_gemini(
-        message=prompt
-    )
+@router.patch('')
+async def send_message(payload: MessageSchema, request: Request):
+    _negotiation: Negotiation = await negotiation(payload)
 
-    context['partner_messages'] = partner_messages
-    context['direct_message'].append(response_message)
-    conversation.context = context
-    await conversation.save()
+    response_message: Optional[str] = _negotiation.reply
+    if response_message is None:
+        async with admission.slot(SEND_MESSAGE, admission.client(request)):
+            start: float = time.perf_counter()
+            response_message = await llm.generate(
+                prompt=_negotiation.prompt,
+                cache='send_message'
+            )
+            fast_path.record_llm(time.perf_counter() - start)
+
+    await save_reply(_negotiation, response_message)
 
     return {
         'message': response_message
     }
 
 
+@router.patch('/stream')
+async def stream_message(payload: MessageSchema, request: Request):
+    """
+    Same as PATCH /api/dispatcher, but the reply is pushed as Server-Sent Events
+    while it's generated. Every chunk is sent as a data event and the whole reply
+    is sent as a done event, after it's saved to the conversation.
+    """
+
+    _negotiation: Negotiation = await negotiation(payload)
+    if _negotiation.reply is not None:
+        async def answer():
+            yield f'data: {json.dumps({"token": _negotiation.reply})}\n\n'
+            await save_reply(_negotiation, _negotiation.reply)
+            yield f'event: done\ndata: {json.dumps({"message": _negotiation.reply})}\n\n'
+
+        return StreamingResponse(answer(), media_type='text/event-stream')
+
+    release = await admission.hold(SEND_MESSAGE, admission.client(request))
+
+    async def events():
+        chunks: list[str] = []
+        try:
+            start: float = time.perf_counter()
+            async for chunk in llm.stream(prompt=_negotiation.prompt):
+                chunks.append(chunk)
+                yield f'data: {json.dumps({"token": chunk})}\n\n'
+            fast_path.record_llm(time.perf_counter() - start)
+        except HTTPException as e:
+            yield f'event: error\ndata: {json.dumps({"detail": e.detail})}\n\n'
+            return
+        except Exception as e:
+            yield f'event: error\ndata: {json.dumps({"detail": str(e) or type(e).__name__})}\n\n'
+            return
+        finally:
+            release()
+
+        response_message: str = ''.join(chunks)
+        await save_reply(_negotiation, response_message)
+
+        yield f'event: done\ndata: {json.dumps({"message": response_message})}\n\n'
+
+    return StreamingResponse(events(), media_type='text/event-stream', background=BackgroundTask(release))
+
+
+job_queue.handler = run_job
+job_queue.listener = job_finished
+
 service.include_router(router, prefix='/api/dispatcher')
@@ -2,19 +2,37 @@ from fastapi import Depends
 from typing import Dict, Optional, Any, AnyStr
 
 from config.application import service as app
-from services import OptionService
+from services import OptionService, BY_KEY
 from schemas import OptionCreateModel, OptionResponseModel, OptionsResponseModel, OptionUpdateRequestModel
+from schemas import OptionBulkDeleteModel, OptionBulkResponseModel, OptionBulkUpsertModel
 
 from config.application import manager, WebSocket, WebSocketDisconnect
 from fastapi import APIRouter, FastAPI
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
 
 
 @router.get('')
-async def get() -> Any:
+async def get(
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+        prefix: Optional[str] = None,
+        order: str = BY_KEY,
+        format: Optional[str] = None
+) -> Any:
+    """
+    Options ordered by key or by (created, id), page by page. Cursor of the
+    next page is returned as next and passed back as after. Without limit and
+    after all matching options are returned at once. With format=ndjson all
+    matching options are streamed one JSON object per line.
+    """
+
     service: OptionService = OptionService()
-    return await service.get()
+    if format == 'ndjson':
+        return StreamingResponse(service.export(prefix=prefix), media_type='application/x-ndjson')
+
+    return await service.get(limit=limit, after=after, prefix=prefix, order=order)
 
 
 @router.post('', response_model=OptionResponseModel, status_code=201)
@@ -23,6 +41,18 @@ async def create(option: OptionCreateModel) -> OptionResponseModel:
     return await service.create(option=option)
 
 
+@router.post('/bulk', response_model=OptionBulkResponseModel, status_code=200)
+async def bulk_upsert(request: OptionBulkUpsertModel) -> OptionBulkResponseModel:
+    service: OptionService = OptionService()
+    return await service.bulk_upsert(options=request.options)
+
+
+@router.post('/bulk/delete', response_model=OptionBulkResponseModel, status_code=200)
+async def bulk_delete(request: OptionBulkDeleteModel) -> OptionBulkResponseModel:
+    service: OptionService = OptionService()
+    return await service.bulk_delete(keys=request.keys)
+
+
 @router.get('/{key}', response_model=OptionResponseModel, status_code=200)
 async def single(key: AnyStr) -> OptionResponseModel:
     service: OptionService = OptionService()
@@ -2,10 +2,21 @@ import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, APIRouter
 import asyncpg
-from tortoise import Tortoise
-from typing import AnyStr, Optional, Dict, List
+from tortoise import Tortoise, connections
+from tortoise.utils import generate_schema_for_client
+from typing import AnyStr, Awaitable, Callable, Optional, Dict, List
 
 from schemas import DatabaseConfig
+from services.conversation import conversation_summaries
+from utils.admission import admission
+from utils.conversation_cache import conversation_cache
+from utils.events import PostgresTransport, event_bus
+from utils.http import data_source
+from utils.jobs import job_queue
+from utils.llm import llm
+from utils.option_cache import option_cache
+from utils.sync import data_sync
+from utils.websocket import ConnectionManager
 
 _test: Optional[AnyStr] = os.getenv('TEST_MODE', None)
 _database_to_use: Optional[AnyStr] = os.getenv('TEST_DATABASE', None)
@@ -37,6 +48,10 @@ async def startup_event() -> None:
     :return: None
     """
 
+    await data_source.open()
+    await llm.open()
+    await conversation_cache.open()
+
     if isinstance(_test, str):
         return await test_startup_event()
 
@@ -45,11 +60,44 @@ async def startup_event() -> None:
     await _initialize_tortoise_models(
         conf=DATABASE
     )
+    await _open_event_bus(
+        conf=DATABASE
+    )
+    await data_sync.open()
+    await job_queue.open()
 
 
 async def shutdown_event() -> None:
+    """
+    Code which is executed before stopping application. Every step runs
+    even if an earlier one fails, the errors are raised together at the end.
+
+    :return: None
+    """
+
+    steps: List[Callable[[], Awaitable[None]]] = [
+        job_queue.close,
+        conversation_summaries.drain,
+        conversation_cache.close,
+        option_cache.close,
+        data_sync.close,
+        manager.close,
+        event_bus.close,
+        data_source.close,
+        llm.close
+    ]
     if isinstance(_test, str):
-        return await test_shutdown_event()
+        steps.append(test_shutdown_event)
+
+    errors: List[Exception] = []
+    for step in steps:
+        try:
+            await step()
+        except Exception as e:
+            errors.append(e)
+
+    if errors:
+        raise ExceptionGroup('Shutdown failed', errors)
 
 
 """ TEST MODE """
@@ -64,6 +112,9 @@ async def test_startup_event() -> None:
 
     if _database_to_use == 'sqlite':
         await _initialize_tortoise_models()
+        await _open_event_bus()
+        await data_sync.open()
+        await job_queue.open()
         return
 
     DATABASE: DatabaseConfig = DatabaseConfig(
@@ -77,6 +128,11 @@ async def test_startup_event() -> None:
     await _initialize_tortoise_models(
         conf=DATABASE
     )
+    await _open_event_bus(
+        conf=DATABASE
+    )
+    await data_sync.open()
+    await job_queue.open()
 
 
 async def test_shutdown_event() -> None:
@@ -146,42 +202,43 @@ async def _initialize_tortoise_models(conf: Optional[DatabaseConfig] = None) ->
         conf (Dict): Configuration dictionary containing database connection details.
     """
 
-    _url: AnyStr = f'sqlite://:memory:'
-    if conf:
-        _url: AnyStr = f'postgres://{conf.db_user}:{conf.db_password}@{conf.db_host}:{conf.db_port}/{conf.db_name}'
+    _modules: Dict = {
+        'models': ['models']
+    }
 
     try:
-        await Tortoise.init(
-            db_url=_url,
-            modules={
-                'models': ['models']
-            }
-        )
+        if conf:
+            await Tortoise.init(
+                config=conf.tortoise_config(modules=_modules)
+            )
+        else:
+            await Tortoise.init(
+                db_url='sqlite://:memory:',
+                modules=_modules
+            )
 
-        await Tortoise.generate_schemas()
+        await generate_schema_for_client(connections.get('default'), safe=True)
     except Exception:
         raise
 
     return
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+async def _open_event_bus(conf: Optional[DatabaseConfig] = None) -> None:
+    """
+    Opens the event bus, with Postgres LISTEN/NOTIFY if the database is
+    configured and in-process otherwise, with the caches invalidated through
+    it and WebSocket broadcasts.
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    :param conf: Database configuration.
+    :return: None
+    """
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+    await event_bus.open(
+        transport=PostgresTransport(conf) if conf else None
+    )
+    await option_cache.open()
+    await manager.open()
 
 
 manager = ConnectionManager()
@@ -195,10 +252,13 @@ service: FastAPI = get_service()
 
 @service.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await manager.connect(websocket)
+    await manager.connect(websocket, admission.client(websocket))
     try:
         while True:
             data = await websocket.receive_text()
+            if await manager.control(websocket, data):
+                continue
+
             await manager.send_personal_message(f"Message text was: {data}", websocket)
             await manager.broadcast(f"Client #{client_id} says: {data}")
     except WebSocketDisconnect:
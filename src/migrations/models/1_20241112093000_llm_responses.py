@@ -0,0 +1,21 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "llm_responses" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "key" VARCHAR(64) NOT NULL UNIQUE,
+    "provider" VARCHAR(32) NOT NULL,
+    "model" VARCHAR(64) NOT NULL,
+    "response" TEXT NOT NULL,
+    "expires" TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_llm_respons_expires_4a1b7c" ON "llm_responses" ("expires");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "llm_responses";"""
@@ -0,0 +1,43 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "conversations" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "context" JSONB,
+    "number_of_received_messages" INT NOT NULL  DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS "conversation_messages" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "sequence" INT NOT NULL,
+    "role" VARCHAR(16) NOT NULL,
+    "text" TEXT NOT NULL,
+    "price" DOUBLE PRECISION,
+    "tokens" INT NOT NULL  DEFAULT 0,
+    "prompt_tokens" INT,
+    "conversation_id" UUID NOT NULL REFERENCES "conversations" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_conversatio_convers_5d8e1a" UNIQUE ("conversation_id", "sequence")
+);
+INSERT INTO "conversation_messages" ("id", "conversation_id", "sequence", "role", "text", "created", "last_updated")
+SELECT gen_random_uuid(), "c"."id", ("m"."position" - 1) * 2, 'dispatcher', "m"."text", "c"."created", "c"."created"
+FROM "conversations" "c",
+     jsonb_array_elements_text(COALESCE("c"."context" -> 'direct_message', '[]'::jsonb)) WITH ORDINALITY "m"("text", "position")
+UNION ALL
+SELECT gen_random_uuid(), "c"."id", ("m"."position" - 1) * 2 + 1, 'partner', "m"."text", "c"."created", "c"."created"
+FROM "conversations" "c",
+     jsonb_array_elements_text(COALESCE("c"."context" -> 'partner_messages', '[]'::jsonb)) WITH ORDINALITY "m"("text", "position");
+UPDATE "conversations" SET "context" = "context" - 'direct_message' - 'partner_messages' WHERE "context" IS NOT NULL;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        UPDATE "conversations" "c" SET "context" = "c"."context" || jsonb_build_object(
+    'direct_message', COALESCE((SELECT jsonb_agg("m"."text" ORDER BY "m"."sequence") FROM "conversation_messages" "m" WHERE "m"."conversation_id" = "c"."id" AND "m"."role" = 'dispatcher'), '[]'::jsonb),
+    'partner_messages', COALESCE((SELECT jsonb_agg("m"."text" ORDER BY "m"."sequence") FROM "conversation_messages" "m" WHERE "m"."conversation_id" = "c"."id" AND "m"."role" = 'partner'), '[]'::jsonb)
+) WHERE "c"."context" IS NOT NULL;
+DROP TABLE IF EXISTS "conversation_messages";"""
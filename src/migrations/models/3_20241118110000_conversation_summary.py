@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "conversations" ADD "summary" TEXT;
+ALTER TABLE "conversations" ADD "summarized_sequence" INT NOT NULL  DEFAULT -1;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "conversations" DROP COLUMN "summary";
+ALTER TABLE "conversations" DROP COLUMN "summarized_sequence";"""
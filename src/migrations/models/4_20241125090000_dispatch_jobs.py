@@ -0,0 +1,25 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "dispatch_jobs" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "status" VARCHAR(16) NOT NULL,
+    "payload" JSONB NOT NULL,
+    "result" JSONB,
+    "error" TEXT,
+    "attempts" INT NOT NULL  DEFAULT 0,
+    "enqueued" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "started" TIMESTAMPTZ,
+    "finished" TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS "idx_dispatch_jo_status_6c1f0e" ON "dispatch_jobs" ("status");
+CREATE INDEX IF NOT EXISTS "idx_dispatch_jo_enqueue_4b7d2a" ON "dispatch_jobs" ("enqueued");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "dispatch_jobs";"""
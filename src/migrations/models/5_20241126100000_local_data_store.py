@@ -0,0 +1,64 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "suppliers" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "key" VARCHAR(255) NOT NULL UNIQUE,
+    "supplier_id" INT NOT NULL,
+    "name" VARCHAR(255),
+    "city" VARCHAR(128),
+    "country" VARCHAR(128),
+    "language" VARCHAR(64),
+    "data" JSONB NOT NULL,
+    "generation" INT NOT NULL  DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS "transports" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "key" VARCHAR(255) NOT NULL UNIQUE,
+    "supplier_id" INT,
+    "load_city" VARCHAR(128),
+    "load_country" VARCHAR(128),
+    "unload_city" VARCHAR(128),
+    "unload_country" VARCHAR(128),
+    "date" TIMESTAMPTZ,
+    "price" DOUBLE PRECISION,
+    "performance_score" DOUBLE PRECISION,
+    "data" JSONB NOT NULL,
+    "generation" INT NOT NULL  DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS "cities" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "key" VARCHAR(255) NOT NULL UNIQUE,
+    "city" VARCHAR(128),
+    "country" VARCHAR(128),
+    "data" JSONB NOT NULL,
+    "generation" INT NOT NULL  DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS "sync_state" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "source" VARCHAR(64) NOT NULL UNIQUE,
+    "etag" VARCHAR(255),
+    "watermark" TIMESTAMPTZ,
+    "generation" INT NOT NULL  DEFAULT 0,
+    "rows" INT NOT NULL  DEFAULT 0,
+    "synced" TIMESTAMPTZ,
+    "full_synced" TIMESTAMPTZ
+);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "sync_state";
+DROP TABLE IF EXISTS "cities";
+DROP TABLE IF EXISTS "transports";
+DROP TABLE IF EXISTS "suppliers";"""
@@ -15,6 +15,103 @@ class Base:
 class Conversation(Base, Model):
     context = fields.JSONField(null=True)
     number_of_received_messages = fields.IntField(default=0)
+    summary = fields.TextField(null=True)
+    summarized_sequence = fields.IntField(default=-1)
+    client = fields.CharField(max_length=255, null=True)
 
     class Meta:
         table = 'conversations'
+
+
+class LLMResponse(Base, Model):
+    key = fields.CharField(max_length=64, unique=True)
+    provider = fields.CharField(max_length=32)
+    model = fields.CharField(max_length=64)
+    response = fields.TextField()
+    expires = fields.DatetimeField(index=True)
+
+    class Meta:
+        table = 'llm_responses'
+
+
+class ConversationMessage(Base, Model):
+    conversation = fields.ForeignKeyField('models.Conversation', related_name='messages', on_delete=fields.CASCADE)
+    sequence = fields.IntField()
+    role = fields.CharField(max_length=16)
+    text = fields.TextField()
+    price = fields.FloatField(null=True)
+    tokens = fields.IntField(default=0)
+    prompt_tokens = fields.IntField(null=True)
+
+    class Meta:
+        table = 'conversation_messages'
+        unique_together = (('conversation', 'sequence'),)
+
+
+class DispatchJob(Base, Model):
+    status = fields.CharField(max_length=16, index=True)
+    payload = fields.JSONField()
+    result = fields.JSONField(null=True)
+    error = fields.TextField(null=True)
+    attempts = fields.IntField(default=0)
+    enqueued = fields.DatetimeField(auto_now_add=True, index=True)
+    started = fields.DatetimeField(null=True)
+    finished = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = 'dispatch_jobs'
+
+
+class Supplier(Base, Model):
+    key = fields.CharField(max_length=255, unique=True)
+    supplier_id = fields.IntField()
+    name = fields.CharField(max_length=255, null=True)
+    city = fields.CharField(max_length=128, null=True)
+    country = fields.CharField(max_length=128, null=True)
+    language = fields.CharField(max_length=64, null=True)
+    data = fields.JSONField()
+    generation = fields.IntField(default=0)
+
+    class Meta:
+        table = 'suppliers'
+
+
+class Transport(Base, Model):
+    key = fields.CharField(max_length=255, unique=True)
+    supplier_id = fields.IntField(null=True)
+    load_city = fields.CharField(max_length=128, null=True)
+    load_country = fields.CharField(max_length=128, null=True)
+    unload_city = fields.CharField(max_length=128, null=True)
+    unload_country = fields.CharField(max_length=128, null=True)
+    date = fields.DatetimeField(null=True)
+    price = fields.FloatField(null=True)
+    performance_score = fields.FloatField(null=True)
+    data = fields.JSONField()
+    generation = fields.IntField(default=0)
+
+    class Meta:
+        table = 'transports'
+
+
+class City(Base, Model):
+    key = fields.CharField(max_length=255, unique=True)
+    city = fields.CharField(max_length=128, null=True)
+    country = fields.CharField(max_length=128, null=True)
+    data = fields.JSONField()
+    generation = fields.IntField(default=0)
+
+    class Meta:
+        table = 'cities'
+
+
+class SyncState(Base, Model):
+    source = fields.CharField(max_length=64, unique=True)
+    etag = fields.CharField(max_length=255, null=True)
+    watermark = fields.DatetimeField(null=True)
+    generation = fields.IntField(default=0)
+    rows = fields.IntField(default=0)
+    synced = fields.DatetimeField(null=True)
+    full_synced = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = 'sync_state'
@@ -17,6 +17,17 @@ class DatabaseConfig(BaseModel):
         db_port (int): The port number for the database connection.
         db_host (str): The hostname or IP address of the database server.
         db_password (str): The password for the database user.
+        pool_min_size (int): Number of connections opened with the pool.
+        pool_max_size (int): Maximum number of connections in the pool.
+        pool_max_queries (int): Number of queries after which a connection is replaced.
+        max_inactive_connection_lifetime (float): Seconds after which an idle connection is closed.
+        statement_cache_size (int): Number of prepared statements cached per connection,
+                                    has to be 0 behind pgbouncer in transaction mode.
+        command_timeout (float): Default timeout of a single query in seconds.
+        connect_timeout (float): Timeout of opening a connection in seconds.
+        read_host (str): Host of a read-only connection used by read-heavy endpoints,
+                         all queries use the primary connection if not set.
+        read_pool_max_size (int): Maximum number of connections in the read-only pool.
     """
 
     db_name: AnyStr
@@ -25,6 +36,16 @@ class DatabaseConfig(BaseModel):
     db_user: AnyStr
     db_password: AnyStr
 
+    pool_min_size: int = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+    pool_max_size: int = int(os.getenv('DB_POOL_MAX_SIZE', 20))
+    pool_max_queries: int = int(os.getenv('DB_POOL_MAX_QUERIES', 50000))
+    max_inactive_connection_lifetime: float = float(os.getenv('DB_MAX_INACTIVE_CONNECTION_LIFETIME', 300.0))
+    statement_cache_size: int = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 1024))
+    command_timeout: float = float(os.getenv('DB_COMMAND_TIMEOUT', 30.0))
+    connect_timeout: float = float(os.getenv('DB_CONNECT_TIMEOUT', 10.0))
+    read_host: Optional[str] = os.getenv('DB_READ_HOST') or None
+    read_pool_max_size: int = int(os.getenv('DB_READ_POOL_MAX_SIZE', 10))
+
     def __init__(
             self,
             /,
@@ -83,3 +104,415 @@ class DatabaseConfig(BaseModel):
             _conf['db_name'] = 'test_' + _conf['db_name']
 
         return _conf
+
+    def credentials(self, read: bool = False) -> Dict:
+        """
+        Connection parameters passed to Tortoise and asyncpg pool.
+
+        :param read: Parameters of the read-only connection.
+        :return: Credentials of the connection.
+        """
+
+        credentials: Dict = {
+            'host': self.read_host if read else self.db_host,
+            'port': self.db_port,
+            'user': self.db_user,
+            'password': self.db_password,
+            'database': self.db_name,
+            'minsize': min(self.pool_min_size, self.read_pool_max_size) if read else self.pool_min_size,
+            'maxsize': self.read_pool_max_size if read else self.pool_max_size,
+            'max_queries': self.pool_max_queries,
+            'max_inactive_connection_lifetime': self.max_inactive_connection_lifetime,
+            'statement_cache_size': self.statement_cache_size,
+            'command_timeout': self.command_timeout,
+            'timeout': self.connect_timeout
+        }
+        if read:
+            credentials['server_settings'] = {'default_transaction_read_only': 'on'}
+
+        return credentials
+
+    def tortoise_config(self, modules: Dict) -> Dict:
+        connections: Dict = {
+            'default': {
+                'engine': 'tortoise.backends.asyncpg',
+                'credentials': self.credentials()
+            }
+        }
+        if self.read_host:
+            connections['read'] = {
+                'engine': 'tortoise.backends.asyncpg',
+                'credentials': self.credentials(read=True)
+            }
+
+        return {
+            'connections': connections,
+            'apps': {
+                name: {'models': models, 'default_connection': 'default'} for name, models in modules.items()
+            }
+        }
+
+
+class DataSourceConfig(BaseModel):
+    """
+    Configuration settings for the shared data source HTTP client.
+
+    Attributes:
+        base_url (str): Base url of the data source API.
+        max_connections (int): Maximum number of open connections in the pool.
+        max_keepalive_connections (int): Maximum number of idle connections kept alive.
+        keepalive_expiry (float): Seconds after which an idle connection is closed.
+        http2 (bool): Enables HTTP/2 for the data source connections.
+        timeout (float): Default request timeout in seconds.
+        endpoint_timeouts (Dict): Request timeout overrides per endpoint.
+        retries (int): Number of retries for failed requests.
+        backoff (float): Base delay in seconds for exponential retry backoff.
+    """
+
+    base_url: str = os.getenv('data_source_api_base_url') or ''
+    max_connections: int = int(os.getenv('DATA_SOURCE_MAX_CONNECTIONS', 20))
+    max_keepalive_connections: int = int(os.getenv('DATA_SOURCE_MAX_KEEPALIVE', 10))
+    keepalive_expiry: float = float(os.getenv('DATA_SOURCE_KEEPALIVE_EXPIRY', 30.0))
+    http2: bool = os.getenv('DATA_SOURCE_HTTP2', 'true').lower() == 'true'
+    timeout: float = float(os.getenv('DATA_SOURCE_TIMEOUT', 10.0))
+    endpoint_timeouts: Dict[str, float] = {
+        '/Transport/GetTransportHistory': float(os.getenv('DATA_SOURCE_TRANSPORTS_TIMEOUT', 30.0)),
+    }
+    retries: int = int(os.getenv('DATA_SOURCE_RETRIES', 2))
+    backoff: float = float(os.getenv('DATA_SOURCE_BACKOFF', 0.2))
+
+
+class CacheConfig(BaseModel):
+    """
+    Configuration settings for the data source response cache.
+
+    Attributes:
+        ttl (float): Default seconds for which cached data is considered fresh.
+        endpoint_ttls (Dict): Fresh period overrides per endpoint.
+        stale_ttl (float): Seconds after expiry for which stale data is still served
+                           while it's refreshed in background.
+        max_bytes (int): Upper bound of the cached payload sizes.
+    """
+
+    ttl: float = float(os.getenv('CACHE_TTL', 300.0))
+    endpoint_ttls: Dict[str, float] = {
+        '/Helper/GetAvailableCities': float(os.getenv('CACHE_CITIES_TTL', 3600.0)),
+        '/Supplier/GetAllSuppliers': float(os.getenv('CACHE_SUPPLIERS_TTL', 600.0)),
+        '/Transport/GetTransportHistory': float(os.getenv('CACHE_TRANSPORTS_TTL', 600.0)),
+    }
+    stale_ttl: float = float(os.getenv('CACHE_STALE_TTL', 3600.0))
+    max_bytes: int = int(os.getenv('CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+class RankingConfig(BaseModel):
+    """
+    Configuration settings for the partner pre-ranking.
+
+    Attributes:
+        top_k (int): Number of best ranked partners which are sent to the LLM.
+        weights (Dict): Weight of every scoring factor.
+    """
+
+    top_k: int = int(os.getenv('RANKING_TOP_K', 5))
+    weights: Dict[str, float] = {
+        'same_city': float(os.getenv('RANKING_WEIGHT_SAME_CITY', 3.0)),
+        'same_country': float(os.getenv('RANKING_WEIGHT_SAME_COUNTRY', 2.0)),
+        'lane': float(os.getenv('RANKING_WEIGHT_LANE', 3.0)),
+        'price': float(os.getenv('RANKING_WEIGHT_PRICE', 1.5)),
+        'performance': float(os.getenv('RANKING_WEIGHT_PERFORMANCE', 1.0)),
+    }
+
+
+class PricingConfig(BaseModel):
+    """
+    Configuration settings for the historical lane price statistics.
+
+    Attributes:
+        min_samples (int): Minimal number of transports on a lane for its statistics
+                           to be used, otherwise country pair or global statistics are used.
+        floor_margin (float): We never offer less than the minimal price increased by this fraction.
+    """
+
+    min_samples: int = int(os.getenv('PRICING_MIN_SAMPLES', 5))
+    floor_margin: float = float(os.getenv('PRICING_FLOOR_MARGIN', 0.4))
+
+
+class LLMConfig(BaseModel):
+    """
+    Configuration settings for the LLM providers.
+
+    Attributes:
+        provider (str): Name of the provider used by default (gemini or anthropic).
+        anthropic_api_key (str): API key for Anthropic.
+        anthropic_model (str): Anthropic model used for generation.
+        gemini_api_key (str): API key for Google Gemini.
+        gemini_model (str): Gemini model used for generation.
+        max_tokens (int): Maximum number of tokens generated by Anthropic.
+        temperature (float): Sampling temperature for Anthropic.
+        timeout (float): Timeout of a single generation in seconds.
+        max_concurrency (int): Maximum number of generations running at the same time.
+        routing (bool): Routes generations to the fastest healthy provider, instead of
+                        always using the default one. Streams are never routed.
+        hedging (bool): Sends a second request to the next provider if the first one
+                        didn't answer within its latency percentile.
+        hedge_percentile (float): Latency percentile of a provider used as hedging deadline.
+        window (int): Number of recent calls used for latency and error rate of a provider.
+        breaker_failures (int): Consecutive failures after which a provider is not used.
+        breaker_reset (float): Seconds after which a failing provider is tried again.
+    """
+
+    provider: str = os.getenv('LLM_PROVIDER', 'gemini')
+    anthropic_api_key: Optional[str] = os.getenv('ANTROPIC_API_KEY')
+    anthropic_model: str = os.getenv('ANTHROPIC_MODEL', 'claude-3-5-sonnet-20241022')
+    gemini_api_key: Optional[str] = os.getenv('GEMINI_API_KEY')
+    gemini_model: str = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+    max_tokens: int = int(os.getenv('LLM_MAX_TOKENS', 1024))
+    temperature: float = float(os.getenv('LLM_TEMPERATURE', 0))
+    timeout: float = float(os.getenv('LLM_TIMEOUT', 60.0))
+    max_concurrency: int = int(os.getenv('LLM_MAX_CONCURRENCY', 16))
+    routing: bool = os.getenv('LLM_ROUTING', 'false').lower() == 'true'
+    hedging: bool = os.getenv('LLM_HEDGING', 'false').lower() == 'true'
+    hedge_percentile: float = float(os.getenv('LLM_HEDGE_PERCENTILE', 95))
+    window: int = int(os.getenv('LLM_ROUTING_WINDOW', 50))
+    breaker_failures: int = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+    breaker_reset: float = float(os.getenv('LLM_BREAKER_RESET', 30.0))
+
+
+class LLMCacheConfig(BaseModel):
+    """
+    Configuration settings for the LLM response cache.
+
+    Attributes:
+        ttl (float): Seconds for which a cached response is valid.
+        memory_entries (int): Maximum number of responses kept in memory.
+        database_entries (int): Maximum number of responses kept in the database.
+        endpoints (List): Endpoints which use the cache.
+    """
+
+    ttl: float = float(os.getenv('LLM_CACHE_TTL', 6 * 3600.0))
+    memory_entries: int = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', 512))
+    database_entries: int = int(os.getenv('LLM_CACHE_DATABASE_ENTRIES', 10000))
+    endpoints: List[str] = [
+        endpoint.strip() for endpoint in os.getenv('LLM_CACHE_ENDPOINTS', 'start_an_order').split(',') if endpoint.strip()
+    ]
+
+
+class PromptConfig(BaseModel):
+    """
+    Configuration settings for building LLM prompts.
+
+    Attributes:
+        token_budget (int): Maximum estimated number of tokens of a dispatch prompt.
+        chars_per_token (float): Average number of characters per token, used for estimation.
+        transports_per_partner (int): Maximum number of transports listed for every partner.
+    """
+
+    token_budget: int = int(os.getenv('PROMPT_TOKEN_BUDGET', 4000))
+    chars_per_token: float = float(os.getenv('PROMPT_CHARS_PER_TOKEN', 4.0))
+    transports_per_partner: int = int(os.getenv('PROMPT_TRANSPORTS_PER_PARTNER', 10))
+
+
+class ConversationConfig(BaseModel):
+    """
+    Configuration settings for negotiation conversations.
+
+    Attributes:
+        window (int): Number of the latest messages kept verbatim in the negotiation prompt.
+        summary_batch (int): Number of messages over the window which are folded into the summary at once.
+        token_budget (int): Maximum estimated number of tokens of a negotiation prompt.
+        summary_tokens (int): Maximum length of the conversation summary in tokens.
+    """
+
+    window: int = int(os.getenv('CONVERSATION_WINDOW', 6))
+    summary_batch: int = int(os.getenv('CONVERSATION_SUMMARY_BATCH', 4))
+    token_budget: int = int(os.getenv('CONVERSATION_TOKEN_BUDGET', 1500))
+    summary_tokens: int = int(os.getenv('CONVERSATION_SUMMARY_TOKENS', 250))
+
+
+class ConversationCacheConfig(BaseModel):
+    """
+    Configuration settings for the in-process cache of active conversations.
+
+    Attributes:
+        max_entries (int): Maximum number of cached conversations.
+        max_bytes (int): Upper bound of the estimated size of cached conversations.
+        idle_ttl (float): Seconds after which an unused conversation is evicted.
+        flush_interval (float): Seconds between two flushes of pending messages.
+        durability (str): write_behind flushes pending messages in the background,
+                          write_through saves them before the reply is returned.
+        flush_on_evict (bool): Flushes pending messages of an evicted conversation
+                               right away, otherwise conversations with pending
+                               messages are not evicted until the next flush.
+    """
+
+    max_entries: int = int(os.getenv('CONVERSATION_CACHE_MAX_ENTRIES', 1000))
+    max_bytes: int = int(os.getenv('CONVERSATION_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    idle_ttl: float = float(os.getenv('CONVERSATION_CACHE_IDLE_TTL', 900.0))
+    flush_interval: float = float(os.getenv('CONVERSATION_CACHE_FLUSH_INTERVAL', 0.5))
+    durability: str = os.getenv('CONVERSATION_CACHE_DURABILITY', 'write_behind')
+    flush_on_evict: bool = os.getenv('CONVERSATION_CACHE_FLUSH_ON_EVICT', 'true').lower() == 'true'
+
+
+class OptionCacheConfig(BaseModel):
+    """
+    Configuration settings for the in-process options cache.
+
+    Attributes:
+        enabled (bool): Serves option reads from the cache.
+        refresh_interval (float): Seconds after which the whole cache is reloaded,
+                                  in case an invalidation was missed.
+        channel (str): Event bus channel of option changes.
+    """
+
+    enabled: bool = os.getenv('OPTION_CACHE_ENABLED', 'true').lower() == 'true'
+    refresh_interval: float = float(os.getenv('OPTION_CACHE_REFRESH_INTERVAL', 60.0))
+    channel: str = os.getenv('OPTION_CACHE_CHANNEL', 'options_changed')
+
+
+class WebSocketConfig(BaseModel):
+    """
+    Configuration settings for the WebSocket connections.
+
+    Attributes:
+        queue_size (int): Maximum number of messages waiting to be sent to a connection.
+        slow_consumer_policy (str): What happens when the queue of a connection is full,
+                                    drop_oldest drops the oldest queued message and
+                                    disconnect closes the connection.
+        send_timeout (float): Seconds after which a connection which doesn't accept
+                              a message is closed.
+        channel (str): Event bus channel of broadcasts shared by all workers.
+        batch_interval (float): Seconds for which broadcasts are collected into one event.
+        batch_bytes (int): Maximum size of one event, Postgres limits NOTIFY payload to 8000 bytes.
+    """
+
+    queue_size: int = int(os.getenv('WEBSOCKET_QUEUE_SIZE', 100))
+    slow_consumer_policy: str = os.getenv('WEBSOCKET_SLOW_CONSUMER_POLICY', 'drop_oldest')
+    send_timeout: float = float(os.getenv('WEBSOCKET_SEND_TIMEOUT', 10.0))
+    channel: str = os.getenv('WEBSOCKET_CHANNEL', 'websocket_broadcast')
+    batch_interval: float = float(os.getenv('WEBSOCKET_BATCH_INTERVAL', 0.01))
+    batch_bytes: int = int(os.getenv('WEBSOCKET_BATCH_BYTES', 7000))
+
+
+class JobQueueConfig(BaseModel):
+    """
+    Configuration settings for the queue of dispatch jobs.
+
+    Attributes:
+        workers (int): Number of jobs which run at the same time in one worker process.
+        max_queued (int): Maximum number of jobs waiting in one worker process,
+                          new jobs are rejected with 503 when it's reached.
+        job_timeout (float): Seconds after which a running job fails.
+        lost_after (float): Seconds after which a job which is still running is
+                            considered lost and queued again, longer than the job timeout
+                            so that slow jobs have time to save their result.
+        max_attempts (int): Number of attempts after which a lost job fails instead
+                            of being queued again.
+        recover_interval (float): Seconds between two checks for queued jobs
+                                  of other or stopped worker processes.
+        retry_after (int): Seconds in Retry-After header of a rejected job.
+    """
+
+    workers: int = int(os.getenv('JOB_QUEUE_WORKERS', 4))
+    max_queued: int = int(os.getenv('JOB_QUEUE_MAX_QUEUED', 1000))
+    job_timeout: float = float(os.getenv('JOB_QUEUE_JOB_TIMEOUT', 300.0))
+    lost_after: float = float(os.getenv('JOB_QUEUE_LOST_AFTER', 600.0))
+    max_attempts: int = int(os.getenv('JOB_QUEUE_MAX_ATTEMPTS', 3))
+    recover_interval: float = float(os.getenv('JOB_QUEUE_RECOVER_INTERVAL', 30.0))
+    retry_after: int = int(os.getenv('JOB_QUEUE_RETRY_AFTER', 5))
+
+
+class AdmissionConfig(BaseModel):
+    """
+    Configuration settings for admission control of the LLM backed endpoints.
+
+    Attributes:
+        enabled (bool): Limits the requests, otherwise every request runs right away.
+        max_concurrent (int): Maximum number of requests running at the same time.
+        max_new_orders (int): Maximum number of running requests starting an order.
+        max_follow_ups (int): Maximum number of running requests sending a message.
+        queue_size (int): Maximum number of requests waiting for a free slot.
+        queue_timeout (float): Seconds after which a waiting request is rejected.
+        priority (str): Requests which go first from the queue, new_orders or follow_ups.
+        retry_after (int): Seconds in Retry-After header of a rejected request.
+        rate (float): Requests per second allowed to one client, 0 disables rate limiting.
+        burst (int): Number of requests a client can send at once.
+        max_clients (int): Maximum number of clients which rate is tracked.
+        client_header (str): Header identifying the client, set only behind a trusted proxy
+                             which sets it, the client address is used otherwise.
+    """
+
+    enabled: bool = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+    max_concurrent: int = int(os.getenv('ADMISSION_MAX_CONCURRENT', 64))
+    max_new_orders: int = int(os.getenv('ADMISSION_MAX_NEW_ORDERS', 32))
+    max_follow_ups: int = int(os.getenv('ADMISSION_MAX_FOLLOW_UPS', 48))
+    queue_size: int = int(os.getenv('ADMISSION_QUEUE_SIZE', 200))
+    queue_timeout: float = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10.0))
+    priority: str = os.getenv('ADMISSION_PRIORITY', 'new_orders')
+    retry_after: int = int(os.getenv('ADMISSION_RETRY_AFTER', 5))
+    rate: float = float(os.getenv('ADMISSION_RATE', 0.0))
+    burst: int = int(os.getenv('ADMISSION_BURST', 10))
+    max_clients: int = int(os.getenv('ADMISSION_MAX_CLIENTS', 10000))
+    client_header: str = os.getenv('ADMISSION_CLIENT_HEADER', '')
+
+
+class DispatchBatchConfig(BaseModel):
+    """
+    Configuration settings for dispatching a batch of orders.
+
+    Attributes:
+        concurrency (int): Maximum number of LLM calls of one batch running at the same time.
+    """
+
+    concurrency: int = int(os.getenv('DISPATCH_BATCH_CONCURRENCY', 8))
+
+
+class FastPathConfig(BaseModel):
+    """
+    Configuration settings for answering unambiguous partner messages without the LLM.
+
+    Attributes:
+        enabled (bool): Answers unambiguous messages from templates.
+        max_words (int): Longer messages are always answered by the LLM.
+        tolerance (float): Offers lower than the target price by at most this
+                           fraction are accepted.
+        concession (float): Fraction of the difference between our last offer and
+                            the partner offer which we concede in a counter-offer.
+        plausible_ratio (float): Numbers lower than this fraction of the minimal
+                                 price are not taken as offers.
+        price_step (float): Our prices are rounded to this step.
+    """
+
+    enabled: bool = os.getenv('FAST_PATH_ENABLED', 'true').lower() == 'true'
+    max_words: int = int(os.getenv('FAST_PATH_MAX_WORDS', 12))
+    tolerance: float = float(os.getenv('FAST_PATH_TOLERANCE', 0.02))
+    concession: float = float(os.getenv('FAST_PATH_CONCESSION', 0.5))
+    plausible_ratio: float = float(os.getenv('FAST_PATH_PLAUSIBLE_RATIO', 0.5))
+    price_step: float = float(os.getenv('FAST_PATH_PRICE_STEP', 10.0))
+
+
+class SyncConfig(BaseModel):
+    """
+    Configuration settings for the sync of data source data into local tables.
+
+    Attributes:
+        enabled (bool): Syncs the data and serves the dispatcher from local tables.
+        interval (float): Seconds between two syncs, 0 syncs only on request.
+        mode (str): etag sends conditional requests for whole datasets, since
+                    requests only records changed since the watermark.
+        since_param (str): Query parameter with the watermark in since mode.
+        overlap (float): Seconds subtracted from the watermark, so records changed
+                         while a sync was running are not missed.
+        full_interval (float): Seconds after which the whole dataset is synced
+                               again, which also removes deleted records.
+        batch_size (int): Number of rows written by one INSERT.
+        channel (str): Event bus channel notifying other workers about synced data.
+    """
+
+    enabled: bool = os.getenv('SYNC_ENABLED', 'true').lower() == 'true'
+    interval: float = float(os.getenv('SYNC_INTERVAL', 300.0))
+    mode: str = os.getenv('SYNC_MODE', 'etag')
+    since_param: str = os.getenv('SYNC_SINCE_PARAM', 'since')
+    overlap: float = float(os.getenv('SYNC_OVERLAP', 60.0))
+    full_interval: float = float(os.getenv('SYNC_FULL_INTERVAL', 86400.0))
+    batch_size: int = int(os.getenv('SYNC_BATCH_SIZE', 1000))
+    channel: str = os.getenv('SYNC_CHANNEL', 'data_synced')
@@ -1,6 +1,7 @@
 import uuid
+from typing import List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class AddressSchema(BaseModel):
@@ -18,3 +19,7 @@ class DispatchSchema(BaseModel):
 class MessageSchema(BaseModel):
     id_conversation: uuid.UUID
     message: str
+
+
+class DispatchBatchSchema(BaseModel):
+    orders: List[DispatchSchema] = Field(min_length=1, max_length=500)
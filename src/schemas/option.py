@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, AnyStr
 
 
@@ -14,7 +14,20 @@ class OptionResponseModel(BaseModel):
 
 class OptionsResponseModel(BaseModel):
     options: List[OptionResponseModel]
+    next: Optional[str] = None
 
 
 class OptionUpdateRequestModel(BaseModel):
     value: Dict
+
+
+class OptionBulkUpsertModel(BaseModel):
+    options: List[OptionCreateModel] = Field(max_length=1000)
+
+
+class OptionBulkDeleteModel(BaseModel):
+    keys: List[AnyStr] = Field(max_length=1000)
+
+
+class OptionBulkResponseModel(BaseModel):
+    results: Dict[AnyStr, AnyStr]
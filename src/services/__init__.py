@@ -1 +1,2 @@
-from .option import *
\ No newline at end of file
+from .option import *
+from .conversation import *
\ No newline at end of file
@@ -0,0 +1,286 @@
+import asyncio
+import uuid
+
+from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models import Conversation, ConversationMessage
+from schemas.conf import ConversationConfig
+from utils.conversation_cache import ConversationEntry, conversation_cache
+from utils.llm import llm
+from utils.prompts import prompts
+from utils.text import mentioned_price
+
+PARTNER: str = 'partner'
+DISPATCHER: str = 'dispatcher'
+
+
+class ConversationSummaries:
+    """
+    Summary updates running in the background, at most one per conversation.
+    Failed updates are counted and the latest error is kept for the stats.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[uuid.UUID, asyncio.Task] = dict()
+
+        self.summaries: int = 0
+        self.errors: int = 0
+        self.last_error: Optional[str] = None
+
+    def schedule(self, id_conversation: uuid.UUID, summarize: Callable[[], Awaitable[bool]]) -> None:
+        task: Optional[asyncio.Task] = self._tasks.get(id_conversation)
+        if task is not None and not task.done():
+            return
+
+        task = asyncio.create_task(self._run(summarize))
+        self._tasks[id_conversation] = task
+        task.add_done_callback(lambda _: self._tasks.pop(id_conversation, None))
+
+    async def _run(self, summarize: Callable[[], Awaitable[bool]]) -> None:
+        try:
+            if await summarize():
+                self.summaries += 1
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e) or type(e).__name__
+
+    async def drain(self) -> None:
+        """
+        Waits for the running summary updates.
+        """
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'summaries': self.summaries,
+            'summary_errors': self.errors,
+            'last_summary_error': self.last_error,
+            'running_summaries': len(self._tasks)
+        }
+
+
+conversation_summaries: ConversationSummaries = ConversationSummaries()
+
+
+class ConversationService:
+    """
+    Conversations with partners, every message is stored as a separate row of
+    conversation_messages, so adding a message is a single INSERT and the
+    negotiation prompt reads only the latest window of messages.
+
+    Active conversations are served from the in-process conversation cache,
+    new messages are written to the database by its flush.
+
+    Messages older than the window are folded into a summary stored on the
+    conversation. The summary is updated in the background once enough
+    messages pile up over the window, at most one update runs per conversation.
+    """
+
+    _model: ConversationMessage = ConversationMessage
+
+    def __init__(self, conf: Optional[ConversationConfig] = None):
+        self.conf: ConversationConfig = conf or ConversationConfig()
+
+    @property
+    def keep(self) -> int:
+        return self.conf.window + self.conf.summary_batch
+
+    async def entry(self, id_conversation) -> ConversationEntry:
+        """
+        Cached conversation with its latest messages, loaded from the database on a miss.
+
+        :param id_conversation: ID of the conversation.
+        :return: Cache entry of the conversation.
+        """
+
+        id_conversation = uuid.UUID(str(id_conversation))
+
+        async def load():
+            conversation: Conversation | None = await Conversation.get_or_none(id=id_conversation)
+            if not conversation:
+                raise HTTPException(detail='Conversation not found', status_code=404)
+
+            messages: List[ConversationMessage] = await ConversationMessage.filter(
+                conversation_id=conversation.id,
+                sequence__gt=conversation.summarized_sequence
+            ).order_by('-sequence').limit(self.keep)
+
+            return conversation, messages[::-1]
+
+        return await conversation_cache.get_or_load(id_conversation, load)
+
+    async def single(self, id_conversation) -> Conversation:
+        return (await self.entry(id_conversation)).conversation
+
+    async def start(
+            self,
+            context: Dict,
+            offer: str,
+            price: Optional[float] = None,
+            prompt_tokens: Optional[int] = None,
+            client: Optional[str] = None
+    ) -> Conversation:
+        conversation: Conversation = await Conversation.create(
+            context=context,
+            client=client
+        )
+        await self.add(conversation_cache.set(conversation, []), [ConversationMessage(
+            conversation_id=conversation.id,
+            sequence=0,
+            role=DISPATCHER,
+            text=offer,
+            price=price,
+            tokens=prompts.estimate_tokens(offer),
+            prompt_tokens=prompt_tokens
+        )])
+
+        return conversation
+
+    async def start_many(self, starts: List[Dict[str, Any]]) -> List[Conversation]:
+        """
+        Starts conversations with a single INSERT.
+
+        :param starts: Arguments of start for every conversation.
+        :return: Conversations in the order of the arguments.
+        """
+
+        conversations: List[Conversation] = [Conversation(context=start['context'], client=start.get('client')) for start in starts]
+        await Conversation.bulk_create(conversations)
+
+        for conversation, start in zip(conversations, starts):
+            conversation_cache.add(conversation_cache.set(conversation, []), [ConversationMessage(
+                conversation_id=conversation.id,
+                sequence=0,
+                role=DISPATCHER,
+                text=start['offer'],
+                price=start.get('price'),
+                tokens=prompts.estimate_tokens(start['offer']),
+                prompt_tokens=start.get('prompt_tokens')
+            )], keep=self.keep)
+
+        if conversation_cache.write_through:
+            await conversation_cache.flush(strict=True)
+        return conversations
+
+    async def add(self, entry: ConversationEntry, messages: List[ConversationMessage]) -> None:
+        conversation_cache.add(entry, messages, keep=self.keep)
+        if conversation_cache.write_through:
+            await conversation_cache.flush(entry.conversation.id, strict=True)
+
+    async def window(self, conversation: Conversation, limit: Optional[int] = None) -> List[ConversationMessage]:
+        """
+        Latest messages of the conversation.
+
+        :param conversation: Conversation with the partner.
+        :param limit: Number of messages, configured window by default.
+        :return: Messages ordered by sequence.
+        """
+
+        await conversation_cache.flush(conversation.id)
+        messages: List[ConversationMessage] = await ConversationMessage.filter(
+            conversation_id=conversation.id
+        ).order_by('-sequence').limit(limit or self.conf.window)
+
+        return messages[::-1]
+
+    async def unsummarized(self, conversation: Conversation) -> List[ConversationMessage]:
+        """
+        Messages which are not part of the summary yet, at most the window and
+        one summary batch of them.
+
+        :param conversation: Conversation with the partner.
+        :return: Messages ordered by sequence.
+        """
+
+        entry: ConversationEntry = await self.entry(conversation.id)
+        return [message for message in entry.messages if message.sequence > conversation.summarized_sequence]
+
+    def history(self, messages: List[ConversationMessage], message: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Roles and texts of the latest window of messages, followed by the new
+        partner message if given.
+        """
+
+        history: List[Tuple[str, str]] = [(m.role, m.text) for m in messages[-self.conf.window:]]
+        if message is not None:
+            history.append((PARTNER, message))
+        return history
+
+    def message(self, conversation: Conversation, sequence: int, role: str, text: str, prompt_tokens: Optional[int] = None) -> ConversationMessage:
+        return ConversationMessage(
+            conversation_id=conversation.id,
+            sequence=sequence,
+            role=role,
+            text=text,
+            price=mentioned_price(text),
+            tokens=prompts.estimate_tokens(text),
+            prompt_tokens=prompt_tokens
+        )
+
+    async def reply(self, conversation: Conversation, message: str, reply: str, prompt_tokens: Optional[int] = None) -> None:
+        """
+        Adds the partner message and our reply to the conversation, they're
+        saved with a single INSERT by the next flush.
+
+        Sequences follow the latest cached message at the time of the write,
+        so concurrent replies to the same conversation never share them.
+
+        :param conversation: Conversation with the partner.
+        :param message: Message received from the partner.
+        :param reply: Reply sent to the partner.
+        :param prompt_tokens: Estimated tokens of the prompt which generated the reply.
+        :return: None
+        """
+
+        entry: ConversationEntry = await self.entry(conversation.id)
+        last_sequence: int = entry.last_sequence
+        await self.add(entry, [
+            self.message(conversation, last_sequence + 1, PARTNER, message),
+            self.message(conversation, last_sequence + 2, DISPATCHER, reply, prompt_tokens=prompt_tokens)
+        ])
+
+        if last_sequence + 2 - conversation.summarized_sequence > self.conf.window + self.conf.summary_batch:
+            self.schedule_summary(conversation.id)
+
+    def schedule_summary(self, id_conversation: uuid.UUID) -> None:
+        conversation_summaries.schedule(id_conversation, lambda: self.summarize(id_conversation))
+
+    async def summarize(self, id_conversation: uuid.UUID) -> bool:
+        """
+        Folds messages older than the window into the conversation summary.
+
+        :param id_conversation: ID of the conversation.
+        :return: Whether the summary was updated.
+        """
+
+        await conversation_cache.flush(id_conversation)
+        conversation: Conversation = await self.single(id_conversation)
+        last: Optional[ConversationMessage] = await ConversationMessage.filter(
+            conversation_id=conversation.id
+        ).order_by('-sequence').first()
+        if last is None:
+            return False
+
+        until: int = last.sequence - self.conf.window
+        messages: List[ConversationMessage] = await ConversationMessage.filter(
+            conversation_id=conversation.id,
+            sequence__gt=conversation.summarized_sequence,
+            sequence__lte=until
+        ).order_by('sequence')
+        if not messages:
+            return False
+
+        summary: str = await llm.generate(prompts.summary(
+            context=conversation.context,
+            summary=conversation.summary,
+            history=[(m.role, m.text) for m in messages],
+            tokens=self.conf.summary_tokens
+        ))
+
+        conversation.summary = summary[:int(self.conf.summary_tokens * prompts.conf.chars_per_token)]
+        conversation.summarized_sequence = until
+        await conversation.save(update_fields=['summary', 'summarized_sequence'])
+        return True
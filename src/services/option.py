@@ -1,22 +1,153 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
 from fastapi import Response, HTTPException
-from typing import List, Optional, Dict
+from tortoise import BaseDBAsyncClient, timezone
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+from typing import Any, AsyncIterator, List, Optional, Dict, Tuple
 
 from models import Option
 from schemas import *
+from utils.database import DEFAULT_CONNECTION, read_connection
+from utils.option_cache import MISSING, option_cache
+
+PAGE_SIZE: int = 100
+MAX_PAGE_SIZE: int = 1000
+EXPORT_BATCH: int = 500
+
+BY_KEY: str = 'key'
+BY_CREATED: str = 'created'
+
+CREATED: str = 'created'
+UPDATED: str = 'updated'
+UNCHANGED: str = 'unchanged'
+DELETED: str = 'deleted'
+NOT_FOUND: str = 'not_found'
+
+UPSERT_QUERY: str = '''
+    INSERT INTO "options" ("id", "key", "value", "created", "last_updated")
+    SELECT "t"."id", "t"."key", "t"."value"::jsonb, now(), now()
+    FROM unnest($1::uuid[], $2::varchar[], $3::text[]) AS "t"("id", "key", "value")
+    ON CONFLICT ("key") DO UPDATE SET "value" = EXCLUDED."value", "last_updated" = EXCLUDED."last_updated"
+    WHERE "options"."value" IS DISTINCT FROM EXCLUDED."value"
+    RETURNING "key", ("xmax" = 0) AS "inserted"
+'''
+DELETE_QUERY: str = 'DELETE FROM "options" WHERE "key" = ANY($1::varchar[]) RETURNING "key"'
 
 
 class OptionService:
+    """
+    Options are read from the options cache, every change invalidates it in
+    all workers.
+    """
+
     _model: Option = Option
 
-    async def get(self) -> OptionsResponseModel:
-        options: List[Option] = await Option.all()
+    def cursor(self, order: str, row: Dict) -> str:
+        position: List = [row['key']] if order == BY_KEY else [row['created'].isoformat(), str(row['id'])]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def position(self, order: str, cursor: str) -> List:
+        try:
+            position: List = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if order == BY_CREATED:
+                position[0] = datetime.fromisoformat(position[0])
+            assert len(position) == (1 if order == BY_KEY else 2)
+        except Exception:
+            raise HTTPException(detail='Invalid cursor', status_code=400)
+
+        return position
+
+    async def rows(self, limit: Optional[int], order: str = BY_KEY, after: Optional[str] = None, prefix: Optional[str] = None) -> List[Dict]:
+        """
+        Page of options read with a keyset query, only the needed columns are fetched.
+
+        :param limit: Maximum number of options, every option if not set.
+        :param order: Options are ordered by key or by (created, id).
+        :param after: Cursor of the previous page.
+        :param prefix: Returns only options which keys start with the prefix.
+        :return: Rows of the options.
+        """
+
+        query = Option.all().using_db(read_connection())
+        if limit is not None:
+            query = query.limit(limit)
+        if prefix:
+            query = query.filter(key__startswith=prefix)
+
+        if order == BY_KEY:
+            if after is not None:
+                query = query.filter(key__gt=self.position(order, after)[0])
+            return await query.order_by('key').values('key', 'value')
+
+        if after is not None:
+            created, id = self.position(order, after)
+            query = query.filter(Q(created__gt=created) | Q(created=created, id__gt=id))
+        return await query.order_by('created', 'id').values('id', 'created', 'key', 'value')
+
+    async def get(self, limit: Optional[int] = None, after: Optional[str] = None, prefix: Optional[str] = None, order: str = BY_KEY) -> OptionsResponseModel:
+        """
+        Page of options, cursor of the next page is returned while there are more options.
+        Without limit and cursor every option is returned in one response.
+
+        :param limit: Maximum number of options, at most MAX_PAGE_SIZE.
+        :param after: Cursor of the previous page.
+        :param prefix: Returns only options which keys start with the prefix.
+        :param order: Options are ordered by key or by (created, id).
+        :return: Options and cursor of the next page.
+        """
+
+        if order not in (BY_KEY, BY_CREATED):
+            raise HTTPException(detail=f'Options can be ordered by {BY_KEY} or {BY_CREATED}', status_code=400)
+        if limit is None:
+            limit = PAGE_SIZE if after is not None else None
+        elif not 1 <= limit <= MAX_PAGE_SIZE:
+            raise HTTPException(detail=f'Limit must be between 1 and {MAX_PAGE_SIZE}', status_code=400)
+        fetch: Optional[int] = limit + 1 if limit is not None else None
+
+        if order == BY_KEY and option_cache.conf.enabled:
+            page: List[Tuple[str, Any]] = await option_cache.page(
+                limit=fetch,
+                after=self.position(order, after)[0] if after is not None else None,
+                prefix=prefix
+            )
+            rows: List[Dict] = [{'key': key, 'value': value} for key, value in page]
+        else:
+            rows: List[Dict] = await self.rows(fetch, order=order, after=after, prefix=prefix)
+
+        return OptionsResponseModel(
+            options=[OptionResponseModel(key=row['key'], value=row['value']) for row in rows[:limit]],
+            next=self.cursor(order, rows[limit - 1]) if limit is not None and len(rows) > limit else None
+        )
+
+    async def export(self, prefix: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        All options as NDJSON lines, read from the database in batches.
 
-        return_dict: Dict = {
-            'options': [OptionResponseModel(**x.__dict__) for x in options]
-        }
-        return OptionsResponseModel(**return_dict)
+        :param prefix: Exports only options which keys start with the prefix.
+        :return: Async iterator of lines.
+        """
+
+        after: Optional[str] = None
+        while True:
+            rows: List[Dict] = await self.rows(EXPORT_BATCH, after=after, prefix=prefix)
+            for row in rows:
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+
+            if len(rows) < EXPORT_BATCH:
+                return
+            after = self.cursor(BY_KEY, rows[-1])
 
     async def single(self, key: AnyStr, inner: bool = False) -> OptionResponseModel:
+        if option_cache.conf.enabled and not inner:
+            value = await option_cache.get(key)
+            if value is MISSING:
+                raise HTTPException(detail='Option not found', status_code=404)
+            return OptionResponseModel(key=key, value=value)
+
         option: Option | None = await Option.get_or_none(key=key)
         if not option:
             raise HTTPException(detail='Option not found', status_code=404)
@@ -27,7 +158,7 @@ class OptionService:
 
     async def create(self, option: OptionCreateModel) -> OptionResponseModel:
         option: Option = await Option.create(**option.dict())
-        await option.save()
+        await option_cache.changed(option.key)
 
         return OptionResponseModel(**option.__dict__)
 
@@ -36,12 +167,86 @@ class OptionService:
 
         if option_request.value != option.value:
             option.value = option_request.value
-            await option.save()
+            option.last_updated = timezone.now()
+            await option.save(update_fields=['value', 'last_updated'])
+            await option_cache.changed(option.key)
 
         return OptionResponseModel(**option.__dict__)
 
     async def delete(self, key: AnyStr) -> None:
         option: Option = await self.single(key=key, inner=True)
         await option.delete()
+        await option_cache.changed(option.key)
 
         return
+
+    async def bulk_upsert(self, options: List[OptionCreateModel]) -> OptionBulkResponseModel:
+        """
+        Creates or updates options in a single transaction, on Postgres with a
+        single INSERT ... ON CONFLICT statement.
+
+        :param options: Options to save, the last one wins for repeated keys.
+        :return: Result of every key, created, updated or unchanged.
+        """
+
+        values: Dict[str, Dict] = {option.key: option.value for option in options}
+        if not values:
+            return OptionBulkResponseModel(results={})
+
+        async with in_transaction(DEFAULT_CONNECTION) as connection:
+            if connection.capabilities.dialect == 'postgres':
+                _, rows = await connection.execute_query(UPSERT_QUERY, [
+                    [uuid.uuid4() for _ in values],
+                    list(values),
+                    [json.dumps(value) for value in values.values()]
+                ])
+                saved: Dict[str, str] = {row['key']: CREATED if row['inserted'] else UPDATED for row in rows}
+            else:
+                saved: Dict[str, str] = await self._upsert_rows(connection, values)
+
+        await option_cache.changed()
+
+        return OptionBulkResponseModel(results={key: saved.get(key, UNCHANGED) for key in values})
+
+    async def _upsert_rows(self, connection: BaseDBAsyncClient, values: Dict[str, Dict]) -> Dict[str, str]:
+        existing: Dict[str, Any] = dict(
+            await Option.filter(key__in=list(values)).using_db(connection).values_list('key', 'value')
+        )
+
+        await Option.bulk_create(
+            [Option(key=key, value=value) for key, value in values.items() if key not in existing],
+            using_db=connection
+        )
+        saved: Dict[str, str] = {key: CREATED for key in values if key not in existing}
+
+        for key, value in values.items():
+            if key in existing and existing[key] != value:
+                await Option.filter(key=key).using_db(connection).update(value=value, last_updated=timezone.now())
+                saved[key] = UPDATED
+
+        return saved
+
+    async def bulk_delete(self, keys: List[str]) -> OptionBulkResponseModel:
+        """
+        Deletes options in a single transaction, on Postgres with a single
+        DELETE ... WHERE key = ANY(...) statement.
+
+        :param keys: Keys of the options.
+        :return: Result of every key, deleted or not_found.
+        """
+
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return OptionBulkResponseModel(results={})
+
+        async with in_transaction(DEFAULT_CONNECTION) as connection:
+            if connection.capabilities.dialect == 'postgres':
+                _, rows = await connection.execute_query(DELETE_QUERY, [keys])
+                deleted: set = {row['key'] for row in rows}
+            else:
+                deleted: set = set(await Option.filter(key__in=keys).using_db(connection).values_list('key', flat=True))
+                await Option.filter(key__in=keys).using_db(connection).delete()
+
+        await option_cache.changed()
+
+        return OptionBulkResponseModel(results={key: DELETED if key in deleted else NOT_FOUND for key in keys})
@@ -1 +1,17 @@
-from .dispatcher import *
\ No newline at end of file
+from .cache import *
+from .http import *
+from .database import *
+from .events import *
+from .option_cache import *
+from .llm_cache import *
+from .llm import *
+from .conversation_cache import *
+from .jobs import *
+from .sync import *
+from .admission import *
+from .dispatcher import *
+from .pricing import *
+from .partners import *
+from .ranking import *
+from .prompts import *
+from .fast_path import *
\ No newline at end of file
@@ -0,0 +1,243 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+from schemas.conf import AdmissionConfig
+
+START_AN_ORDER: str = 'start_an_order'
+SEND_MESSAGE: str = 'send_message'
+
+NEW_ORDERS: str = 'new_orders'
+FOLLOW_UPS: str = 'follow_ups'
+
+
+class Waiter:
+
+    def __init__(self, priority: int, sequence: int, endpoint: str, future: asyncio.Future):
+        self.priority: int = priority
+        self.sequence: int = sequence
+        self.endpoint: str = endpoint
+        self.future: asyncio.Future = future
+        self.since: float = time.monotonic()
+
+    def __lt__(self, other: 'Waiter') -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class AdmissionController:
+    """
+    Limits how many requests of the LLM backed endpoints run at the same time.
+
+    A request runs right away while both its endpoint and the global limit
+    allow it, otherwise it waits in a bounded queue, in which new orders go
+    before follow-up messages or the other way around. When the queue is full,
+    a request of a lower priority is shed to make room, or the new request is
+    rejected with 503. A request which waits for longer than the queue timeout
+    is rejected as well. Clients can also be limited by a token bucket, a client
+    without tokens is rejected with 429.
+    """
+
+    def __init__(self, conf: Optional[AdmissionConfig] = None):
+        self.conf: AdmissionConfig = conf or AdmissionConfig()
+        self.running: int = 0
+        self.running_by: Dict[str, int] = dict()
+        self._waiting: List[Waiter] = []
+        self._sequence: int = 0
+        self._buckets: OrderedDict = OrderedDict()
+
+        self.admitted: int = 0
+        self.queued: int = 0
+        self.rejected: int = 0
+        self.shed: int = 0
+        self.timed_out: int = 0
+        self.rate_limited: int = 0
+        self.wait_time: float = 0.0
+
+    @property
+    def limits(self) -> Dict[str, int]:
+        return {
+            START_AN_ORDER: self.conf.max_new_orders,
+            SEND_MESSAGE: self.conf.max_follow_ups
+        }
+
+    def priority(self, endpoint: str) -> int:
+        new_order: bool = endpoint == START_AN_ORDER
+        return 0 if new_order == (self.conf.priority == NEW_ORDERS) else 1
+
+    def client(self, request: Request) -> Optional[str]:
+        """
+        Identifies the client by its address, or by the header if one is
+        configured because a trusted proxy sets it.
+        """
+
+        address: Optional[str] = request.client.host if request.client else None
+        if self.conf.client_header:
+            return request.headers.get(self.conf.client_header) or address
+        return address
+
+    def _can_run(self, endpoint: str) -> bool:
+        limit: Optional[int] = self.limits.get(endpoint)
+        return self.running < self.conf.max_concurrent and (
+            limit is None or self.running_by.get(endpoint, 0) < limit
+        )
+
+    def _start(self, endpoint: str) -> None:
+        self.running += 1
+        self.running_by[endpoint] = self.running_by.get(endpoint, 0) + 1
+        self.admitted += 1
+
+    def _reject(self, detail: str, status_code: int = 503, retry_after: Optional[float] = None) -> HTTPException:
+        return HTTPException(
+            detail=detail,
+            status_code=status_code,
+            headers={'Retry-After': str(math.ceil(retry_after if retry_after is not None else self.conf.retry_after))}
+        )
+
+    def _take_token(self, client: Optional[str]) -> None:
+        if self.conf.rate <= 0 or client is None:
+            return
+
+        now: float = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (float(self.conf.burst), now))
+        tokens = min(float(self.conf.burst), tokens + (now - updated) * self.conf.rate)
+
+        self._buckets[client] = (max(tokens - 1, 0.0), now)
+        while len(self._buckets) > self.conf.max_clients:
+            self._buckets.popitem(last=False)
+
+        if tokens < 1:
+            self.rate_limited += 1
+            raise self._reject('Too many requests', status_code=429, retry_after=(1 - tokens) / self.conf.rate)
+
+    def _shed(self, priority: int) -> bool:
+        if not self._waiting:
+            return False
+
+        lowest: Waiter = max(self._waiting)
+        if lowest.priority <= priority:
+            return False
+
+        self._waiting.remove(lowest)
+        lowest.future.set_exception(self._reject('Request was shed for requests of a higher priority'))
+        self.shed += 1
+        return True
+
+    async def acquire(self, endpoint: str, client: Optional[str] = None) -> None:
+        """
+        Waits until the request can run.
+
+        :param endpoint: Name of the endpoint.
+        :param client: Identifier of the client for rate limiting.
+        :return: None
+        """
+
+        if not self.conf.enabled:
+            return
+
+        self._take_token(client)
+        if self._can_run(endpoint):
+            return self._start(endpoint)
+
+        priority: int = self.priority(endpoint)
+        if len(self._waiting) >= self.conf.queue_size and not self._shed(priority):
+            self.rejected += 1
+            raise self._reject('Service is overloaded')
+
+        self._sequence += 1
+        waiter: Waiter = Waiter(priority, self._sequence, endpoint, asyncio.get_running_loop().create_future())
+        self._waiting.append(waiter)
+        self.queued += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.conf.queue_timeout)
+        except BaseException as e:
+            admitted: bool = waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None
+            if not waiter.future.done():
+                self._waiting.remove(waiter)
+                waiter.future.cancel()
+
+            if isinstance(e, asyncio.TimeoutError):
+                if admitted:
+                    return
+                self.timed_out += 1
+                raise self._reject('Service is overloaded')
+            if admitted:
+                self.release(endpoint)
+            raise
+        finally:
+            self.wait_time += time.monotonic() - waiter.since
+
+    def release(self, endpoint: str) -> None:
+        if not self.conf.enabled:
+            return
+
+        self.running -= 1
+        self.running_by[endpoint] -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        for waiter in sorted(self._waiting):
+            if not self._can_run(waiter.endpoint):
+                if self.running >= self.conf.max_concurrent:
+                    break
+                continue
+
+            self._waiting.remove(waiter)
+            self._start(waiter.endpoint)
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str, client: Optional[str] = None) -> AsyncIterator[None]:
+        await self.acquire(endpoint, client)
+        try:
+            yield
+        finally:
+            self.release(endpoint)
+
+    async def hold(self, endpoint: str, client: Optional[str] = None) -> Callable[[], None]:
+        """
+        Waits until the request can run and keeps the slot beyond the handler,
+        such as for a streamed response.
+
+        :param endpoint: Name of the endpoint.
+        :param client: Identifier of the client for rate limiting.
+        :return: Function releasing the slot, only its first call counts.
+        """
+
+        await self.acquire(endpoint, client)
+        released: bool = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.release(endpoint)
+
+        return release
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.conf.enabled,
+            'running': self.running,
+            'running_by_endpoint': dict(self.running_by),
+            'limits': {'global': self.conf.max_concurrent, **self.limits},
+            'waiting': len(self._waiting),
+            'queue_size': self.conf.queue_size,
+            'priority': self.conf.priority,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rejected': self.rejected,
+            'shed': self.shed,
+            'timed_out': self.timed_out,
+            'rate_limited': self.rate_limited,
+            'average_wait_time': round(self.wait_time / self.queued, 4) if self.queued else 0.0,
+            'clients': len(self._buckets)
+        }
+
+
+admission: AdmissionController = AdmissionController()
@@ -0,0 +1,190 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from schemas.conf import CacheConfig
+
+Loader = Callable[[], Awaitable[Tuple[Any, int]]]
+
+
+class CacheEntry:
+    def __init__(self, value: Any, size: int, ttl: float, stale_ttl: float):
+        self.value: Any = value
+        self.size: int = size
+        self.created: float = time.monotonic()
+        self.expires: float = self.created + ttl
+        self.stale_until: float = self.expires + stale_ttl
+        self.hits: int = 0
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires
+
+    def is_usable(self, now: float) -> bool:
+        return now < self.stale_until
+
+
+class TTLCache:
+    """
+    In-memory cache with per-key TTL, stale-while-revalidate and single-flight loading.
+
+    Fresh entries are served directly. Expired entries are still served during
+    the stale period while one background task refreshes them. Concurrent misses
+    for the same key share a single load. Entries are evicted in LRU order once
+    the total payload size goes over the memory bound. A load which was running
+    while its key was invalidated isn't stored, and isn't shared with later misses.
+    """
+
+    def __init__(self, conf: Optional[CacheConfig] = None):
+        self.conf: CacheConfig = conf or CacheConfig()
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = dict()
+        self._generation: int = 0
+        self._generations: Dict[str, int] = dict()
+        self.size: int = 0
+
+        self.hits: int = 0
+        self.stale_hits: int = 0
+        self.misses: int = 0
+        self.loads: int = 0
+        self.load_errors: int = 0
+        self.discarded_loads: int = 0
+        self.evictions: int = 0
+
+    def ttl_for(self, key: str) -> float:
+        return self.conf.endpoint_ttls.get(key, self.conf.ttl)
+
+    async def get_or_load(self, key: str, loader: Loader) -> Any:
+        """
+        Returns cached value of the key, loading it with the loader when there's
+        no usable entry.
+
+        :param key: Cache key.
+        :param loader: Coroutine function returning tuple of value and its size in bytes.
+        :return: Cached or freshly loaded value.
+        """
+
+        now: float = time.monotonic()
+        entry: Optional[CacheEntry] = self._entries.get(key)
+
+        if entry and entry.is_usable(now):
+            self._entries.move_to_end(key)
+            entry.hits += 1
+
+            if entry.is_fresh(now):
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._load(key, loader)
+
+            return entry.value
+
+        self.misses += 1
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: str, loader: Loader) -> asyncio.Task:
+        task: Optional[asyncio.Task] = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run_loader(key, loader, self._version(key)))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._loading[key] = task
+        return task
+
+    def _version(self, key: str) -> Tuple[int, int]:
+        return self._generation, self._generations.get(key, 0)
+
+    async def _run_loader(self, key: str, loader: Loader, version: Tuple[int, int]) -> Any:
+        task: Optional[asyncio.Task] = asyncio.current_task()
+        try:
+            value, size = await loader()
+        except Exception:
+            self.load_errors += 1
+            raise
+        finally:
+            if self._loading.get(key) is task:
+                self._loading.pop(key)
+
+        self.loads += 1
+        if version != self._version(key):
+            self.discarded_loads += 1
+            return value
+
+        self.set(key, value, size)
+        return value
+
+    def set(self, key: str, value: Any, size: int) -> None:
+        self._remove(key)
+
+        self._entries[key] = CacheEntry(
+            value=value,
+            size=size,
+            ttl=self.ttl_for(key),
+            stale_ttl=self.conf.stale_ttl
+        )
+        self.size += size
+
+        while self.size > self.conf.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        """
+        Removes entry of the key, or every entry if key is not provided.
+
+        :param key: Cache key.
+        :return: Number of removed entries.
+        """
+
+        if key is None:
+            self._generation += 1
+            self._loading.clear()
+            removed: int = len(self._entries)
+            self._entries.clear()
+            self.size = 0
+            return removed
+
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._loading.pop(key, None)
+        return self._remove(key)
+
+    def _remove(self, key: str) -> int:
+        entry: Optional[CacheEntry] = self._entries.pop(key, None)
+        if not entry:
+            return 0
+
+        self.size -= entry.size
+        return 1
+
+    def entries(self) -> List[Dict[str, Any]]:
+        now: float = time.monotonic()
+
+        return [
+            {
+                'key': key,
+                'size': entry.size,
+                'age': round(now - entry.created, 3),
+                'expires_in': round(entry.expires - now, 3),
+                'fresh': entry.is_fresh(now),
+                'hits': entry.hits,
+                'loading': key in self._loading
+            } for key, entry in self._entries.items()
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_bytes': self.conf.max_bytes,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'load_errors': self.load_errors,
+            'discarded_loads': self.discarded_loads,
+            'evictions': self.evictions,
+            'loading': len(self._loading)
+        }
+
+
+data_cache: TTLCache = TTLCache()
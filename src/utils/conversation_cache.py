@@ -0,0 +1,324 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+
+from models import Conversation, ConversationMessage
+from schemas.conf import ConversationCacheConfig
+from .database import DEFAULT_CONNECTION
+
+ConversationLoader = Callable[[], Awaitable[Tuple[Conversation, List[ConversationMessage]]]]
+
+WRITE_THROUGH: str = 'write_through'
+WRITE_BEHIND: str = 'write_behind'
+
+MESSAGE_OVERHEAD: int = 256
+
+
+class ConversationEntry:
+    def __init__(self, conversation: Conversation, messages: List[ConversationMessage]):
+        self.conversation: Conversation = conversation
+        self.messages: List[ConversationMessage] = messages
+        self.pending: List[ConversationMessage] = []
+        self.dirty_since: Optional[float] = None
+        self.used: float = time.monotonic()
+        self.size: int = 0
+        self.measure()
+
+    @property
+    def last_sequence(self) -> int:
+        return self.messages[-1].sequence if self.messages else self.conversation.summarized_sequence
+
+    def measure(self) -> int:
+        self.size = (
+            len(json.dumps(self.conversation.context, default=str)) + len(self.conversation.summary or '')
+            + sum(len(message.text) + MESSAGE_OVERHEAD for message in self.messages)
+        )
+        return self.size
+
+
+class ConversationCache:
+    """
+    In-process cache of active conversations and their latest messages.
+
+    Loaded conversations are kept in LRU order and evicted when they're idle
+    for too long, or when the number or estimated size of entries goes over
+    the configured bounds. New messages are added to the cached entry and
+    written to the database in one INSERT per conversation and flush, which
+    runs on a short interval and on shutdown.
+    """
+
+    def __init__(self, conf: Optional[ConversationCacheConfig] = None):
+        self.conf: ConversationCacheConfig = conf or ConversationCacheConfig()
+        self._entries: OrderedDict[uuid.UUID, ConversationEntry] = OrderedDict()
+        self._evicted: Dict[uuid.UUID, List[ConversationMessage]] = dict()
+        self._flusher: Optional[asyncio.Task] = None
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self.size: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.flushes: int = 0
+        self.flushed_messages: int = 0
+        self.flush_errors: int = 0
+        self.dropped_messages: int = 0
+        self.last_flush_lag: float = 0.0
+
+    @property
+    def write_through(self) -> bool:
+        return self.conf.durability == WRITE_THROUGH
+
+    async def open(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._lock = asyncio.Lock()
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """
+        Stops the periodic flush, flushes pending messages and empties the cache.
+        """
+
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+
+        await self.flush()
+        self._entries.clear()
+        self.size = 0
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.conf.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                pass
+            self.evict_idle()
+
+    async def get_or_load(self, id_conversation: uuid.UUID, loader: ConversationLoader) -> ConversationEntry:
+        """
+        Returns cached entry of the conversation, loading it with the loader on a miss.
+
+        :param id_conversation: ID of the conversation.
+        :param loader: Coroutine function returning the conversation and its latest messages.
+        :return: Cached entry.
+        """
+
+        entry: Optional[ConversationEntry] = self._entries.get(id_conversation)
+        if entry is not None:
+            self._entries.move_to_end(id_conversation)
+            entry.used = time.monotonic()
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if id_conversation in self._evicted:
+            await self.flush()
+
+        conversation, messages = await loader()
+        return self.set(conversation, messages)
+
+    def get(self, id_conversation: uuid.UUID) -> Optional[ConversationEntry]:
+        return self._entries.get(id_conversation)
+
+    def set(self, conversation: Conversation, messages: List[ConversationMessage]) -> ConversationEntry:
+        self.invalidate(conversation.id)
+
+        entry: ConversationEntry = ConversationEntry(conversation, messages)
+        self._entries[conversation.id] = entry
+        self.size += entry.size
+
+        self._enforce_bounds()
+        return entry
+
+    def add(self, entry: ConversationEntry, messages: List[ConversationMessage], keep: int) -> None:
+        """
+        Appends new messages to the entry and marks them for the next flush.
+
+        :param entry: Cached entry of the conversation.
+        :param messages: New messages, not saved yet.
+        :param keep: Number of the latest messages kept in the entry.
+        :return: None
+        """
+
+        entry.messages = (entry.messages + messages)[-keep:]
+        entry.pending.extend(messages)
+        entry.dirty_since = entry.dirty_since or time.monotonic()
+
+        self.size -= entry.size
+        self.size += entry.measure()
+        self._enforce_bounds()
+
+    def _enforce_bounds(self) -> None:
+        for id_conversation in list(self._entries)[:-1]:
+            if len(self._entries) <= self.conf.max_entries and self.size <= self.conf.max_bytes:
+                return
+            self._evict(id_conversation)
+
+    def evict_idle(self) -> int:
+        """
+        Evicts conversations which weren't used within the idle TTL.
+
+        :return: Number of evicted conversations.
+        """
+
+        now: float = time.monotonic()
+        idle: List[uuid.UUID] = [
+            id_conversation for id_conversation, entry in self._entries.items() if now - entry.used >= self.conf.idle_ttl
+        ]
+        return sum(self._evict(id_conversation) for id_conversation in idle)
+
+    def _evict(self, id_conversation: uuid.UUID) -> int:
+        entry: ConversationEntry = self._entries[id_conversation]
+        if entry.pending:
+            if not self.conf.flush_on_evict or self._lock.locked():
+                return 0
+
+            self._evicted.setdefault(id_conversation, []).extend(entry.pending)
+            task: asyncio.Task = asyncio.get_running_loop().create_task(self.flush())
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        self.invalidate(id_conversation)
+        self.evictions += 1
+        return 1
+
+    def invalidate(self, id_conversation: uuid.UUID) -> None:
+        entry: Optional[ConversationEntry] = self._entries.pop(id_conversation, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    async def flush(self, id_conversation: Optional[uuid.UUID] = None, strict: bool = False) -> int:
+        """
+        Saves pending messages with a single INSERT per conversation, so a
+        failing conversation doesn't hold back the others. Messages dropped for
+        breaking a constraint are removed from the cached entries.
+
+        :param id_conversation: Flushes only this conversation, every one if not provided.
+        :param strict: Raises the first database error once the flush is done, the
+                       messages which weren't saved are removed from the cached entries.
+        :return: Number of saved messages.
+        """
+
+        async with self._lock:
+            entries: List[Tuple[ConversationEntry, int]] = [
+                (entry, len(entry.pending)) for key, entry in self._entries.items() if entry.pending and id_conversation in (None, key)
+            ]
+            evicted: List[Tuple[uuid.UUID, int]] = [
+                (key, len(messages)) for key, messages in self._evicted.items() if id_conversation in (None, key)
+            ]
+            if not entries and not evicted:
+                return 0
+
+            now: float = time.monotonic()
+            oldest: float = min((entry.dirty_since for entry, _ in entries), default=now)
+            saved: int = 0
+            error: Optional[Exception] = None
+
+            for entry, count in entries:
+                handled, dropped, failure = await self._save(entry.pending[:count])
+                saved += handled - len(dropped)
+                if failure is not None and strict:
+                    dropped = dropped + entry.pending[handled:count]
+                    handled = count
+                error = error or failure
+
+                entry.pending = entry.pending[handled:]
+                self._discard(entry, dropped)
+                if not entry.pending:
+                    entry.dirty_since = None
+                elif handled == count:
+                    entry.dirty_since = time.monotonic()
+            for key, count in evicted:
+                handled, dropped, failure = await self._save(self._evicted[key][:count])
+                saved += handled - len(dropped)
+                error = error or failure
+
+                self._evicted[key] = self._evicted[key][handled:]
+                if not self._evicted[key]:
+                    self._evicted.pop(key)
+
+            self.flushes += 1
+            self.flushed_messages += saved
+            self.last_flush_lag = now - oldest
+
+            if strict and error is not None:
+                raise error
+            return saved
+
+    def _discard(self, entry: ConversationEntry, messages: List[ConversationMessage]) -> None:
+        if not messages:
+            return
+
+        discarded: set = {id(message) for message in messages}
+        entry.messages = [message for message in entry.messages if id(message) not in discarded]
+        entry.pending = [message for message in entry.pending if id(message) not in discarded]
+
+        self.size -= entry.size
+        self.size += entry.measure()
+
+    async def _save(self, messages: List[ConversationMessage]) -> Tuple[int, List[ConversationMessage], Optional[Exception]]:
+        """
+        Saves messages of one conversation with a single INSERT. When it breaks
+        a constraint, the messages are saved one by one and the conflicting ones
+        are dropped. When the database fails, they stay pending for the next flush.
+
+        :param messages: Pending messages of the conversation.
+        :return: Number of handled messages from the start of the list, dropped
+                 messages and the database error if there was one.
+        """
+
+        try:
+            async with in_transaction(DEFAULT_CONNECTION) as connection:
+                await ConversationMessage.bulk_create(messages, using_db=connection)
+            return len(messages), [], None
+        except IntegrityError:
+            self.flush_errors += 1
+        except Exception as e:
+            self.flush_errors += 1
+            return 0, [], e
+
+        dropped: List[ConversationMessage] = []
+        for handled, message in enumerate(messages):
+            try:
+                await ConversationMessage.bulk_create([message])
+            except IntegrityError:
+                self.dropped_messages += 1
+                dropped.append(message)
+            except Exception as e:
+                return handled, dropped, e
+        return len(messages), dropped, None
+
+    def stats(self) -> Dict[str, Any]:
+        now: float = time.monotonic()
+        dirty: List[ConversationEntry] = [entry for entry in self._entries.values() if entry.pending]
+
+        return {
+            'durability': self.conf.durability,
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_bytes': self.conf.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'dirty_entries': len(dirty) + len(self._evicted),
+            'pending_messages': sum(len(entry.pending) for entry in dirty) + sum(len(messages) for messages in self._evicted.values()),
+            'flush_lag': round(max((now - entry.dirty_since for entry in dirty), default=0.0), 4),
+            'last_flush_lag': round(self.last_flush_lag, 4),
+            'flushes': self.flushes,
+            'flushed_messages': self.flushed_messages,
+            'flush_errors': self.flush_errors,
+            'dropped_messages': self.dropped_messages
+        }
+
+
+conversation_cache: ConversationCache = ConversationCache()
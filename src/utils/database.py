@@ -0,0 +1,45 @@
+from typing import Any, Dict
+
+from tortoise import BaseDBAsyncClient, connections
+
+READ_CONNECTION: str = 'read'
+DEFAULT_CONNECTION: str = 'default'
+
+
+def read_connection() -> BaseDBAsyncClient:
+    """
+    Read-only connection for read-heavy queries, primary connection if no
+    read-only connection is configured.
+    """
+
+    return connections.get(READ_CONNECTION if READ_CONNECTION in connections.db_config else DEFAULT_CONNECTION)
+
+
+def pool_stats(connection: BaseDBAsyncClient) -> Dict[str, Any]:
+    pool: Any = getattr(connection, '_pool', None)
+    stats: Dict[str, Any] = {
+        'engine': type(connection).__module__.rsplit('.', 2)[-2]
+    }
+    if pool is None or not hasattr(pool, 'get_size'):
+        return stats
+
+    queue: Any = getattr(pool, '_queue', None)
+    return {
+        **stats,
+        'min_size': pool.get_min_size(),
+        'max_size': pool.get_max_size(),
+        'size': pool.get_size(),
+        'idle': pool.get_idle_size(),
+        'in_use': pool.get_size() - pool.get_idle_size(),
+        'waiting': len(getattr(queue, '_getters', None) or ())
+    }
+
+
+def database_stats() -> Dict[str, Any]:
+    """
+    Connection pool usage of every configured database connection.
+    """
+
+    return {
+        name: pool_stats(connections.get(name)) for name in connections.db_config
+    }
@@ -0,0 +1,202 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+import asyncpg
+from tortoise import BaseDBAsyncClient, connections
+
+from schemas.conf import DatabaseConfig
+
+Deliver = Callable[[str, Optional[str]], None]
+Callback = Callable[[Optional[str]], Any]
+
+
+class MemoryTransport:
+    """
+    Delivers events only within the current process, used with sqlite and in tests.
+    """
+
+    name: str = 'memory'
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+        self._channels: set = set()
+
+    async def open(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def close(self) -> None:
+        self._deliver = None
+        self._channels.clear()
+
+    async def listen(self, channel: str) -> None:
+        self._channels.add(channel)
+
+    async def unlisten(self, channel: str) -> None:
+        self._channels.discard(channel)
+
+    async def publish(self, channel: str, payload: str, connection: Optional[BaseDBAsyncClient] = None) -> None:
+        if self._deliver is not None and channel in self._channels:
+            asyncio.get_running_loop().call_soon(self._deliver, channel, payload)
+
+
+class PostgresTransport:
+    """
+    Delivers events to every worker with Postgres LISTEN/NOTIFY.
+
+    Every worker listens on a single dedicated connection. Events are sent with
+    pg_notify on the ORM connection, so an event published inside a transaction
+    is delivered only after the transaction commits. When the listening
+    connection is lost, it's reopened and every channel gets an empty event,
+    because events sent in the meantime are lost.
+    """
+
+    name: str = 'postgres'
+
+    def __init__(self, conf: DatabaseConfig, reconnect_delay: float = 1.0):
+        self.conf: DatabaseConfig = conf
+        self.reconnect_delay: float = reconnect_delay
+        self._deliver: Optional[Deliver] = None
+        self._connection: Optional[asyncpg.Connection] = None
+        self._channels: set = set()
+        self._reconnecting: Optional[asyncio.Task] = None
+        self.reconnects: int = 0
+
+    async def open(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        await self._connect()
+
+    async def _connect(self) -> None:
+        self._connection = await asyncpg.connect(
+            host=self.conf.db_host,
+            port=self.conf.db_port,
+            user=self.conf.db_user,
+            password=self.conf.db_password,
+            database=self.conf.db_name,
+            timeout=self.conf.connect_timeout
+        )
+        self._connection.add_termination_listener(self._terminated)
+        for channel in self._channels:
+            await self._connection.add_listener(channel, self._notification)
+
+    def _notification(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        if self._deliver is not None:
+            self._deliver(channel, payload)
+
+    def _terminated(self, connection: asyncpg.Connection) -> None:
+        if self._deliver is not None and (self._reconnecting is None or self._reconnecting.done()):
+            self._reconnecting = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while self._deliver is not None:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self._connect()
+            except Exception:
+                continue
+
+            self.reconnects += 1
+            for channel in self._channels:
+                self._deliver(channel, None)
+            return
+
+    async def close(self) -> None:
+        self._deliver = None
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+        self._channels.clear()
+
+    async def listen(self, channel: str) -> None:
+        self._channels.add(channel)
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.add_listener(channel, self._notification)
+
+    async def unlisten(self, channel: str) -> None:
+        self._channels.discard(channel)
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.remove_listener(channel, self._notification)
+
+    async def publish(self, channel: str, payload: str, connection: Optional[BaseDBAsyncClient] = None) -> None:
+        await (connection or connections.get('default')).execute_query(
+            'SELECT pg_notify($1, $2)', [channel, payload]
+        )
+
+
+class EventBus:
+    """
+    Publish/subscribe of small text events between the application workers.
+
+    The transport is chosen on startup, Postgres LISTEN/NOTIFY when running
+    on Postgres and in-process delivery otherwise. The bus listens on every
+    channel once per worker, no matter how many callbacks subscribe to it.
+    A callback receives the payload of the event, or None when events might
+    have been lost and subscribers should reload their state.
+    """
+
+    def __init__(self):
+        self.transport: Any = MemoryTransport()
+        self._subscriptions: Dict[str, List[Callback]] = dict()
+
+        self.published: int = 0
+        self.delivered: int = 0
+        self.callback_errors: int = 0
+
+    async def open(self, transport: Optional[Any] = None) -> None:
+        self.transport = transport or MemoryTransport()
+        await self.transport.open(self._deliver)
+        for channel in self._subscriptions:
+            await self.transport.listen(channel)
+
+    async def close(self) -> None:
+        await self.transport.close()
+
+    async def subscribe(self, channel: str, callback: Callback) -> None:
+        if channel not in self._subscriptions:
+            self._subscriptions[channel] = []
+            await self.transport.listen(channel)
+        self._subscriptions[channel].append(callback)
+
+    async def unsubscribe(self, channel: str, callback: Callback) -> None:
+        callbacks: List[Callback] = self._subscriptions.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if channel in self._subscriptions and not callbacks:
+            del self._subscriptions[channel]
+            await self.transport.unlisten(channel)
+
+    async def publish(self, channel: str, payload: str, connection: Optional[BaseDBAsyncClient] = None) -> None:
+        """
+        Sends the event to subscribers of the channel in every worker.
+
+        :param channel: Name of the channel.
+        :param payload: Text of the event, at most 8000 bytes with Postgres.
+        :param connection: Database connection or transaction used for sending.
+        :return: None
+        """
+
+        await self.transport.publish(channel, payload, connection=connection)
+        self.published += 1
+
+    def _deliver(self, channel: str, payload: Optional[str]) -> None:
+        for callback in list(self._subscriptions.get(channel, [])):
+            try:
+                result: Any = callback(payload)
+                if asyncio.iscoroutine(result):
+                    asyncio.get_running_loop().create_task(result)
+            except Exception:
+                self.callback_errors += 1
+            self.delivered += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'transport': self.transport.name,
+            'channels': {channel: len(callbacks) for channel, callbacks in self._subscriptions.items()},
+            'published': self.published,
+            'delivered': self.delivered,
+            'callback_errors': self.callback_errors
+        }
+
+
+event_bus: EventBus = EventBus()
@@ -0,0 +1,262 @@
+import math
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from schemas.conf import FastPathConfig, PricingConfig
+from .pricing import price_floor
+from .text import PRICE, extract_prices
+
+ACCEPT: str = 'accept'
+ACCEPT_PRICE: str = 'accept_price'
+COUNTER: str = 'counter'
+BELOW_MINIMUM: str = 'below_minimum'
+REJECT: str = 'reject'
+
+DEFAULT_LANGUAGE: str = 'english'
+
+KEYWORDS: Dict[str, Dict[str, List[str]]] = {
+    'english': {
+        ACCEPT: ['deal', 'deal done', 'agreed', 'accept', 'accepted', 'ok', 'okay', 'sounds good', 'confirmed', 'we take it'],
+        REJECT: ['not interested', 'no thanks', 'no thank you', 'decline', 'cannot do', "can't do", 'not ok', 'not okay', 'no deal']
+    },
+    'german': {
+        ACCEPT: ['einverstanden', 'akzeptiert', 'passt', 'machen wir', 'abgemacht', 'bestätigt', 'ok'],
+        REJECT: ['kein interesse', 'nicht interessiert', 'leider nicht', 'absage', 'nein danke', 'passt nicht', 'nicht ok']
+    },
+    'italian': {
+        ACCEPT: ["d'accordo", 'accetto', 'accettiamo', 'va bene', 'confermo', 'affare fatto', 'ok'],
+        REJECT: ['non siamo interessati', 'non interessati', 'no grazie', 'rifiutiamo', 'non possiamo', 'non va bene']
+    },
+    'french': {
+        ACCEPT: ["d'accord", 'accepté', "j'accepte", 'ça marche', 'confirmé', 'ok'],
+        REJECT: ['pas intéressé', 'pas intéressés', 'non merci', 'nous refusons', 'impossible', "pas d'accord"]
+    }
+}
+
+FILLERS: Dict[str, List[str]] = {
+    'english': ['thanks', 'thank you', 'sorry', 'please'],
+    'german': ['danke', 'vielen dank', 'bitte', 'leider'],
+    'italian': ['grazie', 'grazie mille', 'purtroppo', 'per favore'],
+    'french': ['merci', 'merci beaucoup', 'désolé', 'désolés', "s'il vous plaît"]
+}
+
+CURRENCIES: List[str] = ['euro', 'euros', 'eur', '€']
+
+TEMPLATES: Dict[str, Dict[str, str]] = {
+    'english': {
+        ACCEPT: 'Great, thank you! We confirm the transport and will send you the order details shortly.',
+        ACCEPT_PRICE: 'Agreed, {price} Euro works for us. We will send you the order details shortly.',
+        COUNTER: 'Thank you for your offer. We can meet you at {price} Euro, would that work for you?',
+        BELOW_MINIMUM: 'Unfortunately {offer} Euro is below what we can accept. We could do {price} Euro.',
+        REJECT: 'Thank you for letting us know. We hope to work together on another transport.'
+    },
+    'german': {
+        ACCEPT: 'Vielen Dank! Wir bestätigen den Transport und senden Ihnen in Kürze die Auftragsdetails.',
+        ACCEPT_PRICE: 'Einverstanden, {price} Euro passt für uns. Die Auftragsdetails senden wir Ihnen in Kürze.',
+        COUNTER: 'Danke für Ihr Angebot. Wir können Ihnen {price} Euro anbieten, passt das für Sie?',
+        BELOW_MINIMUM: 'Leider liegen {offer} Euro unter unserem Rahmen. Wir könnten {price} Euro anbieten.',
+        REJECT: 'Danke für Ihre Rückmeldung. Wir freuen uns auf eine Zusammenarbeit bei einem anderen Transport.'
+    },
+    'italian': {
+        ACCEPT: "Grazie mille! Confermiamo il trasporto e le invieremo a breve i dettagli dell'ordine.",
+        ACCEPT_PRICE: "D'accordo, {price} Euro vanno bene per noi. Le invieremo a breve i dettagli dell'ordine.",
+        COUNTER: 'Grazie per la sua offerta. Possiamo arrivare a {price} Euro, le andrebbe bene?',
+        BELOW_MINIMUM: 'Purtroppo {offer} Euro sono al di sotto di quanto possiamo accettare. Potremmo fare {price} Euro.',
+        REJECT: 'Grazie per averci avvisato. Speriamo di collaborare per un altro trasporto.'
+    },
+    'french': {
+        ACCEPT: 'Merci beaucoup ! Nous confirmons le transport et vous enverrons les détails de la commande sous peu.',
+        ACCEPT_PRICE: "D'accord, {price} euros nous conviennent. Nous vous enverrons les détails de la commande sous peu.",
+        COUNTER: 'Merci pour votre offre. Nous pouvons proposer {price} euros, cela vous convient-il ?',
+        BELOW_MINIMUM: 'Malheureusement, {offer} euros est en dessous de ce que nous pouvons accepter. Nous pourrions faire {price} euros.',
+        REJECT: 'Merci de nous avoir prévenus. Nous espérons travailler ensemble sur un autre transport.'
+    }
+}
+
+
+def _phrases(phrases: List[str]) -> re.Pattern:
+    ordered: List[str] = sorted(phrases, key=len, reverse=True)
+    return re.compile('|'.join(rf"(?<![\w']){re.escape(phrase)}(?![\w'])" for phrase in ordered))
+
+
+def _amount(price: float) -> str:
+    return f'{price:.0f}' if price == round(price) else f'{price:.2f}'
+
+
+class Decision:
+
+    def __init__(self, kind: str, reply: str, price: Optional[float] = None):
+        self.kind: str = kind
+        self.reply: str = reply
+        self.price: Optional[float] = price
+
+
+class NegotiationFastPath:
+    """
+    Answers unambiguous partner messages without the LLM.
+
+    A short message without a question is answered only if it consists of
+    nothing but acceptance or rejection phrases of the partner language or
+    English, or of a single price, apart from courtesies and currency. Anything
+    else, such as a condition or an acceptance with a but, goes to the LLM.
+    Counter-offers follow the rules of the negotiation prompt: a price close to
+    the target price or above our last offer is accepted unless it's below the
+    minimal price, even when the target price is below the price floor, since
+    the floor limits only our own offers. Otherwise we concede a part of the
+    difference to our last offer, never going below the price floor or above
+    our last offer, so a last offer below the floor is repeated. Replies come
+    from templates in the partner language.
+    """
+
+    def __init__(self, conf: Optional[FastPathConfig] = None, pricing: Optional[PricingConfig] = None):
+        self.conf: FastPathConfig = conf or FastPathConfig()
+        self.pricing: PricingConfig = pricing or PricingConfig()
+        self._keywords: Dict[str, Dict[str, re.Pattern]] = {
+            language: {kind: _phrases(phrases) for kind, phrases in keywords.items()}
+            for language, keywords in KEYWORDS.items()
+        }
+        self._fillers: Dict[str, re.Pattern] = {language: _phrases(phrases) for language, phrases in FILLERS.items()}
+        self._currencies: re.Pattern = _phrases(CURRENCIES)
+
+        self.hits: Dict[str, int] = {kind: 0 for kind in (ACCEPT, ACCEPT_PRICE, COUNTER, BELOW_MINIMUM, REJECT)}
+        self.misses: int = 0
+        self.decision_time: float = 0.0
+        self.llm_calls: int = 0
+        self.llm_time: float = 0.0
+
+    def language(self, context: Dict[str, Any]) -> str:
+        language: str = str(context.get('partner_language') or '').strip().lower()
+        return language if language in TEMPLATES else DEFAULT_LANGUAGE
+
+    def _matches(self, language: str, kind: str, text: str) -> bool:
+        return any(
+            self._keywords[name][kind].search(text) is not None
+            for name in {language, DEFAULT_LANGUAGE}
+        )
+
+    def _rest(self, language: str, kind: str, text: str) -> str:
+        """
+        Text left over after removing phrases of the kind, courtesies, prices,
+        currencies and punctuation.
+        """
+
+        text = self._currencies.sub(' ', PRICE.sub(' ', text))
+        for name in (language, DEFAULT_LANGUAGE):
+            text = self._fillers[name].sub(' ', self._keywords[name][kind].sub(' ', text))
+        return re.sub(r'[\W_]+', ' ', text).strip()
+
+    def _round(self, price: float) -> float:
+        return float(round(price / self.conf.price_step) * self.conf.price_step)
+
+    def counter_offer(self, context: Dict[str, Any], offer: float, last_offer: Optional[float]) -> Decision:
+        """
+        Deterministic answer to the price offered by the partner.
+
+        :param context: Context of the conversation with minimal and target price.
+        :param offer: Price offered by the partner.
+        :param last_offer: Price of our latest offer, target price if not known.
+        :return: Decision with the kind of the answer and our price.
+        """
+
+        minimal: float = float(context['minimal_price'])
+        target: float = float(context['target_price'])
+        last_offer = last_offer or target
+
+        if offer >= minimal and (offer >= last_offer or offer >= target * (1 - self.conf.tolerance)):
+            return Decision(ACCEPT_PRICE, '', offer)
+
+        floor: float = math.ceil(price_floor(minimal, self.pricing) / self.conf.price_step) * self.conf.price_step
+        if offer < minimal:
+            return Decision(BELOW_MINIMUM, '', min(floor, last_offer))
+
+        price: float = min(max(self._round(last_offer - (last_offer - offer) * self.conf.concession), floor), last_offer)
+        if price <= offer:
+            return Decision(ACCEPT_PRICE, '', offer)
+        return Decision(COUNTER, '', price)
+
+    def decide(self, context: Dict[str, Any], message: str, last_offer: Optional[float] = None) -> Optional[Decision]:
+        """
+        Answer to the partner message, if it's unambiguous.
+
+        :param context: Context of the conversation.
+        :param message: Partner message.
+        :param last_offer: Price of our latest offer.
+        :return: Decision with the reply, None when the LLM has to answer.
+        """
+
+        if not self.conf.enabled:
+            return None
+
+        start: float = time.perf_counter()
+        decision: Optional[Decision] = self._decide(context, message, last_offer)
+        self.decision_time += time.perf_counter() - start
+
+        if decision is None:
+            self.misses += 1
+        else:
+            self.hits[decision.kind] += 1
+        return decision
+
+    def _decide(self, context: Dict[str, Any], message: str, last_offer: Optional[float]) -> Optional[Decision]:
+        text: str = message.strip().lower().replace('’', "'")
+        if not text or '?' in text or len(text.split()) > self.conf.max_words:
+            return None
+
+        language: str = self.language(context)
+        templates: Dict[str, str] = TEMPLATES[language]
+        prices: List[float] = extract_prices(text)
+
+        if len(prices) == 1:
+            if self._rest(language, ACCEPT, text):
+                return None
+            if 'minimal_price' not in context or 'target_price' not in context:
+                return None
+            if prices[0] < float(context['minimal_price']) * self.conf.plausible_ratio:
+                return None
+            decision: Decision = self.counter_offer(context, prices[0], last_offer)
+            decision.reply = templates[decision.kind].format(
+                price=_amount(decision.price),
+                offer=_amount(prices[0])
+            )
+            return decision
+
+        if prices:
+            return None
+        accepts: bool = self._matches(language, ACCEPT, text)
+        rejects: bool = self._matches(language, REJECT, text)
+        if accepts == rejects:
+            return None
+
+        kind: str = ACCEPT if accepts else REJECT
+        if self._rest(language, kind, text):
+            return None
+        return Decision(kind, templates[kind])
+
+    def record_llm(self, seconds: float) -> None:
+        """
+        Records latency of a reply generated by the LLM, used to estimate saved latency.
+        """
+
+        self.llm_calls += 1
+        self.llm_time += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        hits: int = sum(self.hits.values())
+        decisions: int = hits + self.misses
+        llm_latency: float = self.llm_time / self.llm_calls if self.llm_calls else 0.0
+        decision_latency: float = self.decision_time / decisions if decisions else 0.0
+
+        return {
+            'enabled': self.conf.enabled,
+            'hits': hits,
+            'hits_by_kind': dict(self.hits),
+            'misses': self.misses,
+            'hit_rate': round(hits / decisions, 4) if decisions else 0.0,
+            'average_llm_latency': round(llm_latency, 4),
+            'average_decision_latency': round(decision_latency, 6),
+            'saved_latency': round(hits * max(llm_latency - decision_latency, 0.0), 4)
+        }
+
+
+fast_path: NegotiationFastPath = NegotiationFastPath()
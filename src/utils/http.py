@@ -0,0 +1,127 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+
+from schemas.conf import DataSourceConfig
+
+
+class DataSourceClient:
+    """
+    Long-lived pooled HTTP client for the data source API.
+
+    One instance is shared by the whole process, it's opened on application
+    startup and closed on shutdown, so connections (and TLS sessions) are
+    reused between requests instead of being negotiated on every call.
+    """
+
+    def __init__(self, conf: Optional[DataSourceConfig] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.conf: DataSourceConfig = conf or DataSourceConfig()
+        self._transport: Optional[httpx.AsyncBaseTransport] = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.requests: int = 0
+        self.in_flight: int = 0
+        self.retries: int = 0
+        self.errors: int = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None and not self._client.is_closed
+
+    async def open(self) -> None:
+        """
+        Creates the underlying connection pool, if it's not already opened.
+
+        :return: None
+        """
+
+        if self.is_open:
+            return
+
+        self._client = httpx.AsyncClient(
+            base_url=self.conf.base_url,
+            http2=self.conf.http2,
+            timeout=self.conf.timeout,
+            transport=self._transport,
+            limits=httpx.Limits(
+                max_connections=self.conf.max_connections,
+                max_keepalive_connections=self.conf.max_keepalive_connections,
+                keepalive_expiry=self.conf.keepalive_expiry
+            )
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+    async def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        Sends GET request to the data source, retrying transport errors
+        and 5xx responses with exponential backoff.
+
+        :param endpoint: Endpoint relative to the data source base url.
+        :param params: Query parameters.
+        :param headers: Additional headers, such as If-None-Match of a conditional request.
+        :return: Response of the data source, 304 is returned as well.
+        """
+
+        if not self.is_open:
+            await self.open()
+
+        timeout: float = self.conf.endpoint_timeouts.get(endpoint, self.conf.timeout)
+
+        attempt: int = 0
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            while True:
+                try:
+                    response: httpx.Response = await self._client.get(endpoint, params=params, headers=headers, timeout=timeout)
+                    if response.status_code == 304:
+                        return response
+                    if response.status_code < 500:
+                        response.raise_for_status()
+                        return response
+                    if attempt >= self.conf.retries:
+                        self.errors += 1
+                        response.raise_for_status()
+                except httpx.TransportError:
+                    if attempt >= self.conf.retries:
+                        self.errors += 1
+                        raise
+
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(self.conf.backoff * 2 ** (attempt - 1))
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Usage statistics of the connection pool, useful for sizing the limits.
+
+        :return: Dictionary with pool limits, connection counts and request counters.
+        """
+
+        connections: list = []
+        if self.is_open:
+            pool = getattr(self._client._transport, '_pool', None)
+            connections = list(getattr(pool, 'connections', []))
+
+        return {
+            'open': self.is_open,
+            'http2': self.conf.http2,
+            'max_connections': self.conf.max_connections,
+            'max_keepalive_connections': self.conf.max_keepalive_connections,
+            'connections': len(connections),
+            'idle_connections': len([c for c in connections if c.is_idle()]),
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'retries': self.retries,
+            'errors': self.errors
+        }
+
+
+data_source: DataSourceClient = DataSourceClient()
@@ -0,0 +1,215 @@
+import asyncio
+import datetime
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from tortoise import timezone
+from tortoise.expressions import F
+
+from models import DispatchJob
+from schemas.conf import JobQueueConfig
+
+QUEUED: str = 'queued'
+RUNNING: str = 'running'
+DONE: str = 'done'
+FAILED: str = 'failed'
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+Listener = Callable[[DispatchJob], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Queue of dispatch jobs run by a pool of worker tasks.
+
+    Jobs are stored in the database before they're queued, so they survive
+    a restart. A worker claims a job by switching its status from queued to
+    running, which lets every worker process pick up queued jobs of the others,
+    and a job can't run twice. On open and periodically afterwards, queued jobs
+    and lost jobs, which are running for well over the job timeout, are queued
+    again. A lost job fails once it used up its attempts.
+    """
+
+    def __init__(self, conf: Optional[JobQueueConfig] = None):
+        self.conf: JobQueueConfig = conf or JobQueueConfig()
+        self.handler: Optional[Handler] = None
+        self.listener: Optional[Listener] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Set[uuid.UUID] = set()
+        self._workers: List[asyncio.Task] = []
+        self._recoverer: Optional[asyncio.Task] = None
+        self.running: int = 0
+
+        self.enqueued: int = 0
+        self.rejected: int = 0
+        self.recovered: int = 0
+        self.abandoned: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self.listener_errors: int = 0
+        self.wait_time: float = 0.0
+        self.max_wait_time: float = 0.0
+        self.run_time: float = 0.0
+        self.max_run_time: float = 0.0
+
+    async def open(self) -> None:
+        self._queue = asyncio.Queue()
+        self._pending.clear()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.conf.workers)]
+        await self.recover()
+        self._recoverer = asyncio.create_task(self._recover_periodically())
+
+    async def close(self) -> None:
+        tasks: List[asyncio.Task] = self._workers + ([self._recoverer] if self._recoverer else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._workers, self._recoverer, self._queue = [], None, None
+        self._pending.clear()
+
+    def _put(self, id: uuid.UUID) -> None:
+        if id not in self._pending:
+            self._pending.add(id)
+            self._queue.put_nowait(id)
+
+    async def enqueue(self, payload: Dict[str, Any]) -> DispatchJob:
+        """
+        Stores the job and queues it.
+
+        :param payload: Payload passed to the handler.
+        :return: Stored job.
+        """
+
+        if self._queue is None:
+            raise HTTPException(detail='Job queue is not running', status_code=503)
+
+        if len(self._pending) >= self.conf.max_queued:
+            self.rejected += 1
+            raise HTTPException(
+                detail='Job queue is full',
+                status_code=503,
+                headers={'Retry-After': str(self.conf.retry_after)}
+            )
+
+        job: DispatchJob = await DispatchJob.create(status=QUEUED, payload=payload)
+        self._put(job.id)
+        self.enqueued += 1
+        return job
+
+    async def recover(self) -> int:
+        """
+        Queues stored jobs which are waiting, together with lost jobs which
+        have attempts left, lost jobs without attempts left fail.
+
+        :return: Number of newly queued jobs.
+        """
+
+        now: datetime.datetime = timezone.now()
+        lost: datetime.datetime = now - datetime.timedelta(seconds=max(self.conf.lost_after, self.conf.job_timeout))
+        self.abandoned += await DispatchJob.filter(status=RUNNING, started__lt=lost, attempts__gte=self.conf.max_attempts).update(
+            status=FAILED,
+            error='Job was lost too many times',
+            finished=now
+        )
+        await DispatchJob.filter(status=RUNNING, started__lt=lost).update(status=QUEUED)
+
+        ids: List[uuid.UUID] = await DispatchJob.filter(status=QUEUED).order_by('enqueued').values_list('id', flat=True)
+        ids = [id for id in ids if id not in self._pending]
+        for id in ids:
+            self._put(id)
+
+        self.recovered += len(ids)
+        return len(ids)
+
+    async def _recover_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.conf.recover_interval)
+            try:
+                await self.recover()
+            except Exception:
+                continue
+
+    async def _work(self) -> None:
+        while True:
+            id: uuid.UUID = await self._queue.get()
+            self._pending.discard(id)
+            try:
+                await self._run(id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                continue
+
+    async def _run(self, id: uuid.UUID) -> None:
+        claimed: int = await DispatchJob.filter(id=id, status=QUEUED).update(
+            status=RUNNING,
+            started=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if not claimed:
+            return
+
+        job: DispatchJob = await DispatchJob.get(id=id)
+        wait_time: float = (job.started - job.enqueued).total_seconds()
+        self.wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        self.running += 1
+        start: float = time.perf_counter()
+        try:
+            result: Any = await asyncio.wait_for(self.handler(job.payload), timeout=self.conf.job_timeout)
+            job.status, job.result = DONE, json.loads(json.dumps(result, default=str))
+        except asyncio.CancelledError:
+            await DispatchJob.filter(id=id).update(status=QUEUED, started=None)
+            raise
+        except HTTPException as e:
+            job.status, job.error = FAILED, str(e.detail)
+        except Exception as e:
+            job.status, job.error = FAILED, str(e) or type(e).__name__
+        finally:
+            self.running -= 1
+
+        run_time: float = time.perf_counter() - start
+        self.run_time += run_time
+        self.max_run_time = max(self.max_run_time, run_time)
+        if job.status == DONE:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+        job.finished = timezone.now()
+        await job.save(update_fields=['status', 'result', 'error', 'finished'])
+
+        if self.listener is not None:
+            try:
+                await self.listener(job)
+            except Exception:
+                self.listener_errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        finished: int = self.completed + self.failed
+
+        return {
+            'workers': len(self._workers),
+            'queued': len(self._pending),
+            'running': self.running,
+            'max_queued': self.conf.max_queued,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'recovered': self.recovered,
+            'abandoned': self.abandoned,
+            'completed': self.completed,
+            'failed': self.failed,
+            'listener_errors': self.listener_errors,
+            'average_wait_time': round(self.wait_time / finished, 4) if finished else 0.0,
+            'max_wait_time': round(self.max_wait_time, 4),
+            'average_run_time': round(self.run_time / finished, 4) if finished else 0.0,
+            'max_run_time': round(self.max_run_time, 4)
+        }
+
+
+job_queue: JobQueue = JobQueue()
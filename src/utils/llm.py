@@ -0,0 +1,313 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import anthropic
+from fastapi import HTTPException
+
+from schemas.conf import LLMConfig
+from .llm_cache import LLMResponseCache
+from .llm_router import ProviderRouter
+
+
+class LLMProvider:
+    """
+    Base class of the LLM providers.
+
+    Providers create their SDK clients once in open() and implement generation
+    with native async calls, so a generation never blocks the event loop.
+    """
+
+    name: str = ''
+
+    def __init__(self, conf: LLMConfig):
+        self.conf: LLMConfig = conf
+
+    @property
+    def model(self) -> str:
+        raise NotImplementedError
+
+    async def open(self) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        yield await self.generate(prompt)
+
+
+class AnthropicProvider(LLMProvider):
+    name: str = 'anthropic'
+
+    def __init__(self, conf: LLMConfig):
+        super().__init__(conf)
+        self._client: Optional[anthropic.AsyncAnthropic] = None
+
+    @property
+    def model(self) -> str:
+        return self.conf.anthropic_model
+
+    async def open(self) -> None:
+        self._client = anthropic.AsyncAnthropic(
+            api_key=self.conf.anthropic_api_key
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+        self._client = None
+
+    async def generate(self, prompt: str) -> str:
+        message = await self._client.messages.create(
+            model=self.model,
+            max_tokens=self.conf.max_tokens,
+            temperature=self.conf.temperature,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        }
+                    ]
+                }
+            ]
+        )
+        return ''.join(block.text for block in message.content if block.type == 'text')
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self._client.messages.stream(
+            model=self.model,
+            max_tokens=self.conf.max_tokens,
+            temperature=self.conf.temperature,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+
+class GeminiProvider(LLMProvider):
+    name: str = 'gemini'
+
+    def __init__(self, conf: LLMConfig):
+        super().__init__(conf)
+        self._model: Any = None
+
+    @property
+    def model(self) -> str:
+        return self.conf.gemini_model
+
+    async def open(self) -> None:
+        import google.generativeai as genai
+
+        genai.configure(api_key=self.conf.gemini_api_key)
+        self._model = genai.GenerativeModel(self.model)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self._model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+class LLMService:
+    """
+    Common entry point for LLM generation.
+
+    Providers which have an API key configured are opened once on application
+    startup. With routing enabled and no provider requested explicitly, the
+    router picks the fastest healthy one. Every generation runs under a global
+    concurrency limit and a per-call timeout.
+    """
+
+    def __init__(self, conf: Optional[LLMConfig] = None, cache: Optional[LLMResponseCache] = None):
+        self.conf: LLMConfig = conf or LLMConfig()
+        self.cache: LLMResponseCache = cache or LLMResponseCache()
+        self.providers: Dict[str, LLMProvider] = dict()
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(self.conf.max_concurrency)
+        self.router: ProviderRouter = ProviderRouter(self.conf, self.providers, self._semaphore)
+        self._opened: bool = False
+
+        self.requests: int = 0
+        self.in_flight: int = 0
+        self.timeouts: int = 0
+        self.errors: int = 0
+        self.streams: int = 0
+        self.time_to_first_token: float = 0.0
+
+    def configured_providers(self) -> Dict[str, LLMProvider]:
+        providers: Dict[str, LLMProvider] = dict()
+        if self.conf.anthropic_api_key:
+            providers[AnthropicProvider.name] = AnthropicProvider(self.conf)
+        if self.conf.gemini_api_key:
+            providers[GeminiProvider.name] = GeminiProvider(self.conf)
+        return providers
+
+    async def open(self) -> None:
+        if self._opened:
+            return
+
+        for name, provider in self.configured_providers().items():
+            await provider.open()
+            self.providers[name] = provider
+        self._opened = True
+
+    async def close(self) -> None:
+        for provider in self.providers.values():
+            await provider.close()
+        self.providers.clear()
+        self._opened = False
+
+    def register(self, provider: LLMProvider) -> None:
+        self.providers[provider.name] = provider
+        self._opened = True
+
+    def provider(self, name: Optional[str] = None) -> LLMProvider:
+        provider: Optional[LLMProvider] = self.providers.get(name or self.conf.provider)
+        if provider is None:
+            raise HTTPException(detail=f'LLM provider {name or self.conf.provider} is not configured', status_code=503)
+        return provider
+
+    async def _route(self, prompt: str, provider: Optional[str], timeout: Optional[float]) -> Tuple[str, LLMProvider]:
+        if provider is None and self.conf.routing:
+            return await self.router.generate(
+                lambda _provider: self._call(_provider, prompt, timeout)
+            )
+
+        _provider: LLMProvider = self.provider(provider)
+        return await self._generate(_provider, prompt, timeout), _provider
+
+    async def generate(
+            self,
+            prompt: str,
+            provider: Optional[str] = None,
+            timeout: Optional[float] = None,
+            cache: Optional[str] = None
+    ) -> str:
+        """
+        Generates a reply for the prompt.
+
+        :param prompt: Prompt sent to the model.
+        :param provider: Name of the provider, configured default provider if not set.
+        :param timeout: Timeout in seconds, configured timeout if not set.
+        :param cache: Name of the calling endpoint, reply is cached if the endpoint
+                      is enabled in the LLM cache configuration.
+        :return: Generated text.
+        """
+
+        if not self._opened:
+            await self.open()
+
+        if not self.cache.enabled(cache):
+            reply, _ = await self._route(prompt, provider, timeout)
+            return reply
+
+        key: str = self.cache.key(
+            prompt=prompt,
+            provider=provider or 'auto',
+            model=self.providers[provider].model if provider in self.providers else '',
+            parameters={'max_tokens': self.conf.max_tokens, 'temperature': self.conf.temperature}
+        )
+        reply: Optional[str] = await self.cache.get(key)
+        if reply is None:
+            reply, _provider = await self._route(prompt, provider, timeout)
+            await self.cache.set(key, reply, provider=_provider.name, model=_provider.model)
+        return reply
+
+    async def _generate(self, _provider: LLMProvider, prompt: str, timeout: Optional[float]) -> str:
+        async with self._semaphore:
+            return await self._call(_provider, prompt, timeout)
+
+    async def _call(self, _provider: LLMProvider, prompt: str, timeout: Optional[float]) -> str:
+        """
+        Runs a single generation, the caller holds a slot of the concurrency limit.
+        """
+
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            return await asyncio.wait_for(_provider.generate(prompt), timeout=timeout or self.conf.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(detail='LLM provider timed out', status_code=504)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def stream(self, prompt: str, provider: Optional[str] = None, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Streams a reply for the prompt chunk by chunk. Timeout is applied to
+        waiting for every single chunk. Streams are not routed, they always use
+        the requested or default provider without failover and are not counted
+        in the provider health.
+
+        :param prompt: Prompt sent to the model.
+        :param provider: Name of the provider, configured default provider if not set.
+        :param timeout: Timeout in seconds, configured timeout if not set.
+        :return: Async iterator of generated text chunks.
+        """
+
+        if not self._opened:
+            await self.open()
+
+        _provider: LLMProvider = self.provider(provider)
+        chunks: AsyncIterator[str] = _provider.stream(prompt)
+
+        self.requests += 1
+        async with self._semaphore:
+            self.in_flight += 1
+            start: float = time.perf_counter()
+            first: bool = True
+            try:
+                while True:
+                    try:
+                        chunk: str = await asyncio.wait_for(chunks.__anext__(), timeout=timeout or self.conf.timeout)
+                    except StopAsyncIteration:
+                        break
+
+                    if first:
+                        first = False
+                        self.streams += 1
+                        self.time_to_first_token += time.perf_counter() - start
+                    yield chunk
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise HTTPException(detail='LLM provider timed out', status_code=504)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                await chunks.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'providers': {name: provider.model for name, provider in self.providers.items()},
+            'max_concurrency': self.conf.max_concurrency,
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'streams': self.streams,
+            'average_time_to_first_token': round(self.time_to_first_token / self.streams, 4) if self.streams else 0.0,
+            'cache': self.cache.stats(),
+            'routing': self.router.stats()
+        }
+
+
+llm: LLMService = LLMService()
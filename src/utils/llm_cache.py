@@ -0,0 +1,136 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from tortoise import timezone
+
+from models import LLMResponse
+from schemas.conf import LLMCacheConfig
+
+
+def normalize_prompt(prompt: str) -> str:
+    return ' '.join(prompt.split())
+
+
+class LLMResponseCache:
+    """
+    Two tier cache of LLM responses, keyed by hash of the normalized prompt and
+    model parameters.
+
+    The first tier is an in-memory LRU, the second one is the llm_responses
+    table, so cached responses are shared between workers and survive restarts.
+    Both tiers are bounded in size and entries expire after the configured TTL.
+    """
+
+    PRUNE_EVERY: int = 100
+
+    def __init__(self, conf: Optional[LLMCacheConfig] = None):
+        self.conf: LLMCacheConfig = conf or LLMCacheConfig()
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+
+        self.memory_hits: int = 0
+        self.database_hits: int = 0
+        self.misses: int = 0
+        self.stores: int = 0
+        self.database_errors: int = 0
+
+    def enabled(self, endpoint: Optional[str]) -> bool:
+        return endpoint is not None and endpoint in self.conf.endpoints
+
+    def key(self, prompt: str, provider: str, model: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+        payload: str = json.dumps(
+            [normalize_prompt(prompt), provider, model, parameters or {}],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Looks up the response in memory first and then in the database.
+
+        :param key: Cache key.
+        :return: Cached response or None.
+        """
+
+        cached: Optional[Tuple[str, float]] = self._memory.get(key)
+        if cached and cached[1] > time.monotonic():
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return cached[0]
+
+        try:
+            row: Optional[LLMResponse] = await LLMResponse.filter(key=key, expires__gt=timezone.now()).first()
+        except Exception:
+            self.database_errors += 1
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.database_hits += 1
+        self._remember(key, row.response, (row.expires - timezone.now()).total_seconds())
+        return row.response
+
+    async def set(self, key: str, response: str, provider: str, model: str) -> None:
+        self._remember(key, response, self.conf.ttl)
+        self.stores += 1
+
+        try:
+            await LLMResponse.update_or_create(
+                key=key,
+                defaults={
+                    'provider': provider,
+                    'model': model,
+                    'response': response,
+                    'expires': timezone.now() + timedelta(seconds=self.conf.ttl)
+                }
+            )
+            if self.stores % self.PRUNE_EVERY == 0:
+                await self.prune()
+        except Exception:
+            self.database_errors += 1
+
+    def _remember(self, key: str, response: str, ttl: float) -> None:
+        self._memory[key] = (response, time.monotonic() + ttl)
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.conf.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def prune(self) -> int:
+        """
+        Deletes expired responses from the database and the oldest ones over the size limit.
+
+        :return: Number of deleted rows.
+        """
+
+        deleted: int = await LLMResponse.filter(expires__lte=timezone.now()).delete()
+
+        overflow: int = await LLMResponse.all().count() - self.conf.database_entries
+        if overflow > 0:
+            oldest: list = await LLMResponse.all().order_by('expires').limit(overflow).values_list('id', flat=True)
+            deleted += await LLMResponse.filter(id__in=oldest).delete()
+
+        return deleted
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups: int = self.memory_hits + self.database_hits + self.misses
+
+        return {
+            'endpoints': self.conf.endpoints,
+            'memory_entries': len(self._memory),
+            'memory_hits': self.memory_hits,
+            'database_hits': self.database_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.memory_hits + self.database_hits) / lookups, 4) if lookups else 0.0,
+            'stores': self.stores,
+            'database_errors': self.database_errors
+        }
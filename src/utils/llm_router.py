@@ -0,0 +1,224 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from schemas.conf import LLMConfig
+
+CLOSED: str = 'closed'
+OPEN: str = 'open'
+HALF_OPEN: str = 'half_open'
+
+
+class ProviderHealth:
+    """
+    Rolling latency and error rate of a provider, with a circuit breaker.
+
+    After the configured number of consecutive failures the breaker opens and
+    the provider is skipped. Once the reset period passes a single trial call
+    is let through, success closes the breaker and failure opens it again.
+    """
+
+    def __init__(self, conf: LLMConfig):
+        self.conf: LLMConfig = conf
+        self.latencies: Deque[float] = deque(maxlen=conf.window)
+        self.outcomes: Deque[bool] = deque(maxlen=conf.window)
+        self.consecutive_failures: int = 0
+        self.state: str = CLOSED
+        self.opened_at: float = 0.0
+        self._trial: bool = False
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+
+        latencies: List[float] = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def available(self) -> bool:
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.conf.breaker_reset:
+            self.state = HALF_OPEN
+
+        return self.state == HALF_OPEN and not self._trial
+
+    def started(self) -> None:
+        if self.state == HALF_OPEN:
+            self._trial = True
+
+    def success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self._trial = False
+
+    def failure(self) -> None:
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self._trial = False
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.conf.breaker_failures:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def cancelled(self) -> None:
+        self._trial = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'calls': len(self.outcomes),
+            'latency': round(self.latency, 4),
+            f'p{self.conf.hedge_percentile:g}': round(self.percentile(self.conf.hedge_percentile) or 0.0, 4),
+            'error_rate': round(self.error_rate, 4),
+            'consecutive_failures': self.consecutive_failures
+        }
+
+
+class ProviderRouter:
+    """
+    Chooses the provider for every generation.
+
+    Healthy providers are ordered by their rolling latency, penalized by their
+    error rate, providers without any calls yet are tried first. If the chosen
+    provider fails, the next one is used. With hedging enabled a second request
+    is sent to the next provider when the first one doesn't answer within its
+    latency percentile, the slower one is cancelled. Calls hold a slot of the
+    concurrency limit, latency is measured from the moment the slot is acquired
+    and no hedge is sent while all slots are taken.
+    """
+
+    def __init__(self, conf: LLMConfig, providers: Dict[str, Any], limit: Optional[asyncio.Semaphore] = None):
+        self.conf: LLMConfig = conf
+        self.providers: Dict[str, Any] = providers
+        self.limit: Optional[asyncio.Semaphore] = limit
+        self.health: Dict[str, ProviderHealth] = dict()
+
+        self.hedges: int = 0
+        self.hedge_wins: int = 0
+        self.failovers: int = 0
+
+    def _health(self, provider: Any) -> ProviderHealth:
+        key: str = f'{provider.name}:{provider.model}'
+        if key not in self.health:
+            self.health[key] = ProviderHealth(self.conf)
+        return self.health[key]
+
+    def order(self) -> List[Any]:
+        """
+        Available providers, best one first.
+        """
+
+        def score(provider: Any) -> Tuple[float, bool, str]:
+            health: ProviderHealth = self._health(provider)
+            return health.latency * (1 + 4 * health.error_rate), provider.name != self.conf.provider, provider.name
+
+        return sorted([provider for provider in self.providers.values() if self._health(provider).available()], key=score)
+
+    def pick(self) -> Any:
+        providers: List[Any] = self.order()
+        if not providers:
+            raise HTTPException(detail='No healthy LLM provider is available', status_code=503)
+        return providers[0]
+
+    def saturated(self) -> bool:
+        return self.limit is not None and self.limit.locked()
+
+    async def _call(self, provider: Any, call: Callable[[Any], Awaitable[str]]) -> str:
+        health: ProviderHealth = self._health(provider)
+        health.started()
+
+        try:
+            async with self.limit or contextlib.nullcontext():
+                start: float = time.perf_counter()
+                reply: str = await call(provider)
+        except asyncio.CancelledError:
+            health.cancelled()
+            raise
+        except Exception:
+            health.failure()
+            raise
+
+        health.success(time.perf_counter() - start)
+        return reply
+
+    async def generate(self, call: Callable[[Any], Awaitable[str]]) -> Tuple[str, Any]:
+        """
+        Runs the generation on the best provider, with failover and optional hedging.
+
+        :param call: Coroutine function which generates a reply with the given provider.
+        :return: Reply and provider which generated it.
+        """
+
+        providers: List[Any] = self.order()
+        if not providers:
+            raise HTTPException(detail='No healthy LLM provider is available', status_code=503)
+
+        error: Optional[Exception] = None
+        while providers:
+            provider: Any = providers.pop(0)
+            task: asyncio.Task = asyncio.create_task(self._call(provider, call))
+            tasks: Dict[asyncio.Task, Any] = {task: provider}
+
+            deadline: Optional[float] = self._health(provider).percentile(self.conf.hedge_percentile)
+            if self.conf.hedging and providers and deadline is not None:
+                try:
+                    done, _ = await asyncio.wait({task}, timeout=deadline)
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                if not done and not self.saturated():
+                    hedge: Any = providers.pop(0)
+                    tasks[asyncio.create_task(self._call(hedge, call))] = hedge
+                    self.hedges += 1
+
+            try:
+                reply, winner = await self._first_reply(tasks)
+            except Exception as e:
+                error = e
+                self.failovers += 1
+                continue
+
+            if winner is not provider:
+                self.hedge_wins += 1
+            return reply, winner
+
+        raise error
+
+    async def _first_reply(self, tasks: Dict[asyncio.Task, Any]) -> Tuple[str, Any]:
+        pending: set = set(tasks)
+        error: Optional[Exception] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), tasks[task]
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hedging': self.conf.hedging,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'failovers': self.failovers,
+            'providers': {key: health.stats() for key, health in self.health.items()}
+        }
@@ -0,0 +1,206 @@
+import asyncio
+import bisect
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from tortoise import BaseDBAsyncClient, connections
+
+from models import Option
+from schemas.conf import OptionCacheConfig
+from .database import DEFAULT_CONNECTION, read_connection
+from .events import EventBus, event_bus
+
+MISSING: object = object()
+
+
+class OptionCache:
+    """
+    Read-through cache of options.
+
+    The first listing loads a snapshot of all options, single options are
+    looked up in the snapshot or loaded one by one before that. Changes are
+    published on the event bus, so every worker drops the changed key and the
+    snapshot. The whole cache is reloaded periodically in case an event was
+    lost. A load which was running while an invalidation arrived isn't stored,
+    and invalidated options are loaded from the primary, so a lagging read
+    replica can't put the old value back.
+    """
+
+    def __init__(self, conf: Optional[OptionCacheConfig] = None, bus: Optional[EventBus] = None):
+        self.conf: OptionCacheConfig = conf or OptionCacheConfig()
+        self.bus: EventBus = bus or event_bus
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._sorted: List[str] = []
+        self._snapshot_loaded: float = 0.0
+        self._keys: Dict[str, Any] = dict()
+        self._loading: Optional[asyncio.Task] = None
+        self._version: int = 0
+        self._primary_keys: Set[str] = set()
+        self._primary_all: bool = False
+        self._refresher: Optional[asyncio.Task] = None
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.loads: int = 0
+        self.invalidations: int = 0
+
+    async def open(self) -> None:
+        await self.bus.subscribe(self.conf.channel, self.invalidate)
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_periodically())
+
+    async def close(self) -> None:
+        await self.bus.unsubscribe(self.conf.channel, self.invalidate)
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        self.invalidate()
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.conf.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                self.invalidate()
+
+    async def refresh(self) -> None:
+        """
+        Reloads the snapshot while the current one is still served.
+        """
+
+        self._keys.clear()
+        if self._snapshot is not None:
+            await self._load_snapshot()
+
+    def _connection(self, key: Optional[str] = None) -> BaseDBAsyncClient:
+        """
+        Primary connection for options invalidated since their last load, read connection otherwise.
+        """
+
+        primary: bool = self._primary_all or (key in self._primary_keys if key is not None else bool(self._primary_keys))
+        return connections.get(DEFAULT_CONNECTION) if primary else read_connection()
+
+    async def _load_snapshot(self) -> Dict[str, Any]:
+        version: int = self._version
+        rows: list = await Option.all().using_db(self._connection()).order_by('key').values('key', 'value')
+        snapshot: Dict[str, Any] = {row['key']: row['value'] for row in rows}
+
+        self.loads += 1
+        if version == self._version:
+            self._primary_keys.clear()
+            self._primary_all = False
+            self._sorted = sorted(snapshot)
+            self._snapshot = snapshot
+            self._snapshot_loaded = time.monotonic()
+        return snapshot
+
+    async def all(self) -> Dict[str, Any]:
+        """
+        Values of all options by their keys.
+        """
+
+        if self._snapshot is not None:
+            self.hits += 1
+            return self._snapshot
+
+        self.misses += 1
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.create_task(self._load_snapshot())
+        return await asyncio.shield(self._loading)
+
+    async def page(self, limit: Optional[int], after: Optional[str] = None, prefix: Optional[str] = None) -> List[Tuple[str, Any]]:
+        """
+        Options ordered by key, starting after the given key.
+
+        :param limit: Maximum number of options, every option if not set.
+        :param after: Key of the last option of the previous page.
+        :param prefix: Returns only options which keys start with the prefix.
+        :return: Keys and values of the options.
+        """
+
+        snapshot: Dict[str, Any] = await self.all()
+        keys: List[str] = self._sorted if snapshot is self._snapshot else sorted(snapshot)
+
+        start: int = bisect.bisect_right(keys, after) if after is not None else 0
+        if prefix:
+            start = max(start, bisect.bisect_left(keys, prefix))
+
+        page: List[Tuple[str, Any]] = []
+        for key in keys[start:start + limit] if limit is not None else keys[start:]:
+            if prefix and not key.startswith(prefix):
+                break
+            page.append((key, snapshot[key]))
+        return page
+
+    async def get(self, key: str) -> Any:
+        """
+        Value of the option.
+
+        :param key: Key of the option.
+        :return: Value of the option or MISSING if it doesn't exist.
+        """
+
+        if self._snapshot is not None:
+            self.hits += 1
+            return self._snapshot.get(key, MISSING)
+
+        if key in self._keys:
+            self.hits += 1
+            return self._keys[key]
+
+        self.misses += 1
+        version: int = self._version
+        rows: list = await Option.filter(key=key).using_db(self._connection(key)).values('value')
+        value: Any = rows[0]['value'] if rows else MISSING
+
+        self.loads += 1
+        if version == self._version:
+            self._keys[key] = value
+            self._primary_keys.discard(key)
+        return value
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Drops the key and the snapshot, or the whole cache if key is not provided.
+        """
+
+        self._version += 1
+        self.invalidations += 1
+        self._snapshot = None
+        if not key:
+            self._keys.clear()
+            self._primary_all = True
+        else:
+            self._keys.pop(key, None)
+            self._primary_keys.add(key)
+
+    async def changed(self, key: Optional[str] = None) -> None:
+        """
+        Invalidates the key in this worker and publishes the change to the others,
+        called after the change is committed.
+
+        :param key: Key of the changed option, every option if not provided.
+        :return: None
+        """
+
+        self.invalidate(key)
+        await self.bus.publish(self.conf.channel, key or '')
+
+    def stats(self) -> Dict[str, Any]:
+        lookups: int = self.hits + self.misses
+
+        return {
+            'enabled': self.conf.enabled,
+            'snapshot': self._snapshot is not None,
+            'snapshot_age': round(time.monotonic() - self._snapshot_loaded, 3) if self._snapshot is not None else None,
+            'options': len(self._snapshot) if self._snapshot is not None else len(self._keys),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'loads': self.loads,
+            'invalidations': self.invalidations
+        }
+
+
+option_cache: OptionCache = OptionCache()
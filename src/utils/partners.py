@@ -0,0 +1,275 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .dispatcher import get_partners, get_transport_history
+from .pricing import LaneStatistics
+
+LOCATION_FIELDS: Tuple[str, ...] = ('load_city', 'load_country', 'unload_city', 'unload_country')
+
+
+def _normalize(value: Optional[str]) -> str:
+    return (value or '').strip().casefold()
+
+
+def _group(codes: np.ndarray, size: int) -> List[np.ndarray]:
+    """
+    Groups row numbers by their code, codes lower than zero are skipped.
+
+    :param codes: Code of every row.
+    :param size: Number of distinct codes.
+    :return: List of row number arrays, one for each code.
+    """
+
+    order: np.ndarray = np.argsort(codes, kind='stable').astype(np.int32)
+    counts: np.ndarray = np.bincount(codes[codes >= 0], minlength=size)
+    skipped: int = len(codes) - int(counts.sum())
+
+    return np.split(order[skipped:], np.cumsum(counts)[:-1]) if size else []
+
+
+class PartnerIndex:
+    """
+    Immutable columnar model of suppliers and their transport history.
+
+    Every transport is a row of compact NumPy columns, cities and countries are
+    interned into integer codes. Rows are grouped per supplier and indexed by
+    load/unload city, load/unload country and route, so lookups don't have to
+    scan the whole history.
+    """
+
+    def __init__(self, partners: List[Dict], transports: List[Dict]):
+        self._codes: Dict[str, int] = dict()
+        self.strings: List[str] = list()
+
+        self.suppliers: List[Dict[str, Any]] = [
+            {
+                'id': partner['id'],
+                'name': partner['name'],
+                'city': partner['address']['city'],
+                'country': partner['address']['country'],
+                'language': partner['language']
+            } for partner in partners
+        ]
+        self._positions: Dict[Any, int] = {
+            supplier['id']: position for position, supplier in enumerate(self.suppliers)
+        }
+
+        self.supplier_city: np.ndarray = np.array(
+            [self._intern(supplier['city']) for supplier in self.suppliers], dtype=np.int32
+        )
+        self.supplier_country: np.ndarray = np.array(
+            [self._intern(supplier['country']) for supplier in self.suppliers], dtype=np.int32
+        )
+
+        supplier: List[int] = list()
+        locations: Dict[str, List[int]] = {field: list() for field in LOCATION_FIELDS}
+        price: List[float] = list()
+        performance: List[float] = list()
+
+        for transport in transports:
+            supplier.append(self._positions.get(transport['supplierId'], -1))
+            locations['load_city'].append(self._intern(transport['loadingAddress']['city']))
+            locations['load_country'].append(self._intern(transport['loadingAddress']['country']))
+            locations['unload_city'].append(self._intern(transport['unloadingAddress']['city']))
+            locations['unload_country'].append(self._intern(transport['unloadingAddress']['country']))
+            price.append(transport['price'] or 0.0)
+            performance.append(transport['performanceScore'] or 0.0)
+
+        self.supplier: np.ndarray = np.array(supplier, dtype=np.int32)
+        self.columns: Dict[str, np.ndarray] = {
+            field: np.array(values, dtype=np.int32) for field, values in locations.items()
+        }
+        self.price: np.ndarray = np.array(price, dtype=np.float64)
+        self.priced: np.ndarray = np.array([bool(transport['price']) for transport in transports], dtype=bool)
+        self.performance: np.ndarray = np.array(performance, dtype=np.float64)
+
+        self.by_supplier: List[np.ndarray] = _group(self.supplier, len(self.suppliers))
+        self.supplier_transports: np.ndarray = np.array([len(rows) for rows in self.by_supplier], dtype=np.int64)
+        self.supplier_performance: np.ndarray = self.per_supplier(self.performance) / np.maximum(self.supplier_transports, 1)
+        self.indexes: Dict[str, List[np.ndarray]] = {
+            field: _group(codes, len(self.strings)) for field, codes in self.columns.items()
+        }
+
+        routes: np.ndarray = self.columns['load_city'].astype(np.int64) * len(self.strings) + self.columns['unload_city']
+        route_keys, route_codes = np.unique(routes, return_inverse=True)
+        self._routes: Dict[Tuple[int, int], int] = {
+            (int(key) // len(self.strings), int(key) % len(self.strings)): code for code, key in enumerate(route_keys)
+        }
+        self.by_route: List[np.ndarray] = _group(route_codes.astype(np.int32), len(route_keys))
+
+        self.lanes: LaneStatistics = LaneStatistics(self)
+
+    def __len__(self) -> int:
+        return len(self.supplier)
+
+    def per_supplier(self, values: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Sums values of the rows for every supplier.
+
+        :param values: Column with a value for every row.
+        :param rows: Rows to include, all rows by default.
+        :return: Array with a sum for every supplier position.
+        """
+
+        supplier: np.ndarray = self.supplier if rows is None else self.supplier[rows]
+        values = values if rows is None else values[rows]
+        known: np.ndarray = supplier >= 0
+
+        return np.bincount(supplier[known], weights=values[known], minlength=len(self.suppliers))
+
+    def per_supplier_many(self, values: np.ndarray, rows: List[np.ndarray]) -> np.ndarray:
+        """
+        Sums values of the rows for every supplier, separately for every set of rows.
+
+        :param values: Column with a value for every row.
+        :param rows: Sets of rows, such as rows of a route for every order.
+        :return: Array with a row for every set of rows and a column for every supplier position.
+        """
+
+        suppliers: int = len(self.suppliers)
+        selected: np.ndarray = np.concatenate(rows).astype(np.int64) if rows else np.empty(0, dtype=np.int64)
+        group: np.ndarray = np.repeat(np.arange(len(rows), dtype=np.int64), [len(group_rows) for group_rows in rows])
+
+        supplier: np.ndarray = self.supplier[selected]
+        known: np.ndarray = supplier >= 0
+
+        return np.bincount(
+            group[known] * suppliers + supplier[known],
+            weights=values[selected][known],
+            minlength=len(rows) * suppliers
+        ).reshape(len(rows), suppliers)
+
+    def _intern(self, value: Optional[str]) -> int:
+        key: str = _normalize(value)
+        code: Optional[int] = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.strings)
+            self.strings.append(value or '')
+        return code
+
+    def code(self, value: Optional[str]) -> int:
+        """
+        Code of the city or country, -1 if it never appears in the history.
+        """
+
+        return self._codes.get(_normalize(value), -1)
+
+    def position(self, supplier_id: Any) -> int:
+        return self._positions.get(supplier_id, -1)
+
+    def supplier_rows(self, supplier_id: Any) -> np.ndarray:
+        position: int = self.position(supplier_id)
+        if position < 0:
+            return np.empty(0, dtype=np.int32)
+        return self.by_supplier[position]
+
+    def rows_by(self, field: str, value: str) -> np.ndarray:
+        """
+        Rows of transports with the given location.
+
+        :param field: One of load_city, load_country, unload_city, unload_country.
+        :param value: City or country name.
+        :return: Array of row numbers.
+        """
+
+        code: int = self.code(value)
+        if code < 0:
+            return np.empty(0, dtype=np.int32)
+        return self.indexes[field][code]
+
+    def route_rows(self, load_city: str, unload_city: str) -> np.ndarray:
+        route: Optional[int] = self._routes.get((self.code(load_city), self.code(unload_city)))
+        if route is None:
+            return np.empty(0, dtype=np.int32)
+        return self.by_route[route]
+
+    def transport(self, row: int) -> Dict[str, Any]:
+        return {
+            'load_city': self.strings[self.columns['load_city'][row]],
+            'load_country': self.strings[self.columns['load_country'][row]],
+            'unload_city': self.strings[self.columns['unload_city'][row]],
+            'unload_country': self.strings[self.columns['unload_country'][row]],
+            'price': float(self.price[row]),
+            'performance_score': float(self.performance[row])
+        }
+
+    def partners_context(self, positions: Optional[List[int]] = None) -> Dict[Any, Dict]:
+        """
+        Builds partner context used for the dispatcher prompt, in time linear to
+        the number of selected suppliers and their transports.
+
+        :param positions: Positions of suppliers to include, all suppliers by default.
+        :return: Dictionary of partner data with their transports, keyed by partner id.
+        """
+
+        if positions is None:
+            positions = range(len(self.suppliers))
+
+        partners: Dict[Any, Dict] = dict()
+        for position in positions:
+            supplier: Dict[str, Any] = self.suppliers[position]
+            partners[supplier['id']] = {
+                'city': supplier['city'],
+                'country': supplier['country'],
+                'name': supplier['name'],
+                'language': supplier['language'],
+                'transports': [self.transport(row) for row in self.by_supplier[position]]
+            }
+
+        return partners
+
+
+class PartnerIndexHolder:
+    """
+    Keeps the partner index of the currently cached data source responses.
+
+    The index is rebuilt in a worker thread only when the cached supplier or
+    transport data changes, and then swapped in at once, so readers always see
+    a complete index.
+    """
+
+    def __init__(self):
+        self.index: Optional[PartnerIndex] = None
+        self._sources: Tuple[Optional[List], Optional[List]] = (None, None)
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+        self.builds: int = 0
+        self.build_time: float = 0.0
+
+    def _is_current(self, partners: List[Dict], transports: List[Dict]) -> bool:
+        return self._sources[0] is partners and self._sources[1] is transports
+
+    async def get(self) -> PartnerIndex:
+        partners, transports = await asyncio.gather(get_partners(), get_transport_history())
+
+        if self._is_current(partners, transports):
+            return self.index
+
+        async with self._lock:
+            if not self._is_current(partners, transports):
+                start: float = time.perf_counter()
+                index: PartnerIndex = await asyncio.to_thread(PartnerIndex, partners, transports)
+
+                self.index, self._sources = index, (partners, transports)
+                self.builds += 1
+                self.build_time = time.perf_counter() - start
+
+        return self.index
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'suppliers': len(self.index.suppliers) if self.index else 0,
+            'transports': len(self.index) if self.index else 0,
+            'builds': self.builds,
+            'build_time': round(self.build_time, 4)
+        }
+
+
+partner_index: PartnerIndexHolder = PartnerIndexHolder()
+
+
+async def get_partner_index() -> PartnerIndex:
+    return await partner_index.get()
@@ -0,0 +1,155 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from schemas.conf import PricingConfig
+
+LANE_FIELDS: Tuple[str, ...] = ('load_city', 'load_country', 'unload_city', 'unload_country')
+COUNTRY_FIELDS: Tuple[str, ...] = ('load_country', 'unload_country')
+
+
+def price_statistics(price: np.ndarray, performance: np.ndarray) -> Dict[str, float]:
+    """
+    Summary statistics of a price distribution.
+
+    :param price: Prices of transports.
+    :param performance: Performance scores of the same transports, used as weights.
+    :return: Dictionary with count, mean, median, p10, p90 and performance weighted mean.
+    """
+
+    if not len(price):
+        return {'count': 0, 'mean': 0.0, 'median': 0.0, 'p10': 0.0, 'p90': 0.0, 'weighted': 0.0}
+
+    p10, median, p90 = np.percentile(price, (10, 50, 90))
+    weight: float = float(performance.sum())
+
+    return {
+        'count': int(len(price)),
+        'mean': round(float(price.mean()), 2),
+        'median': round(float(median), 2),
+        'p10': round(float(p10), 2),
+        'p90': round(float(p90), 2),
+        'weighted': round(float((price * performance).sum() / weight) if weight > 0 else float(price.mean()), 2)
+    }
+
+
+def price_floor(minimal_price: float, conf: Optional[PricingConfig] = None) -> float:
+    """
+    Lowest price we offer in a negotiation, the minimal price increased by the floor margin.
+    """
+
+    return float(minimal_price) * (1 + (conf or PricingConfig()).floor_margin)
+
+
+class LaneStatistics:
+    """
+    Precomputed price statistics of every lane of the transport history.
+
+    Lanes are grouped on city level (load city/country to unload city/country)
+    and on country level (load country to unload country). Lookups of lanes with
+    too few transports fall back to the country pair and then to the global
+    distribution. Transports without a price are left out of the statistics.
+    """
+
+    def __init__(self, index: Any, conf: Optional[PricingConfig] = None):
+        self.conf: PricingConfig = conf or PricingConfig()
+        self._index: Any = index
+
+        self.lanes: Dict[Tuple[int, ...], Dict[str, float]] = self._aggregate(LANE_FIELDS)
+        self.country_pairs: Dict[Tuple[int, ...], Dict[str, float]] = self._aggregate(COUNTRY_FIELDS)
+        self.total: Dict[str, float] = self._statistics(np.arange(len(index)))
+
+    def _statistics(self, rows: np.ndarray) -> Dict[str, float]:
+        rows = rows[self._index.priced[rows]]
+        return price_statistics(self._index.price[rows], self._index.performance[rows])
+
+    def _aggregate(self, fields: Tuple[str, ...]) -> Dict[Tuple[int, ...], Dict[str, float]]:
+        index: Any = self._index
+        if not len(index):
+            return dict()
+
+        keys: np.ndarray = np.stack([index.columns[field] for field in fields], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        order: np.ndarray = np.argsort(inverse, kind='stable')
+        bounds: np.ndarray = np.cumsum(np.bincount(inverse, minlength=len(groups)))[:-1]
+
+        return {
+            tuple(int(code) for code in group): self._statistics(rows)
+            for group, rows in zip(groups, np.split(order, bounds))
+        }
+
+    def _codes(self, *values: str) -> Tuple[int, ...]:
+        return tuple(self._index.code(value) for value in values)
+
+    def lookup(self, load_city: str, load_country: str, unload_city: str, unload_country: str) -> Dict[str, Any]:
+        """
+        Statistics for the lane, falling back to the country pair and the global
+        distribution when the lane has less than the configured number of transports.
+
+        :return: Dictionary with level of the used distribution and its statistics.
+        """
+
+        lane: Optional[Dict] = self.lanes.get(self._codes(load_city, load_country, unload_city, unload_country))
+        if lane and lane['count'] >= self.conf.min_samples:
+            return {'level': 'lane', **lane}
+
+        pair: Optional[Dict] = self.country_pairs.get(self._codes(load_country, unload_country))
+        if pair and pair['count'] >= self.conf.min_samples:
+            return {'level': 'country', **pair}
+
+        return {'level': 'global', **self.total}
+
+    def prices(self, price: float, load_city: str, load_country: str, unload_city: str, unload_country: str) -> Dict[str, Any]:
+        """
+        Minimal and target price of the order. Minimal price is the low end (p10)
+        of the historical distribution, target price is the requested price, but
+        never lower than the minimal price.
+
+        :param price: Price requested for the order.
+        :return: Dictionary with minimal price, target price and used statistics.
+        """
+
+        statistics: Dict[str, Any] = self.lookup(load_city, load_country, unload_city, unload_country)
+        minimal_price: float = statistics['p10'] if statistics['count'] else price
+
+        return {
+            'minimal_price': minimal_price,
+            'target_price': max(price, minimal_price),
+            'statistics': statistics
+        }
+
+    def query(
+            self,
+            load_city: Optional[str] = None,
+            load_country: Optional[str] = None,
+            unload_city: Optional[str] = None,
+            unload_country: Optional[str] = None,
+            min_count: int = 0,
+            limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Lists precomputed lanes matching the filters, ordered by number of transports.
+
+        :return: List of lanes with their statistics.
+        """
+
+        filters: Dict[int, int] = {
+            position: self._index.code(value)
+            for position, value in enumerate((load_city, load_country, unload_city, unload_country))
+            if value is not None
+        }
+        strings: List[str] = self._index.strings
+
+        lanes: List[Dict[str, Any]] = [
+            {
+                **{field: strings[code] for field, code in zip(LANE_FIELDS, key)},
+                **statistics
+            }
+            for key, statistics in self.lanes.items()
+            if statistics['count'] >= min_count and all(key[position] == code for position, code in filters.items())
+        ]
+        lanes.sort(key=lambda lane: (-lane['count'], lane['load_city'], lane['unload_city']))
+
+        return lanes[:limit]
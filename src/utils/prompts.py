@@ -0,0 +1,267 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from schemas.conf import PromptConfig
+from .partners import PartnerIndex
+from .pricing import price_floor
+
+DISPATCH_RESPONSE_FORMAT: str = '{"partner_name": "...", "reason_why_you_choose_this_partner": "...", "direct_message": "...", "partner_language"}'
+
+
+def _number(value: float) -> str:
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+class PromptBuilder:
+    """
+    Builds prompts sent to the LLM.
+
+    Partner data is encoded as compact pipe separated tables, where cities and
+    countries are listed once and referenced by id. Dispatch prompts are kept
+    under the configured token budget by dropping the least relevant transports
+    of the lowest ranked partners first. Estimated token count of every built
+    prompt is collected in stats.
+    """
+
+    def __init__(self, conf: Optional[PromptConfig] = None):
+        self.conf: PromptConfig = conf or PromptConfig()
+        self._stats: Dict[str, Dict[str, int]] = dict()
+
+    def estimate_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.conf.chars_per_token)
+
+    def _report(self, kind: str, text: str, omitted: int = 0) -> str:
+        tokens: int = self.estimate_tokens(text)
+        stats: Dict[str, int] = self._stats.setdefault(kind, {'prompts': 0, 'tokens': 0, 'max_tokens': 0, 'last_tokens': 0, 'omitted_rows': 0})
+
+        stats['prompts'] += 1
+        stats['tokens'] += tokens
+        stats['max_tokens'] = max(stats['max_tokens'], tokens)
+        stats['last_tokens'] = tokens
+        stats['omitted_rows'] += omitted
+
+        return text
+
+    def relevant_transports(self, index: PartnerIndex, position: int, load_city: str, load_country: str, unload_city: str, unload_country: str) -> np.ndarray:
+        """
+        Transports of the supplier ordered by relevance for the order: same route
+        first, then same country pair and then by performance score.
+
+        :return: Array of at most configured number of rows.
+        """
+
+        rows: np.ndarray = index.by_supplier[position]
+        route: np.ndarray = (index.columns['load_city'][rows] == index.code(load_city)) & (index.columns['unload_city'][rows] == index.code(unload_city))
+        lane: np.ndarray = (index.columns['load_country'][rows] == index.code(load_country)) & (index.columns['unload_country'][rows] == index.code(unload_country))
+
+        order: np.ndarray = np.lexsort((-index.performance[rows], ~lane, ~route))
+        return rows[order[:self.conf.transports_per_partner]]
+
+    def _partners_table(self, index: PartnerIndex, candidates: List[Dict[str, Any]], transports: List[List[int]], omitted: int) -> str:
+        places: Dict[Tuple[str, str], int] = dict()
+
+        def place(city: str, country: str) -> int:
+            return places.setdefault((city, country), len(places))
+
+        partners: List[str] = [
+            '|'.join((
+                str(candidate['id']),
+                candidate['name'],
+                str(place(candidate['city'], candidate['country'])),
+                candidate['language'],
+                _number(candidate['score']),
+                str(candidate['route_transports']),
+                str(candidate['lane_transports']),
+                _number(candidate['lane_average_price']),
+                _number(candidate['average_price']),
+                _number(candidate['average_performance'])
+            )) for candidate in candidates
+        ]
+        rows: List[str] = [
+            '|'.join((
+                str(candidate['id']),
+                str(place(index.strings[index.columns['load_city'][row]], index.strings[index.columns['load_country'][row]])),
+                str(place(index.strings[index.columns['unload_city'][row]], index.strings[index.columns['unload_country'][row]])),
+                _number(index.price[row]),
+                _number(index.performance[row])
+            )) for candidate, candidate_rows in zip(candidates, transports) for row in candidate_rows
+        ]
+
+        lines: List[str] = [
+            'Places (id=city, country): ' + ';'.join(f'{id}={city}, {country}' for (city, country), id in places.items()),
+            'Partners (id|name|place|language|score|route transports|lane transports|lane average price|average price|average performance):',
+            *partners,
+            'Transports (partner id|from place|to place|price|performance):',
+            *rows
+        ]
+        if omitted:
+            lines.append(f'{omitted} less relevant rows omitted.')
+
+        return '\n'.join(lines)
+
+    def dispatch(
+            self,
+            index: PartnerIndex,
+            candidates: List[Dict[str, Any]],
+            target_price: float,
+            load_city: str,
+            load_country: str,
+            unload_city: str,
+            unload_country: str
+    ) -> str:
+        """
+        Prompt for choosing a partner and writing the job offer.
+
+        :param index: Partner index of the current data.
+        :param candidates: Ranked partner candidates, best first.
+        :param target_price: Price offered to the partner.
+        :return: Prompt which fits into the token budget.
+        """
+
+        instructions: str = (
+            f'Your task is next:'
+            f'Introduce yourself to a chat partner'
+            f'We have a request to load goods in {load_city}, {load_country} and transport it to {unload_city}, {unload_country},'
+            f'Good access is to go with partner from same city or country from loading location'
+            f'find a best suitable partner and price from provided candidates, '
+            f'every candidate has a score and statistics of their previous transports on this lane, '
+            f'choose the partner which will give a best possible results. '
+            f'Also you have to make a direct message to a partner in their language and offer them the job. Price is provided to you. '
+            f'You have to give thus answers '
+            f'partner_name(name of the choosen partner),'
+            f'reason_why_you_choose_this_partner(describe by which params you choosed partner),'
+            f'direct_message(direct message to a partner in native language of the partner, which contains job offer set a price of job to be {target_price} Euros)'
+            f'partner_language(language of the partner)'
+            f'Please give an output in JSON format({DISPATCH_RESPONSE_FORMAT})'
+        )
+
+        candidates = list(candidates)
+        transports: List[List[int]] = [
+            list(self.relevant_transports(index, index.position(candidate['id']), load_city, load_country, unload_city, unload_country))
+            for candidate in candidates
+        ]
+
+        omitted: int = 0
+        while True:
+            prompt: str = (
+                'You are a dispatcher for logistics company "Gruber Logistics"\n'
+                'Partner candidates ranked by our transport history, best first:\n'
+                f'{self._partners_table(index, candidates, transports, omitted)}\n'
+                f'{instructions}'
+            )
+            if self.estimate_tokens(prompt) <= self.conf.token_budget:
+                break
+
+            with_transports: List[int] = [position for position, rows in enumerate(transports) if rows]
+            if with_transports:
+                transports[with_transports[-1]].pop()
+            elif len(candidates) > 1:
+                candidates.pop()
+                transports.pop()
+            else:
+                break
+            omitted += 1
+
+        return self._report('dispatch', prompt, omitted)
+
+    def transcript(self, history: List[Tuple[str, str]]) -> str:
+        return '\n'.join(f'{"Partner" if role == "partner" else "We"}: {text}' for role, text in history)
+
+    def _conversation(self, summary: Optional[str], history: List[Tuple[str, str]], budget: Optional[int], fixed: int) -> Tuple[str, int]:
+        """
+        Summary of earlier messages and transcript of the latest ones, oldest
+        messages are dropped until it fits into the budget.
+        """
+
+        history = list(history)
+        omitted: int = 0
+        while True:
+            text: str = (
+                (f'Summary of the earlier conversation: {summary}\n' if summary else '')
+                + f'Latest messages:\n{self.transcript(history)}\n'
+            )
+            if budget is None or len(history) <= 2 or self.estimate_tokens(text) + fixed <= budget:
+                return text, omitted
+
+            history.pop(0)
+            omitted += 1
+
+    def closing(self, context: Dict[str, Any], history: List[Tuple[str, str]], summary: Optional[str] = None, budget: Optional[int] = None) -> str:
+        instructions: str = (
+            f'Name of the choosen partner is: {context["partner_name"]}'
+            f'Write in this language: {context["partner_language"]}'
+            f'Please just close a real on a polite way positivly.'
+        )
+        intro: str = (
+            'You are having a conversation with the partner, you are negotiating about job specifications,'
+            f'This is a context from previous message: We(You) sent an offer:'
+            f'Context: {context},\n'
+        )
+        conversation, omitted = self._conversation(summary, history, budget, self.estimate_tokens(intro + instructions))
+
+        return self._report('closing', intro + conversation + instructions, omitted)
+
+    def negotiation(self, context: Dict[str, Any], history: List[Tuple[str, str]], summary: Optional[str] = None, budget: Optional[int] = None) -> str:
+        """
+        Prompt for the reply to the latest partner message.
+
+        :param context: Context of the conversation.
+        :param history: Roles and texts of the latest messages, ending with the partner message.
+        :param summary: Summary of the messages before the history.
+        :param budget: Maximum estimated number of tokens of the prompt.
+        :return: Prompt text.
+        """
+
+        intro: str = (
+            f'You are chating with partner, you are dispatcher at Gruber Logistics'
+            f'You already sent him a offer message and i provide some data from that message to,'
+            f'partner name is {context["partner_name"]}'
+            f'partner language is {context["partner_language"]}\n'
+        )
+        negotiate_prompt: str = (
+            f'Those are some rules for negotiating:'
+            f' - Most important is to try to negotiate like a human being, you cannot specify why are you doing what you are doing!'
+            f' - Be precise!'
+            f' - Ideal Price: The price you’d prefer to achieve in our case is {context["target_price"]} Euros.'
+            f' - Minimum Price: The lowest acceptable price in our case is {context["minimal_price"]}'
+            f' - Price Floor: You can change price as long as it is not lower than {_number(price_floor(context["minimal_price"]))} Euros, but dont tell that to partner.'
+            f' - Starting Offer: Set as slightly above your ideal price, allowing room for negotiation.'
+            f' -The model can make an initial offer, wait for a response, and then adjust based on the counteroffer received. The response logic could look like this'
+            f'- Counteroffer Lower than Minimum Price: Politely state that it’s below the acceptable range, and suggest a higher price close to the minimum.'
+            f'- Counteroffer Close to Ideal Price: Accept or make a minor concession to reach the final agreement.'
+            f'- Counteroffer Between Ideal and Minimum: Reduce the offer slightly, aiming for an agreeable middle ground.'
+            f'- Opening Line: “We’re looking to offer you a high-quality service at a fair price, ideally around {context["target_price"]}“'
+        )
+        conversation, omitted = self._conversation(summary, history, budget, self.estimate_tokens(intro + negotiate_prompt))
+
+        return self._report('negotiation', intro + conversation + negotiate_prompt, omitted)
+
+    def summary(self, context: Dict[str, Any], summary: Optional[str], history: List[Tuple[str, str]], tokens: int) -> str:
+        """
+        Prompt for updating the conversation summary with new messages.
+
+        :param summary: Current summary, None if nothing was summarized yet.
+        :param history: Roles and texts of messages which are added to the summary.
+        :param tokens: Maximum length of the summary in tokens.
+        :return: Prompt text.
+        """
+
+        prompt: str = (
+            f'You are dispatcher at Gruber Logistics negotiating a transport job with partner {context["partner_name"]}.\n'
+            + (f'Summary of the conversation so far: {summary}\n' if summary else '')
+            + f'New messages:\n{self.transcript(history)}\n'
+            f'Write an updated summary of the whole conversation in English, in at most {int(tokens * 0.75)} words. '
+            f'Keep every offered, requested and agreed price, conditions and open questions. Answer only with the summary.'
+        )
+        return self._report('summary', prompt)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'token_budget': self.conf.token_budget,
+            **{kind: dict(stats) for kind, stats in self._stats.items()}
+        }
+
+
+prompts: PromptBuilder = PromptBuilder()
@@ -0,0 +1,153 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from schemas.conf import RankingConfig
+from .partners import PartnerIndex
+
+
+def _normalized(values: np.ndarray) -> np.ndarray:
+    if not values.shape[-1]:
+        return np.zeros_like(values, dtype=np.float64)
+
+    top: np.ndarray = values.max(axis=-1, keepdims=True)
+    return np.divide(values, top, out=np.zeros_like(values, dtype=np.float64), where=top > 0)
+
+
+def _mean(total: np.ndarray, count: np.ndarray) -> np.ndarray:
+    return np.divide(total, count, out=np.zeros_like(total, dtype=np.float64), where=count > 0)
+
+
+class PartnerRanker:
+    """
+    Deterministic scoring of all suppliers for orders.
+
+    Every factor is computed for all suppliers and all orders at once with
+    NumPy over the partner index, as a matrix with a row for every order.
+    Factors are scaled to 0..1 per order and combined with configured weights.
+    Ties are broken by supplier position, so equal input always gives equal
+    ranking.
+    """
+
+    def __init__(self, conf: Optional[RankingConfig] = None):
+        self.conf: RankingConfig = conf or RankingConfig()
+
+    def factors(self, index: PartnerIndex, load_city: str, load_country: str, unload_city: str, unload_country: str) -> Dict[str, np.ndarray]:
+        """
+        Computes scoring factors and summary statistics for every supplier.
+
+        :return: Dictionary of arrays with a value for every supplier position.
+        """
+
+        factors: Dict[str, np.ndarray] = self.factors_many(index, [{
+            'load_city': load_city,
+            'load_country': load_country,
+            'unload_city': unload_city,
+            'unload_country': unload_country
+        }])
+        return {factor: values[0] for factor, values in factors.items()}
+
+    def factors_many(self, index: PartnerIndex, orders: List[Dict[str, str]]) -> Dict[str, np.ndarray]:
+        """
+        Computes scoring factors and summary statistics for every supplier and order.
+
+        :param orders: Orders with load_city, load_country, unload_city and unload_country.
+        :return: Dictionary of arrays with a row for every order and a column for every supplier position.
+        """
+
+        route_rows: List[np.ndarray] = [index.route_rows(order['load_city'], order['unload_city']) for order in orders]
+        lane_rows: List[np.ndarray] = [
+            np.intersect1d(
+                index.rows_by('load_country', order['load_country']),
+                index.rows_by('unload_country', order['unload_country']),
+                assume_unique=True
+            ) for order in orders
+        ]
+
+        route_count: np.ndarray = index.per_supplier_many(np.ones(len(index)), route_rows)
+        lane_count: np.ndarray = index.per_supplier_many(np.ones(len(index)), lane_rows)
+        lane_priced: np.ndarray = index.per_supplier_many(index.priced.astype(np.float64), lane_rows)
+        lane_price: np.ndarray = _mean(index.per_supplier_many(index.price, lane_rows), lane_priced)
+        average_price: np.ndarray = np.broadcast_to(
+            _mean(index.per_supplier(index.price), index.per_supplier(index.priced.astype(np.float64))), lane_price.shape
+        )
+
+        price: np.ndarray = np.where(lane_priced > 0, lane_price, average_price)
+        priced: np.ndarray = price > 0
+        price_score: np.ndarray = np.zeros(price.shape)
+        if price.shape[-1]:
+            cheapest: np.ndarray = np.where(priced, price, np.inf).min(axis=-1, keepdims=True)
+            spread: np.ndarray = np.where(priced, price, -np.inf).max(axis=-1, keepdims=True) - cheapest
+            spread = np.where(np.isfinite(spread) & (spread > 0), spread, 0.0)
+            scaled: np.ndarray = 1.0 - np.divide(price - cheapest, spread, out=np.zeros(price.shape), where=spread > 0)
+            price_score = np.where(priced, scaled, 0.0)
+
+        load_city: np.ndarray = np.array([index.code(order['load_city']) for order in orders], dtype=np.int32)
+        load_country: np.ndarray = np.array([index.code(order['load_country']) for order in orders], dtype=np.int32)
+
+        return {
+            'same_city': (index.supplier_city == load_city[:, None]).astype(np.float64),
+            'same_country': (index.supplier_country == load_country[:, None]).astype(np.float64),
+            'lane': _normalized(np.log1p(route_count) + 0.5 * np.log1p(lane_count)),
+            'price': price_score,
+            'performance': np.broadcast_to(_normalized(index.supplier_performance), price.shape),
+            'route_transports': route_count,
+            'lane_transports': lane_count,
+            'lane_price': lane_price,
+            'average_price': average_price
+        }
+
+    def rank(self, index: PartnerIndex, load_city: str, load_country: str, unload_city: str, unload_country: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Ranks suppliers for the order and returns the best ones with their summary stats.
+
+        :param top_k: Number of returned candidates, configured value by default.
+        :return: List of candidates ordered from the best one.
+        """
+
+        return self.rank_many(index, [{
+            'load_city': load_city,
+            'load_country': load_country,
+            'unload_city': unload_city,
+            'unload_country': unload_country
+        }], top_k=top_k)[0]
+
+    def rank_many(self, index: PartnerIndex, orders: List[Dict[str, str]], top_k: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Ranks suppliers for every order at once.
+
+        :param orders: Orders with load_city, load_country, unload_city and unload_country.
+        :param top_k: Number of returned candidates per order, configured value by default.
+        :return: List of candidates ordered from the best one, for every order.
+        """
+
+        if not index.suppliers or not orders:
+            return [[] for _ in orders]
+
+        factors: Dict[str, np.ndarray] = self.factors_many(index, orders)
+        score: np.ndarray = np.zeros((len(orders), len(index.suppliers)))
+        for factor, weight in self.conf.weights.items():
+            score += weight * factors[factor]
+
+        top_k = self.conf.top_k if top_k is None else top_k
+        positions: np.ndarray = np.broadcast_to(np.arange(len(index.suppliers)), score.shape)
+        best: np.ndarray = np.lexsort((positions, -score), axis=-1)[:, :top_k]
+
+        return [
+            [
+                {
+                    **index.suppliers[position],
+                    'score': round(float(score[row, position]), 4),
+                    'factors': {factor: round(float(factors[factor][row, position]), 4) for factor in self.conf.weights},
+                    'transports': int(index.supplier_transports[position]),
+                    'route_transports': int(factors['route_transports'][row, position]),
+                    'lane_transports': int(factors['lane_transports'][row, position]),
+                    'lane_average_price': round(float(factors['lane_price'][row, position]), 2),
+                    'average_price': round(float(factors['average_price'][row, position]), 2),
+                    'average_performance': round(float(index.supplier_performance[position]), 2)
+                } for position in best[row]
+            ] for row in range(len(orders))
+        ]
+
+
+ranker: PartnerRanker = PartnerRanker()
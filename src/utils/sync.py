@@ -0,0 +1,413 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+import httpx
+from tortoise import BaseDBAsyncClient, connections, timezone
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from models import City, SyncState, Supplier, Transport
+from schemas.conf import SyncConfig
+from .database import DEFAULT_CONNECTION
+from .events import EventBus, event_bus
+from .http import DataSourceClient, data_source
+
+ETAG: str = 'etag'
+SINCE: str = 'since'
+
+DATE_FIELDS: Tuple[str, ...] = ('date', 'transportDate', 'loadingDate', 'createdAt')
+
+MAX_DELTA_KEYS: int = 200
+
+
+def _digest(record: Any) -> str:
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _date(record: Dict[str, Any]) -> Optional[datetime.datetime]:
+    for field in DATE_FIELDS:
+        value: Any = record.get(field)
+        if not value:
+            continue
+        try:
+            date: datetime.datetime = datetime.datetime.fromisoformat(str(value))
+        except ValueError:
+            continue
+        return date if date.tzinfo else date.replace(tzinfo=datetime.timezone.utc)
+    return None
+
+
+def _address(record: Dict[str, Any], field: str) -> Dict[str, Any]:
+    return record.get(field) or dict()
+
+
+class SyncSource:
+    """
+    Dataset of the data source mirrored into a local table.
+    """
+
+    def __init__(self, name: str, endpoint: str, model: Type[Model], columns: Callable[[Dict[str, Any]], Dict[str, Any]], order: Tuple[str, ...]):
+        self.name: str = name
+        self.endpoint: str = endpoint
+        self.model: Type[Model] = model
+        self.columns: Callable[[Dict[str, Any]], Dict[str, Any]] = columns
+        self.order: Tuple[str, ...] = order
+
+    def row(self, record: Dict[str, Any], generation: int) -> Model:
+        return self.model(data=record, generation=generation, **self.columns(record))
+
+    def position(self, columns: Dict[str, Any]) -> Tuple:
+        """
+        Sort key of the record in the order of the table, nulls go last.
+        """
+
+        return tuple((columns[field] is None, columns[field]) for field in self.order)
+
+    @property
+    def update_fields(self) -> List[str]:
+        return [field for field in self.model._meta.db_fields if field not in ('id', 'key', 'created', 'last_updated')]
+
+
+SOURCES: List[SyncSource] = [
+    SyncSource(
+        name='suppliers',
+        endpoint='/Supplier/GetAllSuppliers',
+        model=Supplier,
+        columns=lambda record: {
+            'key': str(record['id']),
+            'supplier_id': record['id'],
+            'name': record.get('name'),
+            'city': _address(record, 'address').get('city'),
+            'country': _address(record, 'address').get('country'),
+            'language': record.get('language')
+        },
+        order=('supplier_id',)
+    ),
+    SyncSource(
+        name='transports',
+        endpoint='/Transport/GetTransportHistory',
+        model=Transport,
+        columns=lambda record: {
+            'key': str(record['id']) if record.get('id') is not None else _digest(record),
+            'supplier_id': record.get('supplierId'),
+            'load_city': _address(record, 'loadingAddress').get('city'),
+            'load_country': _address(record, 'loadingAddress').get('country'),
+            'unload_city': _address(record, 'unloadingAddress').get('city'),
+            'unload_country': _address(record, 'unloadingAddress').get('country'),
+            'date': _date(record),
+            'price': record.get('price'),
+            'performance_score': record.get('performanceScore')
+        },
+        order=('date', 'key')
+    ),
+    SyncSource(
+        name='cities',
+        endpoint='/Helper/GetAvailableCities',
+        model=City,
+        columns=lambda record: {
+            'key': _digest([record.get('city'), record.get('country')]),
+            'city': record.get('city'),
+            'country': record.get('country')
+        },
+        order=('country', 'city')
+    )
+]
+
+
+class DataSync:
+    """
+    Mirrors suppliers, transport history and cities of the data source into
+    local tables, from which the dispatcher is served.
+
+    In etag mode, every sync is a conditional request which transfers nothing
+    until the dataset changes, and a changed dataset replaces the table. In since
+    mode, only records changed since the watermark are requested and upserted,
+    the whole dataset is synced again periodically or when a delta request fails,
+    which also removes deleted records. Every worker keeps the records in memory,
+    a worker which synced changed data notifies the others through the event bus.
+    Deltas are merged into the records in memory, the worker which synced them
+    uses the response and the others read only the changed rows by key, the
+    whole table is read again after a full sync.
+    """
+
+    def __init__(self, conf: Optional[SyncConfig] = None, source: Optional[DataSourceClient] = None, bus: Optional[EventBus] = None):
+        self.conf: SyncConfig = conf or SyncConfig()
+        self.source: DataSourceClient = source or data_source
+        self.bus: EventBus = bus or event_bus
+        self.sources: Dict[str, SyncSource] = {source.name: source for source in SOURCES}
+        self._endpoints: Dict[str, SyncSource] = {source.endpoint: source for source in SOURCES}
+        self._records: Dict[str, List[Dict[str, Any]]] = dict()
+        self._synced: Dict[str, datetime.datetime] = dict()
+        self._locks: Dict[str, asyncio.Lock] = {name: asyncio.Lock() for name in self.sources}
+        self._syncer: Optional[asyncio.Task] = None
+        self._origin: str = uuid.uuid4().hex
+
+        self.syncs: Dict[str, int] = {name: 0 for name in self.sources}
+        self.full_syncs: Dict[str, int] = {name: 0 for name in self.sources}
+        self.not_modified: Dict[str, int] = {name: 0 for name in self.sources}
+        self.rows_transferred: Dict[str, int] = {name: 0 for name in self.sources}
+        self.bytes_transferred: Dict[str, int] = {name: 0 for name in self.sources}
+        self.rows_deleted: Dict[str, int] = {name: 0 for name in self.sources}
+        self.fallbacks: int = 0
+        self.errors: int = 0
+        self.reloads: int = 0
+        self.deltas: int = 0
+        self.sync_time: Dict[str, float] = {name: 0.0 for name in self.sources}
+
+    async def open(self) -> None:
+        """
+        Loads the records synced before, subscribes to changes synced by other
+        workers and starts syncing in background if the data source and interval are configured.
+        """
+
+        if not self.conf.enabled:
+            return
+
+        await self.bus.subscribe(self.conf.channel, self._changed)
+        for state in await SyncState.filter(synced__isnull=False):
+            if state.source in self.sources:
+                await self.reload(state.source)
+                self._synced[state.source] = state.synced
+
+        if self.source.conf.base_url and self.conf.interval > 0 and (self._syncer is None or self._syncer.done()):
+            self._syncer = asyncio.create_task(self._sync_periodically())
+
+    async def close(self) -> None:
+        if self._syncer is not None:
+            self._syncer.cancel()
+            await asyncio.gather(self._syncer, return_exceptions=True)
+            self._syncer = None
+        if self.conf.enabled:
+            await self.bus.unsubscribe(self.conf.channel, self._changed)
+        self._records.clear()
+        self._synced.clear()
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await self.sync_all()
+            await asyncio.sleep(self.conf.interval)
+
+    async def sync_all(self, full: bool = False) -> Dict[str, int]:
+        """
+        Syncs every dataset, a failure of one doesn't stop the others.
+
+        :param full: Syncs whole datasets instead of deltas.
+        :return: Number of transferred rows per dataset, -1 if the sync failed.
+        """
+
+        transferred: Dict[str, int] = dict()
+        for name in self.sources:
+            try:
+                transferred[name] = await self.sync(name, full=full)
+            except Exception:
+                self.errors += 1
+                transferred[name] = -1
+        return transferred
+
+    async def sync(self, name: str, full: bool = False) -> int:
+        """
+        Syncs the dataset into its local table.
+
+        :param name: Name of the dataset.
+        :param full: Syncs the whole dataset instead of the delta.
+        :return: Number of transferred rows.
+        """
+
+        source: SyncSource = self.sources[name]
+        async with self._locks[name]:
+            state, _ = await SyncState.get_or_create(source=name)
+            started: datetime.datetime = timezone.now()
+            full_due: bool = state.full_synced is None or (
+                started - state.full_synced
+            ).total_seconds() >= self.conf.full_interval
+            incremental: bool = self.conf.mode == SINCE and not full and not full_due and state.watermark is not None
+
+            try:
+                response: httpx.Response = await self._request(source, state, incremental, conditional=not full)
+            except httpx.HTTPStatusError:
+                if not incremental:
+                    raise
+                self.fallbacks += 1
+                incremental = False
+                response = await self._request(source, state, incremental, conditional=False)
+
+            return await self._store(source, state, response, started, incremental)
+
+    async def _request(self, source: SyncSource, state: SyncState, incremental: bool, conditional: bool) -> httpx.Response:
+        params: Dict[str, str] = dict()
+        headers: Dict[str, str] = dict()
+        if incremental:
+            params[self.conf.since_param] = state.watermark.isoformat()
+        elif conditional and state.etag and source.name in self._records:
+            headers['If-None-Match'] = state.etag
+
+        return await self.source.get(source.endpoint, params=params or None, headers=headers or None)
+
+    async def _store(self, source: SyncSource, state: SyncState, response: httpx.Response, started: datetime.datetime, incremental: bool) -> int:
+        start: float = time.perf_counter()
+        self.syncs[source.name] += 1
+
+        if response.status_code == 304:
+            self.not_modified[source.name] += 1
+            state.synced = started
+            if self.conf.mode == ETAG:
+                state.full_synced = started
+            await state.save(update_fields=['synced', 'full_synced'])
+            self._synced[source.name] = started
+            return 0
+
+        records: List[Dict[str, Any]] = response.json()
+        generation: int = state.generation if incremental else state.generation + 1
+        rows: List[Model] = [source.row(record, generation) for record in records]
+
+        async with in_transaction(DEFAULT_CONNECTION) as connection:
+            for position in range(0, len(rows), self.conf.batch_size):
+                await self._upsert(source, rows[position:position + self.conf.batch_size], connection)
+
+            deleted: int = 0
+            if not incremental:
+                deleted = await source.model.filter(generation__lt=generation).using_db(connection).delete()
+                state.full_synced = started
+                self.full_syncs[source.name] += 1
+
+            state.etag = response.headers.get('ETag')
+            state.watermark = started - datetime.timedelta(seconds=self.conf.overlap)
+            state.generation = generation
+            state.rows = await source.model.all().using_db(connection).count()
+            state.synced = started
+            await state.save(using_db=connection)
+
+            if rows or deleted:
+                event: Dict[str, Any] = {'source': source.name, 'origin': self._origin}
+                if incremental and len(rows) <= MAX_DELTA_KEYS:
+                    event['keys'] = [row.key for row in rows]
+                await self.bus.publish(self.conf.channel, json.dumps(event), connection=connection)
+
+        self.rows_transferred[source.name] += len(rows)
+        self.bytes_transferred[source.name] += len(response.content)
+        self.rows_deleted[source.name] += deleted
+        self.sync_time[source.name] = time.perf_counter() - start
+
+        if incremental and source.name in self._records:
+            if rows:
+                self._apply(source, records)
+        elif rows or deleted or source.name not in self._records:
+            await self.reload(source.name)
+        self._synced[source.name] = started
+        return len(rows)
+
+    async def _upsert(self, source: SyncSource, rows: List[Model], connection: BaseDBAsyncClient) -> None:
+        """
+        Inserts new rows with a single INSERT and updates existing ones with a single UPDATE.
+        """
+
+        rows = list({row.key: row for row in rows}.values())
+        existing: Dict[str, uuid.UUID] = dict(
+            await source.model.filter(key__in=[row.key for row in rows]).using_db(connection).values_list('key', 'id')
+        )
+
+        for row in rows:
+            if row.key in existing:
+                row.id = existing[row.key]
+                row._saved_in_db = True
+
+        new: List[Model] = [row for row in rows if row.key not in existing]
+        if new:
+            await source.model.bulk_create(new, using_db=connection)
+        if existing:
+            await source.model.bulk_update(
+                [row for row in rows if row.key in existing],
+                fields=source.update_fields,
+                using_db=connection
+            )
+
+    async def reload(self, name: str) -> None:
+        """
+        Loads records of the dataset from its local table, on the primary
+        because a read replica could still miss the rows just synced.
+        """
+
+        source: SyncSource = self.sources[name]
+        rows: list = await source.model.all().using_db(connections.get(DEFAULT_CONNECTION)).order_by(*source.order).values('data')
+        self._records[name] = [row['data'] for row in rows]
+        self.reloads += 1
+
+    def _apply(self, source: SyncSource, records: List[Dict[str, Any]]) -> None:
+        """
+        Merges changed records into the records in memory, a new list is built
+        so the previous one stays unchanged for its readers.
+        """
+
+        merged: Dict[str, Tuple[Tuple, Dict[str, Any]]] = dict()
+        for record in self._records[source.name] + records:
+            columns: Dict[str, Any] = source.columns(record)
+            merged[columns['key']] = (source.position(columns), record)
+
+        self._records[source.name] = [record for _, record in sorted(merged.values(), key=lambda item: item[0])]
+        self.deltas += 1
+
+    async def _reload_keys(self, name: str, keys: List[str]) -> None:
+        source: SyncSource = self.sources[name]
+        records: list = await source.model.filter(key__in=keys).using_db(connections.get(DEFAULT_CONNECTION)).values_list('data', flat=True)
+        self._apply(source, list(records))
+
+    async def _changed(self, payload: Optional[str]) -> None:
+        if not payload:
+            for name in list(self._records):
+                await self.reload(name)
+            return
+
+        event: Dict[str, Any] = json.loads(payload)
+        if event.get('origin') != self._origin and event.get('source') in self.sources:
+            if 'keys' in event and event['source'] in self._records:
+                await self._reload_keys(event['source'], event['keys'])
+            else:
+                await self.reload(event['source'])
+            self._synced[event['source']] = timezone.now()
+
+    def ready(self, endpoint: str) -> bool:
+        source: Optional[SyncSource] = self._endpoints.get(endpoint)
+        return source is not None and source.name in self._records
+
+    def records(self, endpoint: str) -> List[Dict[str, Any]]:
+        """
+        Records of the dataset in the same shape as returned by the data source.
+        The same list is returned until the dataset changes.
+        """
+
+        return self._records[self._endpoints[endpoint].name]
+
+    def stats(self) -> Dict[str, Any]:
+        now: datetime.datetime = timezone.now()
+
+        return {
+            'enabled': self.conf.enabled,
+            'mode': self.conf.mode,
+            'running': self._syncer is not None and not self._syncer.done(),
+            'sources': {
+                name: {
+                    'ready': name in self._records,
+                    'records': len(self._records.get(name, [])),
+                    'lag': round((now - self._synced[name]).total_seconds(), 3) if name in self._synced else None,
+                    'syncs': self.syncs[name],
+                    'full_syncs': self.full_syncs[name],
+                    'not_modified': self.not_modified[name],
+                    'rows_transferred': self.rows_transferred[name],
+                    'bytes_transferred': self.bytes_transferred[name],
+                    'rows_deleted': self.rows_deleted[name],
+                    'last_sync_time': round(self.sync_time[name], 4)
+                } for name in self.sources
+            },
+            'fallbacks': self.fallbacks,
+            'errors': self.errors,
+            'reloads': self.reloads,
+            'deltas': self.deltas
+        }
+
+
+data_sync: DataSync = DataSync()
@@ -0,0 +1,24 @@
+import re
+from typing import List, Optional
+
+PRICE: re.Pattern = re.compile(r"(?<![\d.,])(\d{1,3}(?:[.,']\d{3})+|\d+)(?:[.,](\d{1,2}))?(?!\d)")
+
+
+def extract_prices(text: str) -> List[float]:
+    """
+    Extracts numbers which look like prices, with dot, comma or apostrophe as
+    thousands separator and up to two decimals.
+
+    :param text: Message text.
+    :return: List of numbers in order of appearance.
+    """
+
+    return [
+        float(re.sub(r'\D', '', whole) + (f'.{decimals}' if decimals else ''))
+        for whole, decimals in PRICE.findall(text)
+    ]
+
+
+def mentioned_price(text: str) -> Optional[float]:
+    prices: List[float] = extract_prices(text)
+    return max(prices) if prices else None
@@ -0,0 +1,322 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from schemas.conf import WebSocketConfig
+from .events import EventBus, event_bus
+
+DROP_OLDEST: str = 'drop_oldest'
+DISCONNECT: str = 'disconnect'
+
+TRY_AGAIN_LATER: int = 1013
+
+SUBSCRIBE: str = 'subscribe'
+UNSUBSCRIBE: str = 'unsubscribe'
+MAX_TOPIC_LENGTH: int = 128
+
+Authorizer = Callable[[Optional[str], str], Awaitable[bool]]
+Outgoing = Tuple[Optional[str], ...]
+
+
+class Connection:
+    """
+    Connected WebSocket with its queue of outgoing messages, which is sent by
+    its own writer task.
+    """
+
+    def __init__(self, websocket: WebSocket, conf: WebSocketConfig, client: Optional[str] = None):
+        self.websocket: WebSocket = websocket
+        self.client: Optional[str] = client
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=conf.queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.topics: Set[str] = set()
+
+        self.sent: int = 0
+        self.dropped: int = 0
+
+
+class ConnectionManager:
+    """
+    Connected WebSockets.
+
+    Sending a message only puts it into the queue of every connection, each
+    connection is written by its own task, so a slow client never delays the
+    others or the sender. When the queue of a connection is full, either its
+    oldest message is dropped or the connection is closed, depending on the
+    slow consumer policy. A connection which doesn't accept a message within
+    the send timeout is closed as well.
+
+    Once opened, broadcasts go through the event bus, so they reach clients
+    connected to every worker. Broadcasts are collected for a short interval
+    and published as one event, every worker listens on the channel once and
+    sends received messages to its own connections.
+
+    Connections can subscribe to topics, such as ID of a conversation, and
+    messages published to a topic are sent only to its subscribers. The
+    authorizer decides which topics the client of a connection may subscribe
+    to, and a message published for a client reaches only its connections.
+    """
+
+    def __init__(self, conf: Optional[WebSocketConfig] = None, bus: Optional[EventBus] = None, authorize: Optional[Authorizer] = None):
+        self.conf: WebSocketConfig = conf or WebSocketConfig()
+        self.bus: EventBus = bus or event_bus
+        self.authorize: Optional[Authorizer] = authorize
+        self.active_connections: Dict[WebSocket, Connection] = dict()
+        self.topics: Dict[str, Set[WebSocket]] = dict()
+        self._subscribed: bool = False
+        self._outgoing: List[Outgoing] = []
+        self._publisher: Optional[asyncio.Task] = None
+
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.slow_disconnects: int = 0
+        self.published_batches: int = 0
+        self.published_messages: int = 0
+        self.received_batches: int = 0
+        self.publish_errors: int = 0
+        self.forbidden: int = 0
+
+    async def open(self) -> None:
+        if not self._subscribed:
+            await self.bus.subscribe(self.conf.channel, self._receive)
+            self._subscribed = True
+
+    async def close(self) -> None:
+        """
+        Publishes the collected broadcasts and stops listening on the channel.
+        """
+
+        if self._publisher is not None and not self._publisher.done():
+            await self._publisher
+        if self._outgoing:
+            await self._publish()
+        if self._subscribed:
+            await self.bus.unsubscribe(self.conf.channel, self._receive)
+            self._subscribed = False
+
+    async def connect(self, websocket: WebSocket, client: Optional[str] = None):
+        await websocket.accept()
+
+        connection: Connection = Connection(websocket, self.conf, client)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections[websocket] = connection
+
+    def disconnect(self, websocket: WebSocket):
+        connection: Optional[Connection] = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
+
+        for topic in connection.topics:
+            self._remove_subscriber(topic, websocket)
+
+        self.sent += connection.sent
+        self.dropped += connection.dropped
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _write(self, connection: Connection) -> None:
+        while True:
+            message: str = await connection.queue.get()
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(message), timeout=self.conf.send_timeout)
+            except asyncio.TimeoutError:
+                self.slow_disconnects += 1
+                self.disconnect(connection.websocket)
+                await self._close(connection.websocket)
+                return
+            except Exception:
+                self.disconnect(connection.websocket)
+                return
+            connection.sent += 1
+
+    async def _close(self, websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=TRY_AGAIN_LATER)
+        except Exception:
+            pass
+
+    def _enqueue(self, connection: Connection, message: str) -> None:
+        if connection.queue.full():
+            if self.conf.slow_consumer_policy == DISCONNECT:
+                self.slow_disconnects += 1
+                self.disconnect(connection.websocket)
+                asyncio.create_task(self._close(connection.websocket))
+                return
+
+            connection.queue.get_nowait()
+            connection.dropped += 1
+
+        connection.queue.put_nowait(message)
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        connection: Optional[Connection] = self.active_connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, message)
+
+    def subscribe(self, websocket: WebSocket, topic: str) -> None:
+        connection: Optional[Connection] = self.active_connections.get(websocket)
+        if connection is None:
+            return
+
+        connection.topics.add(topic)
+        self.topics.setdefault(topic, set()).add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, topic: str) -> None:
+        connection: Optional[Connection] = self.active_connections.get(websocket)
+        if connection is not None:
+            connection.topics.discard(topic)
+        self._remove_subscriber(topic, websocket)
+
+    def _remove_subscriber(self, topic: str, websocket: WebSocket) -> None:
+        subscribers: Optional[Set[WebSocket]] = self.topics.get(topic)
+        if subscribers is None:
+            return
+
+        subscribers.discard(websocket)
+        if not subscribers:
+            del self.topics[topic]
+
+    async def control(self, websocket: WebSocket, data: str) -> bool:
+        """
+        Handles subscribe and unsubscribe control frames, such as
+        {"action": "subscribe", "topic": "..."}, which are acknowledged
+        with {"action": "subscribed", "topic": "..."}.
+
+        :param websocket: Connection which sent the frame.
+        :param data: Received text.
+        :return: True if the text was a control frame.
+        """
+
+        try:
+            frame: Any = json.loads(data)
+        except ValueError:
+            return False
+
+        if not isinstance(frame, dict) or frame.get('action') not in (SUBSCRIBE, UNSUBSCRIBE):
+            return False
+
+        topic: Any = frame.get('topic')
+        if not isinstance(topic, str) or not topic or len(topic) > MAX_TOPIC_LENGTH:
+            await self.send_personal_message(json.dumps({'action': 'error', 'detail': 'Invalid topic'}), websocket)
+            return True
+
+        connection: Optional[Connection] = self.active_connections.get(websocket)
+        if frame['action'] == SUBSCRIBE and connection is not None and self.authorize is not None:
+            if not await self.authorize(connection.client, topic):
+                self.forbidden += 1
+                await self.send_personal_message(json.dumps({'action': 'error', 'detail': 'Forbidden topic', 'topic': topic}), websocket)
+                return True
+
+        if frame['action'] == SUBSCRIBE:
+            self.subscribe(websocket, topic)
+        else:
+            self.unsubscribe(websocket, topic)
+
+        await self.send_personal_message(json.dumps({'action': f'{frame["action"]}d', 'topic': topic}), websocket)
+        return True
+
+    async def broadcast(self, message: str):
+        self._send(None, message)
+
+    async def publish(self, topic: str, message: str, client: Optional[str] = None):
+        """
+        Sends the message to subscribers of the topic on every worker.
+
+        :param topic: Name of the topic.
+        :param message: Text of the message.
+        :param client: Sends the message only to connections of this client, if provided.
+        :return: None
+        """
+
+        self._send(topic, message, client)
+
+    def _send(self, topic: Optional[str], message: str, client: Optional[str] = None) -> None:
+        item: Outgoing = (topic, message) if client is None else (topic, message, client)
+        if not self._subscribed:
+            return self._fan_out([item])
+
+        self._outgoing.append(item)
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(self._publish())
+
+    def _fan_out(self, messages: List[Outgoing]) -> None:
+        for topic, message, *client in messages:
+            if topic is None:
+                connections: List[Connection] = list(self.active_connections.values())
+            else:
+                connections = [self.active_connections[websocket] for websocket in self.topics.get(topic, ())]
+
+            for connection in connections:
+                if not client or connection.client == client[0]:
+                    self._enqueue(connection, message)
+
+    def batches(self, messages: List[Outgoing]) -> List[List[Outgoing]]:
+        """
+        Splits messages into batches which fit into one event.
+        """
+
+        batches: List[List[Outgoing]] = [[]]
+        size: int = 2
+        for item in messages:
+            length: int = len(json.dumps(item).encode()) + 1
+            if batches[-1] and size + length > self.conf.batch_bytes:
+                batches.append([])
+                size = 2
+            batches[-1].append(item)
+            size += length
+        return batches
+
+    async def _publish(self) -> None:
+        """
+        Publishes collected broadcasts until there are none left, including
+        the ones sent while the previous batches were being published.
+        """
+
+        while self._outgoing:
+            await asyncio.sleep(self.conf.batch_interval)
+            messages, self._outgoing = self._outgoing, []
+
+            for batch in self.batches(messages):
+                payload: str = json.dumps(batch)
+                try:
+                    if len(payload.encode()) > self.conf.batch_bytes:
+                        raise ValueError('Message is too large for one event')
+                    await self.bus.publish(self.conf.channel, payload)
+                except Exception:
+                    self.publish_errors += 1
+                    self._fan_out(batch)
+                    continue
+
+                self.published_batches += 1
+                self.published_messages += len(batch)
+
+    def _receive(self, payload: Optional[str]) -> None:
+        if not payload:
+            return
+
+        self.received_batches += 1
+        self._fan_out([tuple(item) for item in json.loads(payload)])
+
+    def stats(self) -> Dict[str, Any]:
+        connections: List[Connection] = list(self.active_connections.values())
+        depths: List[int] = [connection.queue.qsize() for connection in connections]
+
+        return {
+            'connections': len(connections),
+            'topics': len(self.topics),
+            'subscriptions': sum(len(subscribers) for subscribers in self.topics.values()),
+            'slow_consumer_policy': self.conf.slow_consumer_policy,
+            'queue_size': self.conf.queue_size,
+            'queued': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            'sent': self.sent + sum(connection.sent for connection in connections),
+            'dropped': self.dropped + sum(connection.dropped for connection in connections),
+            'slow_disconnects': self.slow_disconnects,
+            'published_batches': self.published_batches,
+            'published_messages': self.published_messages,
+            'received_batches': self.received_batches,
+            'publish_errors': self.publish_errors,
+            'forbidden_subscriptions': self.forbidden
+        }
@@ -1,6 +1,116 @@
-from typing import Dict
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List
+
+from schemas.conf import LLMConfig
+from utils.llm import LLMProvider
 
 body_create_option: Dict = {
     'key': 'TestKey',
     'value': {'Test': True}
 }
+
+partners: List[Dict] = [
+    {'id': 1, 'name': 'Alpen Trans', 'language': 'German', 'address': {'city': 'Innsbruck', 'country': 'Austria'}},
+    {'id': 2, 'name': 'Trasporti Rossi', 'language': 'Italian', 'address': {'city': 'Bolzano', 'country': 'Italy'}},
+    {'id': 3, 'name': 'Spedition Huber', 'language': 'German', 'address': {'city': 'Munich', 'country': 'Germany'}},
+]
+
+transports: List[Dict] = [
+    {
+        'supplierId': supplier_id,
+        'loadingAddress': {'city': load[0], 'country': load[1]},
+        'unloadingAddress': {'city': unload[0], 'country': unload[1]},
+        'price': price,
+        'performanceScore': score
+    } for supplier_id, load, unload, price, score in (
+        (1, ('Innsbruck', 'Austria'), ('Munich', 'Germany'), 900.0, 8.0),
+        (2, ('Bolzano', 'Italy'), ('Munich', 'Germany'), 1100.0, 9.0),
+        (1, ('Innsbruck', 'Austria'), ('Bolzano', 'Italy'), 700.0, 7.5),
+        (3, ('Munich', 'Germany'), ('Innsbruck', 'Austria'), 850.0, 6.0),
+        (2, ('Bolzano', 'Italy'), ('Munich', 'Germany'), 1000.0, 8.5),
+        (4, ('Verona', 'Italy'), ('Munich', 'Germany'), 1200.0, 5.0),
+    )
+]
+
+
+class FakeProvider(LLMProvider):
+    name: str = 'fake'
+
+    def __init__(self, conf: LLMConfig, latency: float = 0.0, name: str = 'fake', fail: bool = False):
+        super().__init__(conf)
+        self.name: str = name
+        self.latency: float = latency
+        self.fail: bool = fail
+        self.calls: int = 0
+        self.running: int = 0
+        self.max_running: int = 0
+
+    @property
+    def model(self) -> str:
+        return 'fake-model'
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.running -= 1
+
+        if self.fail:
+            raise RuntimeError(f'{self.name} is down')
+        return prompt.upper()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        reply: str = await self.generate(prompt)
+        for start in range(0, len(reply), 16):
+            yield reply[start:start + 16]
+
+
+dispatch_response: Dict = {
+    'partner_name': 'Trasporti Rossi',
+    'reason_why_you_choose_this_partner': 'Local partner with history on the lane',
+    'partner_language': 'Italian',
+    'direct_message': 'Buongiorno, abbiamo un trasporto da Bolzano a Monaco.'
+}
+
+
+class DispatchProvider(FakeProvider):
+    """
+    Answers every prompt with the choice of a partner.
+    """
+
+    async def generate(self, prompt: str) -> str:
+        await super().generate(prompt)
+        return f'Here is the partner: {json.dumps(dispatch_response)}'
+
+
+conversation_context: Dict = {
+    'partner_name': ['Trasporti Rossi'],
+    'minimal_price': 1010.0,
+    'target_price': 1200.0,
+    'reason_why_you_choose_this_partner': ['Local partner with history on the lane'],
+    'partner_language': 'Italian'
+}
+
+conversation_offer: str = 'Buongiorno, abbiamo un trasporto da Bolzano a Monaco per 1200 Euro.'
+
+
+class FakeWebSocket:
+
+    def __init__(self, delay: float = 0.0):
+        self.delay: float = delay
+        self.received: list = []
+        self.closed: int | None = None
+
+    async def accept(self):
+        return
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.delay)
+        self.received.append(message)
+
+    async def close(self, code: int = 1000):
+        self.closed = code
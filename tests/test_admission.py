@@ -0,0 +1,150 @@
+import asyncio
+import copy
+
+import httpx
+from fastapi import HTTPException, Request
+
+from schemas.conf import AdmissionConfig
+from services import ConversationService
+from utils.admission import FOLLOW_UPS, SEND_MESSAGE, START_AN_ORDER, AdmissionController, admission
+from utils.llm import llm
+
+from .assets import FakeProvider, conversation_context, conversation_offer
+from .test_base import TestBase
+
+
+class TestAdmissionController:
+
+    async def rejection(self, coroutine) -> HTTPException:
+        try:
+            await coroutine
+        except HTTPException as e:
+            return e
+        raise AssertionError('Request was admitted')
+
+    async def test_endpoint_limit(self):
+        controller: AdmissionController = AdmissionController(AdmissionConfig(max_new_orders=1))
+        await controller.acquire(START_AN_ORDER)
+        await controller.acquire(SEND_MESSAGE)
+
+        waiting: asyncio.Task = asyncio.create_task(controller.acquire(START_AN_ORDER))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        controller.release(START_AN_ORDER)
+        await waiting
+        assert controller.stats()['running_by_endpoint'] == {START_AN_ORDER: 1, SEND_MESSAGE: 1}
+
+    async def test_priority(self):
+        for priority, first in (('new_orders', START_AN_ORDER), (FOLLOW_UPS, SEND_MESSAGE)):
+            controller: AdmissionController = AdmissionController(AdmissionConfig(max_concurrent=1, priority=priority))
+            await controller.acquire(SEND_MESSAGE)
+            admitted: list = []
+
+            async def request(endpoint: str):
+                await controller.acquire(endpoint)
+                admitted.append(endpoint)
+
+            tasks: list = [asyncio.create_task(request(endpoint)) for endpoint in (SEND_MESSAGE, START_AN_ORDER)]
+            await asyncio.sleep(0.01)
+            controller.release(SEND_MESSAGE)
+            await asyncio.sleep(0.01)
+
+            assert admitted == [first]
+            controller.release(first)
+            await asyncio.gather(*tasks)
+
+    async def test_full_queue(self):
+        controller: AdmissionController = AdmissionController(AdmissionConfig(max_concurrent=1, queue_size=1, retry_after=3))
+        await controller.acquire(START_AN_ORDER)
+        follow_up: asyncio.Task = asyncio.create_task(controller.acquire(SEND_MESSAGE))
+        await asyncio.sleep(0.01)
+
+        order: asyncio.Task = asyncio.create_task(controller.acquire(START_AN_ORDER))
+        shed: HTTPException = await self.rejection(follow_up)
+        assert shed.status_code == 503
+
+        rejected: HTTPException = await self.rejection(controller.acquire(SEND_MESSAGE))
+        assert rejected.status_code == 503
+        assert rejected.headers['Retry-After'] == '3'
+
+        controller.release(START_AN_ORDER)
+        await order
+        assert controller.stats()['shed'] == 1
+        assert controller.stats()['rejected'] == 1
+
+    async def test_queue_timeout(self):
+        controller: AdmissionController = AdmissionController(AdmissionConfig(max_concurrent=1, queue_timeout=0.01))
+        await controller.acquire(START_AN_ORDER)
+
+        rejected: HTTPException = await self.rejection(controller.acquire(START_AN_ORDER))
+
+        assert rejected.status_code == 503
+        assert controller.stats()['timed_out'] == 1
+        assert controller.stats()['waiting'] == 0
+
+    async def test_rate_limit(self):
+        controller: AdmissionController = AdmissionController(AdmissionConfig(rate=1.0, burst=2))
+        await controller.acquire(START_AN_ORDER, 'planner')
+        await controller.acquire(START_AN_ORDER, 'planner')
+        await controller.acquire(START_AN_ORDER, 'other')
+
+        rejected: HTTPException = await self.rejection(controller.acquire(START_AN_ORDER, 'planner'))
+
+        assert rejected.status_code == 429
+        assert rejected.headers['Retry-After'] == '1'
+
+    def test_client_header_is_trusted_only_when_configured(self):
+        request: Request = Request({
+            'type': 'http',
+            'headers': [(b'x-client-id', b'planner')],
+            'client': ('10.0.0.1', 4321)
+        })
+
+        assert AdmissionController().client(request) == '10.0.0.1'
+        assert AdmissionController(AdmissionConfig(client_header='X-Client-Id')).client(request) == 'planner'
+
+
+class TestAdmission(TestBase):
+
+    async def setup(self):
+        await super().setup()
+        llm.register(FakeProvider(llm.conf, name=llm.conf.provider))
+
+    async def test_send_message_rate_limit(self):
+        conversation = await ConversationService().start(
+            context=copy.deepcopy(conversation_context),
+            offer=conversation_offer
+        )
+        body: dict = {'id_conversation': str(conversation.id), 'message': 'Can we go lower?'}
+
+        admission.conf = AdmissionConfig(rate=0.001, burst=1)
+        try:
+            async with httpx.AsyncClient(app=self.app, base_url='https://test') as client:
+                first = await client.patch('/api/dispatcher', json=body, headers={'X-Client-Id': 'planner'})
+                second = await client.patch('/api/dispatcher', json=body, headers={'X-Client-Id': 'another'})
+                streamed = await client.patch('/api/dispatcher/stream', json=body)
+        finally:
+            admission.conf = AdmissionConfig()
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert 'Retry-After' in second.headers
+        assert streamed.status_code == 429
+        assert admission.stats()['running'] == 0
+
+    async def test_stream_message_takes_slot(self):
+        conversation = await ConversationService().start(
+            context=copy.deepcopy(conversation_context),
+            offer=conversation_offer
+        )
+        admitted: int = admission.stats()['admitted']
+
+        response = await self.api('PATCH', '/api/dispatcher/stream', _body={
+            'id_conversation': str(conversation.id),
+            'message': 'Can we go lower?'
+        })
+
+        assert response.status_code == 200
+        assert admission.stats()['admitted'] == admitted + 1
+        assert admission.stats()['running'] == 0
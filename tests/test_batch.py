@@ -0,0 +1,82 @@
+import importlib
+import json
+
+from models import Conversation, ConversationMessage
+from schemas.conf import AdmissionConfig
+from utils.admission import AdmissionController
+from utils.cache import data_cache
+from utils.conversation_cache import conversation_cache
+from utils.llm import llm
+
+from .assets import DispatchProvider, FakeProvider, partners, transports
+from .test_base import TestBase
+
+
+def order(load: str, unload: str) -> dict:
+    cities: dict = {'Bolzano': 'Italy', 'Munich': 'Germany', 'Innsbruck': 'Austria'}
+    return {
+        'load_address': {'city': load, 'country': cities[load]},
+        'unload_address': {'city': unload, 'country': cities[unload]},
+        'price': 1200.0
+    }
+
+
+class TestBatch(TestBase):
+
+    async def setup(self):
+        await super().setup()
+        data_cache.set('/Supplier/GetAllSuppliers', partners, 60)
+        data_cache.set('/Transport/GetTransportHistory', transports, 60)
+        llm.cache.clear()
+
+    async def test_start_orders(self):
+        provider: DispatchProvider = DispatchProvider(llm.conf, name=llm.conf.provider, latency=0.01)
+        llm.register(provider)
+        orders: list = [order('Bolzano', 'Munich'), order('Innsbruck', 'Munich'), order('Munich', 'Innsbruck')]
+
+        response = await self.api('POST', '/api/dispatcher/batch', _body={'orders': orders})
+        data_cache.invalidate()
+
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'application/x-ndjson'
+
+        results: list = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(result['order'] for result in results) == [0, 1, 2]
+        assert all(result['partner_name'] == 'Trasporti Rossi' for result in results)
+        assert provider.calls == 3
+
+        assert await Conversation.filter(id__in=[result['id_conversation'] for result in results]).count() == 3
+        await conversation_cache.flush()
+        assert await ConversationMessage.filter(sequence=0).count() == 3
+
+    async def test_failed_orders(self):
+        llm.register(FakeProvider(llm.conf, name=llm.conf.provider))
+
+        response = await self.api('POST', '/api/dispatcher/batch', _body={'orders': [order('Bolzano', 'Munich')]})
+        data_cache.invalidate()
+
+        results: list = [json.loads(line) for line in response.text.splitlines()]
+        assert [result['order'] for result in results] == [0]
+        assert 'error' in results[0]
+        assert await Conversation.all().count() == 0
+
+    async def test_empty_batch(self):
+        response = await self.api('POST', '/api/dispatcher/batch', _body={'orders': []})
+
+        assert response.status_code == 422
+
+    async def test_saturated_admission(self, monkeypatch):
+        llm.register(DispatchProvider(llm.conf, name=llm.conf.provider))
+        monkeypatch.setattr(
+            importlib.import_module('api.dispatcher'),
+            'admission',
+            AdmissionController(AdmissionConfig(max_concurrent=0, queue_size=0))
+        )
+
+        response = await self.api('POST', '/api/dispatcher/batch', _body={'orders': [order('Bolzano', 'Munich'), order('Innsbruck', 'Munich')]})
+        data_cache.invalidate()
+
+        assert response.status_code == 200
+        results: list = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(result['order'] for result in results) == [0, 1]
+        assert all(result['error'] == 'Service is overloaded' for result in results)
@@ -0,0 +1,67 @@
+import asyncio
+
+from schemas.conf import CacheConfig
+from utils.cache import TTLCache
+
+
+class TestTTLCache:
+
+    async def test_concurrent_misses_load_once(self):
+        cache: TTLCache = TTLCache(CacheConfig(ttl=60, endpoint_ttls={}, stale_ttl=60, max_bytes=1024))
+        calls: list = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return ['supplier'], 10
+
+        results = await asyncio.gather(*[cache.get_or_load('/suppliers', loader) for _ in range(10)])
+
+        assert len(calls) == 1
+        assert all(result == ['supplier'] for result in results)
+        assert cache.stats()['misses'] == 10
+        assert cache.stats()['loads'] == 1
+
+    async def test_serves_stale_while_refreshing(self):
+        cache: TTLCache = TTLCache(CacheConfig(ttl=0, endpoint_ttls={}, stale_ttl=60, max_bytes=1024))
+        versions: list = []
+
+        async def loader():
+            versions.append(len(versions))
+            return versions[-1], 10
+
+        assert await cache.get_or_load('/transports', loader) == 0
+        assert await cache.get_or_load('/transports', loader) == 0
+        await asyncio.sleep(0)
+
+        assert await cache.get_or_load('/transports', loader) == 1
+        assert cache.stats()['stale_hits'] == 2
+
+    async def test_memory_bound_and_invalidation(self):
+        cache: TTLCache = TTLCache(CacheConfig(ttl=60, endpoint_ttls={}, stale_ttl=0, max_bytes=100))
+        cache.set('a', 'a', 60)
+        cache.set('b', 'b', 60)
+
+        assert [entry['key'] for entry in cache.entries()] == ['b']
+        assert cache.stats()['evictions'] == 1
+        assert cache.invalidate() == 1
+        assert cache.stats()['size'] == 0
+
+    async def test_invalidation_discards_running_load(self):
+        cache: TTLCache = TTLCache(CacheConfig(ttl=60, endpoint_ttls={}, stale_ttl=0, max_bytes=1024))
+        versions: list = []
+
+        async def loader():
+            versions.append(len(versions))
+            version: int = versions[-1]
+            await asyncio.sleep(0.02)
+            return version, 10
+
+        stale: asyncio.Task = asyncio.create_task(cache.get_or_load('/suppliers', loader))
+        await asyncio.sleep(0)
+        cache.invalidate('/suppliers')
+
+        assert await cache.get_or_load('/suppliers', loader) == 1
+        assert await stale == 0
+        assert await cache.get_or_load('/suppliers', loader) == 1
+        assert cache.stats()['discarded_loads'] == 1
@@ -0,0 +1,126 @@
+import asyncio
+import copy
+
+import pytest
+
+from models import Conversation, ConversationMessage
+from schemas.conf import ConversationCacheConfig
+from services import ConversationService
+from utils.conversation_cache import ConversationCache, ConversationEntry, conversation_cache
+
+from .assets import conversation_context, conversation_offer
+from .test_base import TestBase
+
+
+class TestConversationCache(TestBase):
+
+    async def conversation(self) -> Conversation:
+        return await Conversation.create(context=copy.deepcopy(conversation_context))
+
+    def message(self, conversation: Conversation, sequence: int) -> ConversationMessage:
+        return ConversationMessage(conversation_id=conversation.id, sequence=sequence, role='partner', text=f'Message {sequence}')
+
+    async def rows(self, conversation: Conversation) -> int:
+        return await ConversationMessage.filter(conversation_id=conversation.id).count()
+
+    async def test_write_behind(self):
+        await conversation_cache.close()
+        conversation: Conversation = await ConversationService().start(
+            context=copy.deepcopy(conversation_context),
+            offer=conversation_offer
+        )
+        await ConversationService().reply(conversation, 'Can we go up to 1.350 Euro?', 'We can offer 1.250 Euro.')
+
+        assert await self.rows(conversation) == 0
+        assert conversation_cache.stats()['dirty_entries'] == 1
+        assert conversation_cache.stats()['pending_messages'] == 3
+
+        assert await conversation_cache.flush() == 3
+        assert await self.rows(conversation) == 3
+        assert conversation_cache.stats()['dirty_entries'] == 0
+
+        messages = await ConversationService().unsummarized(conversation)
+        assert [m.sequence for m in messages] == [0, 1, 2]
+        assert conversation_cache.stats()['hits'] > 0
+
+    async def test_flush_on_evict(self):
+        cache: ConversationCache = ConversationCache(ConversationCacheConfig(max_entries=1))
+        first: Conversation = await self.conversation()
+        second: Conversation = await self.conversation()
+
+        entry: ConversationEntry = cache.set(first, [])
+        cache.add(entry, [self.message(first, 0)], keep=10)
+        cache.set(second, [])
+        await asyncio.sleep(0.05)
+
+        assert cache.get(first.id) is None
+        assert cache.stats()['evictions'] == 1
+        assert await self.rows(first) == 1
+
+    async def test_dirty_entries_are_kept(self):
+        cache: ConversationCache = ConversationCache(ConversationCacheConfig(max_entries=1, flush_on_evict=False))
+        first: Conversation = await self.conversation()
+        second: Conversation = await self.conversation()
+
+        entry: ConversationEntry = cache.set(first, [])
+        cache.add(entry, [self.message(first, 0)], keep=10)
+        cache.set(second, [])
+
+        assert cache.get(first.id) is entry
+        assert await self.rows(first) == 0
+
+        await cache.flush()
+        cache.set(await self.conversation(), [])
+        assert cache.get(first.id) is None
+
+    async def test_write_through(self):
+        conversation_cache.conf = ConversationCacheConfig(durability='write_through')
+        try:
+            conversation: Conversation = await ConversationService().start(
+                context=copy.deepcopy(conversation_context),
+                offer=conversation_offer
+            )
+        finally:
+            conversation_cache.conf = ConversationCacheConfig()
+
+        assert await self.rows(conversation) == 1
+        assert conversation_cache.stats()['dirty_entries'] == 0
+
+    async def test_write_through_failure(self, monkeypatch):
+        conversation: Conversation = await ConversationService().start(
+            context=copy.deepcopy(conversation_context),
+            offer=conversation_offer
+        )
+        await conversation_cache.flush()
+
+        async def bulk_create(*args, **kwargs):
+            raise ConnectionError('Database is down')
+
+        monkeypatch.setattr(conversation_cache, 'conf', ConversationCacheConfig(durability='write_through'))
+        monkeypatch.setattr(ConversationMessage, 'bulk_create', bulk_create)
+        monkeypatch.setattr(conversation_cache, 'flush_errors', 0)
+        with pytest.raises(ConnectionError):
+            await ConversationService().reply(conversation, 'Can we go up to 1.350 Euro?', 'We can offer 1.250 Euro.')
+
+        entry: ConversationEntry = conversation_cache.get(conversation.id)
+        assert [m.sequence for m in entry.messages] == [0]
+        assert conversation_cache.stats()['pending_messages'] == 0
+
+    async def test_conflicting_messages_do_not_block_flush(self):
+        cache: ConversationCache = ConversationCache()
+        first: Conversation = await self.conversation()
+        second: Conversation = await self.conversation()
+
+        cache.add(cache.set(first, []), [self.message(first, 0), self.message(first, 1), self.message(first, 1)], keep=10)
+        cache.add(cache.set(second, []), [self.message(second, 0)], keep=10)
+
+        assert await cache.flush() == 3
+        assert await self.rows(first) == 2
+        assert await self.rows(second) == 1
+        assert [m.sequence for m in cache.get(first.id).messages] == [0, 1]
+
+        stats: dict = cache.stats()
+        assert stats['pending_messages'] == 0
+        assert stats['dropped_messages'] == 1
+        assert stats['flush_errors'] == 1
+        await cache.close()
@@ -0,0 +1,88 @@
+import importlib
+
+import pytest
+
+from config.application import shutdown_event
+from models import Option
+from schemas.conf import DatabaseConfig
+from utils import database
+from utils.conversation_cache import conversation_cache
+from utils.http import data_source
+from utils.option_cache import option_cache
+
+from .test_base import TestBase
+
+
+@pytest.fixture
+def environment(monkeypatch):
+    for name, value in {'DB_NAME': 'svctpl', 'DB_HOST': 'primary', 'DB_PORT': '5432', 'DB_USER': 'svctpl', 'DB_PASSWORD': '123'}.items():
+        monkeypatch.setenv(name, value)
+
+
+class TestDatabaseConfig:
+
+    def test_pool_settings(self, environment):
+        conf: DatabaseConfig = DatabaseConfig()
+        config: dict = conf.tortoise_config(modules={'models': ['models']})
+
+        credentials: dict = config['connections']['default']['credentials']
+        assert credentials['host'] == 'primary'
+        assert credentials['maxsize'] == conf.pool_max_size
+        assert credentials['statement_cache_size'] == conf.statement_cache_size
+        assert credentials['command_timeout'] == conf.command_timeout
+        assert 'read' not in config['connections']
+        assert config['apps']['models']['default_connection'] == 'default'
+
+    def test_read_connection(self, environment):
+        conf: DatabaseConfig = DatabaseConfig()
+        conf.read_host = 'replica'
+        config: dict = conf.tortoise_config(modules={'models': ['models']})
+
+        credentials: dict = config['connections']['read']['credentials']
+        assert credentials['host'] == 'replica'
+        assert credentials['maxsize'] == conf.read_pool_max_size
+        assert credentials['server_settings'] == {'default_transaction_read_only': 'on'}
+
+
+class TestDatabaseStats(TestBase):
+
+    async def test_database_stats(self):
+        response = await self.api('GET', '/api/dispatcher/database')
+
+        assert response.status_code == 200
+        assert response.json() == {'default': {'engine': 'sqlite'}}
+
+    async def test_options_use_read_connection(self, monkeypatch):
+        await Option.create(key='currency', value={'code': 'EUR'})
+
+        calls: list = []
+
+        def read_connection():
+            calls.append(True)
+            return database.read_connection()
+
+        monkeypatch.setattr(importlib.import_module('services.option'), 'read_connection', read_connection)
+        monkeypatch.setattr(option_cache.conf, 'enabled', False)
+
+        response = await self.api('GET', '/api/options')
+
+        assert response.status_code == 200
+        assert [option['key'] for option in response.json()['options']] == ['currency']
+        assert calls
+
+
+class TestShutdown(TestBase):
+
+    async def test_every_step_runs(self, monkeypatch):
+        async def fail():
+            raise RuntimeError('Flush failed')
+
+        await data_source.open()
+        monkeypatch.setattr(conversation_cache, 'close', fail)
+
+        with pytest.raises(ExceptionGroup) as error:
+            await shutdown_event()
+        monkeypatch.undo()
+
+        assert [str(e) for e in error.value.exceptions] == ['Flush failed']
+        assert not data_source.is_open
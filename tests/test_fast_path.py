@@ -0,0 +1,111 @@
+import copy
+
+from models import Conversation
+from schemas.conf import FastPathConfig, PricingConfig
+from services import ConversationService
+from utils.conversation_cache import conversation_cache
+from utils.fast_path import ACCEPT, ACCEPT_PRICE, BELOW_MINIMUM, COUNTER, REJECT, NegotiationFastPath, fast_path
+from utils.llm import llm
+
+from .assets import FakeProvider, conversation_context, conversation_offer
+from .test_base import TestBase
+
+
+class TestNegotiationFastPath:
+
+    def decide(self, message: str, last_offer: float = 1200.0, **context):
+        return NegotiationFastPath().decide({**conversation_context, **context}, message, last_offer)
+
+    def test_keywords(self):
+        assert self.decide('Va bene, affare fatto!').kind == ACCEPT
+        assert self.decide('OK, deal done').kind == ACCEPT
+        assert self.decide('Ok, thanks').kind == ACCEPT
+        assert self.decide('No grazie, non siamo interessati.').kind == REJECT
+        assert self.decide('Einverstanden', partner_language='German').reply.startswith('Vielen Dank')
+        assert self.decide('Sorry, not interested', partner_language='Klingon').kind == REJECT
+
+    def test_conditional_messages(self):
+        assert self.decide('ok but we need an extra day') is None
+        assert self.decide('ok, I will check with my boss') is None
+        assert self.decide('Va bene, ma solo con scarico lunedì') is None
+        assert self.decide('Einverstanden, aber erst ab Montag', partner_language='German') is None
+        assert self.decide("D'accord, mais pas avant lundi", partner_language='French') is None
+        assert self.decide('deal, but only for 1.500') is None
+        assert self.decide('no, 1300') is None
+        assert self.decide('1300 or nothing') is None
+
+    def test_counter_offers(self):
+        accepted = self.decide('1.190 Euro')
+        assert accepted.kind == ACCEPT_PRICE
+        assert '1190' in accepted.reply
+
+        assert self.decide('1,250.50 Euro', target_price=1250.0).reply.startswith("D'accordo, 1250.50 Euro")
+
+        countered = self.decide('1.100 Euro ok', minimal_price=800.0)
+        assert countered.kind == COUNTER
+        assert countered.price == 1150.0
+        assert '1150' in countered.reply
+
+        below = self.decide('700 Euro', minimal_price=800.0)
+        assert below.kind == BELOW_MINIMUM
+        assert below.price == 1120.0
+
+        assert self.decide('900 Euro', minimal_price=800.0).price == 1120.0
+        assert self.decide('1.100 Euro', minimal_price=800.0, last_offer=1150.0).price == 1120.0
+
+    def test_price_floor(self):
+        countered = self.decide('1.100 Euro')
+        assert countered.kind == COUNTER
+        assert countered.price == 1200.0
+
+        assert NegotiationFastPath(pricing=PricingConfig(floor_margin=0.0)).decide(
+            conversation_context, '1.100 Euro', 1200.0
+        ).price == 1150.0
+
+    def test_target_below_floor(self):
+        context: dict = {**conversation_context, 'minimal_price': 1000.0, 'target_price': 1200.0}
+        fast_path: NegotiationFastPath = NegotiationFastPath()
+
+        assert fast_path.decide(context, '1.180 Euro', 1200.0).kind == ACCEPT_PRICE
+        assert fast_path.decide(context, '1.100 Euro', 1200.0).price == 1200.0
+        assert fast_path.decide(context, '950 Euro', 1200.0).kind == BELOW_MINIMUM
+        assert fast_path.decide({**context, 'target_price': 960.0}, '950 Euro', 1200.0).kind == BELOW_MINIMUM
+
+    def test_open_ended_messages(self):
+        assert self.decide('Can we go up to 1.350 Euro?') is None
+        assert self.decide('Hello') is None
+        assert self.decide('Ok for 1.100 Euro, but not 1.000 Euro') is None
+        assert self.decide('We could load on the 3rd') is None
+        assert self.decide('Ok, but we would need an extra day for loading because the driver is on holiday') is None
+        assert NegotiationFastPath(FastPathConfig(enabled=False)).decide(conversation_context, 'Va bene', 1200.0) is None
+
+
+class TestFastPath(TestBase):
+
+    async def setup(self):
+        await super().setup()
+        self.provider: FakeProvider = FakeProvider(llm.conf, name=llm.conf.provider)
+        llm.register(self.provider)
+
+    async def test_send_message_skips_llm(self):
+        conversation: Conversation = await ConversationService().start(
+            context={**copy.deepcopy(conversation_context), 'minimal_price': 800.0},
+            offer=conversation_offer,
+            price=1200.0
+        )
+        hits: int = fast_path.stats()['hits']
+
+        response = await self.api('PATCH', '/api/dispatcher', _body={
+            'id_conversation': str(conversation.id),
+            'message': '1.100 Euro'
+        })
+
+        assert response.status_code == 200
+        assert response.json()['message'] == 'Grazie per la sua offerta. Possiamo arrivare a 1150 Euro, le andrebbe bene?'
+        assert self.provider.calls == 0
+
+        entry = conversation_cache.get(conversation.id)
+        assert [message.price for message in entry.messages] == [1200.0, 1100.0, 1150.0]
+
+        stats: dict = (await self.api('GET', '/api/dispatcher/llm')).json()['fast_path']
+        assert stats['hits'] == hits + 1
@@ -0,0 +1,46 @@
+import httpx
+
+from schemas.conf import DataSourceConfig
+from utils.http import DataSourceClient
+
+
+class TestDataSourceClient:
+
+    def client(self, handler) -> DataSourceClient:
+        conf: DataSourceConfig = DataSourceConfig(base_url='https://source', http2=False, retries=2, backoff=0)
+        return DataSourceClient(conf=conf, transport=httpx.MockTransport(handler))
+
+    async def test_retries_server_errors(self):
+        calls: list = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            if len(calls) < 3:
+                return httpx.Response(503)
+            return httpx.Response(200, json=[{'city': 'Bolzano'}])
+
+        client: DataSourceClient = self.client(handler)
+        response = await client.get('/Helper/GetAvailableCities')
+        await client.close()
+
+        assert response.json() == [{'city': 'Bolzano'}]
+        assert len(calls) == 3
+        assert client.stats()['retries'] == 2
+
+    async def test_does_not_retry_client_errors(self):
+        calls: list = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(404)
+
+        client: DataSourceClient = self.client(handler)
+        try:
+            await client.get('/Missing')
+            assert False
+        except httpx.HTTPStatusError:
+            pass
+        await client.close()
+
+        assert len(calls) == 1
+        assert client.stats()['in_flight'] == 0
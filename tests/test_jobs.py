@@ -0,0 +1,151 @@
+import asyncio
+import datetime
+import json
+
+from tortoise import timezone
+
+from config.application import manager
+from models import Conversation, DispatchJob
+from schemas.conf import JobQueueConfig
+from utils.cache import data_cache
+from utils.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, job_queue
+from utils.llm import llm
+
+from .assets import DispatchProvider, FakeWebSocket, partners, transports
+from .test_base import TestBase
+
+order: dict = {
+    'load_address': {'city': 'Bolzano', 'country': 'Italy'},
+    'unload_address': {'city': 'Munich', 'country': 'Germany'},
+    'price': 1200.0
+}
+
+
+class TestJobs(TestBase):
+
+    async def setup(self):
+        await super().setup()
+        llm.register(DispatchProvider(llm.conf, name=llm.conf.provider))
+        data_cache.set('/Supplier/GetAllSuppliers', partners, 60)
+        data_cache.set('/Transport/GetTransportHistory', transports, 60)
+        llm.cache.clear()
+
+    async def finished(self, id_job: str) -> dict:
+        for _ in range(100):
+            response = await self.api('GET', f'/api/dispatcher/jobs/{id_job}')
+            if response.json()['status'] in (DONE, FAILED):
+                return response.json()
+            await asyncio.sleep(0.01)
+        raise AssertionError('Job did not finish')
+
+    async def test_enqueue_an_order(self):
+        response = await self.api('POST', '/api/dispatcher/jobs', _body=order)
+
+        assert response.status_code == 202
+        assert response.json()['status'] == QUEUED
+
+        job: dict = await self.finished(response.json()['id_job'])
+        data_cache.invalidate()
+
+        assert job['status'] == DONE
+        assert job['attempts'] == 1
+        assert job['result']['partner_name'] == 'Trasporti Rossi'
+        assert await Conversation.filter(id=job['result']['id_conversation']).exists()
+
+        stats: dict = (await self.api('GET', '/api/dispatcher/jobs/stats')).json()
+        assert stats['completed'] == 1
+        assert stats['queued'] == 0
+
+    async def test_invalid_order(self):
+        response = await self.api('POST', '/api/dispatcher/jobs', _body={'price': 1200.0})
+
+        assert response.status_code == 422
+        assert await DispatchJob.all().count() == 0
+
+    async def test_unknown_job(self):
+        response = await self.api('GET', '/api/dispatcher/jobs/00000000-0000-0000-0000-000000000000')
+
+        assert response.status_code == 404
+
+    async def test_job_finished_event(self):
+        websocket: FakeWebSocket = FakeWebSocket()
+        await manager.connect(websocket)
+
+        response = await self.api('POST', '/api/dispatcher/jobs', _body=order)
+        id_job: str = response.json()['id_job']
+        manager.subscribe(websocket, id_job)
+
+        await self.finished(id_job)
+        await asyncio.sleep(0.05)
+        data_cache.invalidate()
+        manager.disconnect(websocket)
+
+        event: dict = json.loads(websocket.received[-1])
+        assert event['event'] == 'job_finished'
+        assert event['status'] == DONE
+
+    async def test_failed_job(self):
+        async def handler(payload: dict) -> dict:
+            raise RuntimeError('Data source is down')
+
+        queue: JobQueue = JobQueue(JobQueueConfig(workers=1))
+        queue.handler = handler
+        await queue.open()
+        job: DispatchJob = await queue.enqueue(order)
+        await asyncio.sleep(0.05)
+        await queue.close()
+
+        await job.refresh_from_db()
+        assert job.status == FAILED
+        assert job.error == 'Data source is down'
+        assert queue.stats()['failed'] == 1
+
+    async def test_full_queue(self):
+        queue: JobQueue = JobQueue(JobQueueConfig(workers=0, max_queued=1))
+        await queue.open()
+        await queue.enqueue(order)
+
+        try:
+            await queue.enqueue(order)
+        except Exception as e:
+            assert e.status_code == 503
+            assert e.headers['Retry-After'] == str(queue.conf.retry_after)
+        else:
+            raise AssertionError('Job was not rejected')
+        finally:
+            await queue.close()
+
+        assert queue.stats()['rejected'] == 1
+
+    async def test_recover(self):
+        await job_queue.close()
+        results: list = []
+
+        async def handler(payload: dict) -> dict:
+            results.append(payload)
+            return payload
+
+        lost: DispatchJob = await DispatchJob.create(status=RUNNING, payload={'job': 'lost'})
+        lost.started = timezone.now() - datetime.timedelta(hours=1)
+        await lost.save(update_fields=['started'])
+        slow: DispatchJob = await DispatchJob.create(status=RUNNING, payload={'job': 'slow'})
+        slow.started = timezone.now() - datetime.timedelta(seconds=90)
+        await slow.save(update_fields=['started'])
+        exhausted: DispatchJob = await DispatchJob.create(status=RUNNING, payload={'job': 'exhausted'}, attempts=3)
+        exhausted.started = timezone.now() - datetime.timedelta(hours=1)
+        await exhausted.save(update_fields=['started'])
+        await DispatchJob.create(status=RUNNING, payload={'job': 'running'}, started=timezone.now())
+        await DispatchJob.create(status=QUEUED, payload={'job': 'queued'})
+
+        queue: JobQueue = JobQueue(JobQueueConfig(workers=1, job_timeout=60, lost_after=120, max_attempts=3))
+        queue.handler = handler
+        await queue.open()
+        await asyncio.sleep(0.05)
+        await queue.close()
+
+        assert sorted(result['job'] for result in results) == ['lost', 'queued']
+        assert queue.stats()['recovered'] == 2
+        assert queue.stats()['abandoned'] == 1
+        assert await DispatchJob.filter(status=DONE).count() == 2
+        assert (await DispatchJob.get(id=exhausted.id)).status == FAILED
+        assert (await DispatchJob.get(id=slow.id)).status == RUNNING
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from schemas.conf import LLMConfig
+from utils.llm import LLMService
+
+from .assets import FakeProvider
+
+
+class TestLLMService:
+
+    async def test_concurrency_limit(self):
+        service: LLMService = LLMService(LLMConfig(provider='fake', max_concurrency=2))
+        provider: FakeProvider = FakeProvider(service.conf, latency=0.01)
+        service.register(provider)
+
+        replies = await asyncio.gather(*[service.generate(f'hello {i}') for i in range(6)])
+
+        assert replies[0] == 'HELLO 0'
+        assert provider.max_running == 2
+        assert service.stats()['requests'] == 6
+
+    async def test_timeout(self):
+        service: LLMService = LLMService(LLMConfig(provider='fake', timeout=0.01))
+        service.register(FakeProvider(service.conf, latency=1))
+
+        with pytest.raises(HTTPException) as error:
+            await service.generate('hello')
+
+        assert error.value.status_code == 504
+        assert service.stats()['timeouts'] == 1
+
+    async def test_missing_provider(self):
+        service: LLMService = LLMService(LLMConfig(provider='fake', anthropic_api_key=None, gemini_api_key=None))
+
+        with pytest.raises(HTTPException) as error:
+            await service.generate('hello')
+
+        assert error.value.status_code == 503
@@ -0,0 +1,48 @@
+from models import LLMResponse
+from schemas.conf import LLMCacheConfig, LLMConfig
+from utils.llm import LLMService
+from utils.llm_cache import LLMResponseCache
+
+from .assets import FakeProvider
+from .test_base import TestBase
+
+
+class TestLLMResponseCache(TestBase):
+
+    def service(self, **kwargs) -> LLMService:
+        conf: LLMCacheConfig = LLMCacheConfig(endpoints=['start_an_order'], **kwargs)
+        service: LLMService = LLMService(LLMConfig(provider='fake'), cache=LLMResponseCache(conf))
+        service.register(FakeProvider(service.conf))
+        return service
+
+    async def test_cached_in_memory_and_database(self):
+        service: LLMService = self.service()
+
+        first: str = await service.generate('Find a partner  for\nBolzano', cache='start_an_order')
+        second: str = await service.generate('Find a partner for Bolzano', cache='start_an_order')
+        assert first == second
+        assert service.stats()['requests'] == 1
+        assert service.cache.stats()['memory_hits'] == 1
+
+        service.cache.clear()
+        assert await service.generate('Find a partner for Bolzano', cache='start_an_order') == first
+        assert service.cache.stats()['database_hits'] == 1
+        assert await LLMResponse.all().count() == 1
+
+    async def test_only_enabled_endpoints_are_cached(self):
+        service: LLMService = self.service()
+
+        await service.generate('Hello', cache='send_message')
+        await service.generate('Hello', cache='send_message')
+
+        assert service.stats()['requests'] == 2
+        assert await LLMResponse.all().count() == 0
+
+    async def test_prune(self):
+        service: LLMService = self.service(database_entries=2)
+
+        for prompt in ('one', 'two', 'three'):
+            await service.generate(prompt, cache='start_an_order')
+
+        assert await service.cache.prune() == 1
+        assert await LLMResponse.all().count() == 2
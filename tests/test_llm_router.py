@@ -0,0 +1,83 @@
+import asyncio
+
+from schemas.conf import LLMConfig
+from utils.llm import LLMService
+
+from .assets import FakeProvider
+
+
+class TestProviderRouter:
+
+    def service(self, *providers, **kwargs) -> LLMService:
+        service: LLMService = LLMService(LLMConfig(provider='slow', routing=True, **kwargs))
+        for provider in providers:
+            provider.conf = service.conf
+            service.register(provider)
+        return service
+
+    async def test_routes_to_fastest_provider(self):
+        slow: FakeProvider = FakeProvider(LLMConfig(), latency=0.03, name='slow')
+        fast: FakeProvider = FakeProvider(LLMConfig(), latency=0.001, name='fast')
+        service: LLMService = self.service(slow, fast)
+
+        await service.generate('warm up slow')
+        assert slow.calls == 1
+        await service.generate('warm up fast')
+        assert fast.calls == 1
+
+        for _ in range(5):
+            await service.generate('hello')
+
+        assert fast.calls == 6
+        assert slow.calls == 1
+
+    async def test_failover_and_circuit_breaker(self):
+        broken: FakeProvider = FakeProvider(LLMConfig(), name='slow', fail=True)
+        healthy: FakeProvider = FakeProvider(LLMConfig(), name='healthy')
+        service: LLMService = self.service(broken, healthy, breaker_failures=2, breaker_reset=60)
+
+        for _ in range(4):
+            assert await service.generate('hello') == 'HELLO'
+
+        assert broken.calls == 2
+        assert healthy.calls == 4
+        assert service.router.stats()['providers']['slow:fake-model']['state'] == 'open'
+
+    async def test_hedged_request_cancels_slower_provider(self):
+        primary: FakeProvider = FakeProvider(LLMConfig(), latency=0.001, name='slow')
+        backup: FakeProvider = FakeProvider(LLMConfig(), latency=0.02, name='backup')
+        service: LLMService = self.service(primary, backup, hedging=True)
+
+        await service.generate('warm up primary')
+        await service.generate('warm up backup')
+
+        primary.latency = 1
+        started: float = asyncio.get_running_loop().time()
+        await service.generate('hello')
+
+        assert asyncio.get_running_loop().time() - started < 0.5
+        assert service.router.stats()['hedges'] == 1
+        assert service.router.stats()['hedge_wins'] == 1
+        await asyncio.sleep(0.01)
+        assert primary.running == 0
+
+    async def test_latency_excludes_waiting_for_a_slot(self):
+        provider: FakeProvider = FakeProvider(LLMConfig(), latency=0.05, name='slow')
+        service: LLMService = self.service(provider, max_concurrency=1)
+
+        await asyncio.gather(service.generate('first'), service.generate('second'))
+
+        assert max(service.router.health['slow:fake-model'].latencies) < 0.09
+
+    async def test_no_hedge_while_saturated(self):
+        primary: FakeProvider = FakeProvider(LLMConfig(), latency=0.001, name='slow')
+        backup: FakeProvider = FakeProvider(LLMConfig(), latency=0.02, name='backup')
+        service: LLMService = self.service(primary, backup, hedging=True, max_concurrency=1)
+
+        await service.generate('warm up primary')
+        await service.generate('warm up backup')
+
+        primary.latency = 0.05
+        await service.generate('hello')
+
+        assert service.router.stats()['hedges'] == 0
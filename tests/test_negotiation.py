@@ -0,0 +1,178 @@
+import asyncio
+import copy
+import json
+
+from api.dispatcher import CONVERSATIONS_TOPIC, conversation_started
+from config.application import manager
+from models import Conversation, ConversationMessage
+from services import ConversationService, ConversationSummaries, conversation_summaries
+from utils.conversation_cache import conversation_cache
+from utils.llm import llm
+
+from .assets import FakeProvider, FakeWebSocket, conversation_context, conversation_offer
+from .test_base import TestBase
+
+
+class TestNegotiation(TestBase):
+
+    async def setup(self):
+        await super().setup()
+        llm.register(FakeProvider(llm.conf, name=llm.conf.provider))
+
+    async def conversation(self) -> Conversation:
+        return await ConversationService().start(
+            context=copy.deepcopy(conversation_context),
+            offer=conversation_offer,
+            price=1200.0
+        )
+
+    async def messages(self, conversation: Conversation) -> list:
+        await conversation_cache.flush()
+        return await ConversationMessage.filter(conversation_id=conversation.id).order_by('sequence')
+
+    async def test_send_message(self):
+        conversation: Conversation = await self.conversation()
+
+        response = await self.api('PATCH', '/api/dispatcher', _body={
+            'id_conversation': str(conversation.id),
+            'message': 'Can we go up to 1.350 Euro?'
+        })
+        assert response.status_code == 200
+
+        messages = await self.messages(conversation)
+        assert [(m.sequence, m.role) for m in messages] == [(0, 'dispatcher'), (1, 'partner'), (2, 'dispatcher')]
+        assert messages[1].price == 1350.0
+        assert messages[2].text == response.json()['message']
+        assert messages[2].prompt_tokens > 0
+
+    async def test_concurrent_messages(self):
+        conversation: Conversation = await self.conversation()
+        llm.register(FakeProvider(llm.conf, name=llm.conf.provider, latency=0.05))
+
+        responses = await asyncio.gather(*[
+            self.api('PATCH', '/api/dispatcher', _body={'id_conversation': str(conversation.id), 'message': message})
+            for message in ('First', 'Second')
+        ])
+        assert [response.status_code for response in responses] == [200, 200]
+
+        messages = await self.messages(conversation)
+        assert [m.sequence for m in messages] == [0, 1, 2, 3, 4]
+        assert conversation_cache.stats()['flush_errors'] == 0
+
+    async def test_window(self):
+        conversation: Conversation = await self.conversation()
+        for message in ('First', 'Second'):
+            await self.api('PATCH', '/api/dispatcher', _body={'id_conversation': str(conversation.id), 'message': message})
+
+        window = await ConversationService().window(conversation, limit=3)
+        assert [m.sequence for m in window] == [2, 3, 4]
+
+    async def test_summary(self):
+        conversation: Conversation = await self.conversation()
+        for message in range(6):
+            await self.api('PATCH', '/api/dispatcher', _body={'id_conversation': str(conversation.id), 'message': f'Offer {message}'})
+        await conversation_summaries.drain()
+
+        conversation = await Conversation.get(id=conversation.id)
+        assert conversation.summary
+        assert conversation.summarized_sequence == 10 - ConversationService().conf.window
+
+        unsummarized = await ConversationService().unsummarized(conversation)
+        assert [m.sequence for m in unsummarized] == list(range(conversation.summarized_sequence + 1, 13))
+
+    async def test_summary_errors(self):
+        summaries: ConversationSummaries = ConversationSummaries()
+        conversation: Conversation = await self.conversation()
+
+        async def summarize():
+            raise RuntimeError('Summary failed')
+
+        summaries.schedule(conversation.id, summarize)
+        await summaries.drain()
+
+        assert summaries.stats()['summary_errors'] == 1
+        assert summaries.stats()['last_summary_error'] == 'Summary failed'
+        assert summaries.stats()['running_summaries'] == 0
+
+    async def test_message_event(self):
+        conversation: Conversation = await self.conversation()
+        subscriber, other = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(subscriber)
+        await manager.connect(other)
+        manager.subscribe(subscriber, str(conversation.id))
+
+        response = await self.api('PATCH', '/api/dispatcher', _body={'id_conversation': str(conversation.id), 'message': 'Is 1.300 Euro fine?'})
+        await asyncio.sleep(0.05)
+
+        event = json.loads(subscriber.received[-1])
+        assert event['event'] == 'message'
+        assert event['topic'] == str(conversation.id)
+        assert event['reply'] == response.json()['message']
+        assert other.received == []
+
+        manager.disconnect(subscriber)
+        manager.disconnect(other)
+
+    async def test_topics_of_other_clients(self):
+        conversation: Conversation = await ConversationService().start(
+            context=copy.deepcopy(conversation_context),
+            offer=conversation_offer,
+            client='10.0.0.1'
+        )
+        owner, stranger = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(owner, '10.0.0.1')
+        await manager.connect(stranger, '10.0.0.2')
+
+        for websocket in (owner, stranger):
+            for topic in (str(conversation.id), CONVERSATIONS_TOPIC):
+                await manager.control(websocket, json.dumps({'action': 'subscribe', 'topic': topic}))
+        await conversation_started(conversation, {'partner_name': 'Partner'})
+        await asyncio.sleep(0.05)
+
+        event = json.loads(owner.received[-1])
+        assert event == {'event': 'conversation_started', 'topic': CONVERSATIONS_TOPIC, 'id_conversation': str(conversation.id), 'partner_name': 'Partner'}
+        assert json.loads(stranger.received[0]) == {'action': 'error', 'detail': 'Forbidden topic', 'topic': str(conversation.id)}
+        assert [json.loads(message)['action'] for message in stranger.received] == ['error', 'subscribed']
+
+        manager.disconnect(owner)
+        manager.disconnect(stranger)
+
+    async def test_stream_message_error(self):
+        conversation: Conversation = await self.conversation()
+        llm.register(FakeProvider(llm.conf, name=llm.conf.provider, fail=True))
+
+        response = await self.api('PATCH', '/api/dispatcher/stream', _body={
+            'id_conversation': str(conversation.id),
+            'message': 'Can we go a little bit higher with price?'
+        })
+
+        events = [event for event in response.text.split('\n\n') if event]
+        assert events[-1].startswith('event: error')
+        assert json.loads(events[-1].split('data: ', 1)[1])['detail'] == f'{llm.conf.provider} is down'
+
+    async def test_unknown_conversation(self):
+        response = await self.api('PATCH', '/api/dispatcher', _body={
+            'id_conversation': '00000000-0000-0000-0000-000000000000',
+            'message': 'Hello'
+        })
+        assert response.status_code == 404
+
+    async def test_stream_message(self):
+        conversation: Conversation = await self.conversation()
+
+        response = await self.api('PATCH', '/api/dispatcher/stream', _body={
+            'id_conversation': str(conversation.id),
+            'message': 'Can we go a little bit higher with price?'
+        })
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/event-stream')
+
+        events = [event for event in response.text.split('\n\n') if event]
+        tokens = [json.loads(event[len('data: '):])['token'] for event in events[:-1]]
+        done = json.loads(events[-1].split('data: ', 1)[1])
+
+        assert len(tokens) > 1
+        assert ''.join(tokens) == done['message']
+
+        messages = await self.messages(conversation)
+        assert messages[-1].text == done['message']
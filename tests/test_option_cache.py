@@ -0,0 +1,78 @@
+import asyncio
+import importlib
+
+from tortoise import connections
+
+from schemas.conf import OptionCacheConfig
+from services import OptionService
+from utils.option_cache import MISSING, OptionCache, option_cache
+
+from .test_base import TestBase
+
+
+class TestOptionCache(TestBase):
+
+    async def test_reads_from_snapshot(self):
+        await self.api('POST', '/api/options', _body={'key': 'currency', 'value': {'code': 'EUR'}})
+
+        loads: int = option_cache.loads
+        for _ in range(3):
+            response = await self.api('GET', '/api/options')
+            assert response.json()['options'] == [{'key': 'currency', 'value': {'code': 'EUR'}}]
+        response = await self.api('GET', '/api/options/currency')
+        assert response.json()['value'] == {'code': 'EUR'}
+
+        assert option_cache.loads == loads + 1
+
+    async def test_changes_invalidate_cache(self):
+        await self.api('POST', '/api/options', _body={'key': 'currency', 'value': {'code': 'EUR'}})
+        assert (await self.api('GET', '/api/options/currency')).json()['value'] == {'code': 'EUR'}
+
+        await self.api('PATCH', '/api/options/currency', _body={'value': {'code': 'USD'}})
+        assert (await self.api('GET', '/api/options/currency')).json()['value'] == {'code': 'USD'}
+
+        await OptionService().delete(key='currency')
+        assert (await self.api('GET', '/api/options/currency')).status_code == 404
+        assert (await self.api('GET', '/api/options')).json()['options'] == []
+
+    async def test_invalidation_reaches_other_workers(self):
+        worker: OptionCache = OptionCache(OptionCacheConfig())
+        await worker.open()
+        try:
+            assert await worker.get('currency') is MISSING
+            await self.api('POST', '/api/options', _body={'key': 'currency', 'value': {'code': 'EUR'}})
+            await asyncio.sleep(0)
+
+            assert await worker.get('currency') == {'code': 'EUR'}
+        finally:
+            await worker.close()
+
+    async def test_refresh_keeps_serving_snapshot(self):
+        await self.api('POST', '/api/options', _body={'key': 'currency', 'value': {'code': 'EUR'}})
+        await option_cache.all()
+
+        await option_cache.refresh()
+
+        assert option_cache.stats()['snapshot']
+        assert await option_cache.get('currency') == {'code': 'EUR'}
+
+    async def test_invalidated_options_are_read_from_primary(self, monkeypatch):
+        replica_reads: list = []
+
+        def read_connection():
+            replica_reads.append(True)
+            return connections.get('default')
+
+        monkeypatch.setattr(importlib.import_module('utils.option_cache'), 'read_connection', read_connection)
+        cache: OptionCache = OptionCache(OptionCacheConfig())
+
+        await cache.get('currency')
+        cache.invalidate('currency')
+        await cache.get('currency')
+        await cache.get('language')
+        assert len(replica_reads) == 2
+
+        cache.invalidate()
+        await cache.all()
+        await cache.refresh()
+        assert len(replica_reads) == 3
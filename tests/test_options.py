@@ -0,0 +1,110 @@
+import json
+
+from models import Option
+from schemas import OptionCreateModel
+from services import OptionService
+from utils.option_cache import option_cache
+
+from .test_base import TestBase
+
+
+class TestOptions(TestBase):
+
+    async def setup(self):
+        await super().setup()
+        for key in ('mail.host', 'mail.port', 'llm.provider', 'llm.timeout', 'currency'):
+            await OptionService().create(OptionCreateModel(key=key, value={'name': key}))
+
+    async def pages(self, **params) -> list:
+        keys: list = []
+        after = None
+        while True:
+            query: str = '&'.join(f'{name}={value}' for name, value in {**params, 'after': after}.items() if value is not None)
+            response = await self.api('GET', f'/api/options?{query}')
+            assert response.status_code == 200
+
+            keys.append([option['key'] for option in response.json()['options']])
+            after = response.json()['next']
+            if after is None:
+                return keys
+
+    async def test_pages_by_key(self):
+        assert await self.pages(limit=2) == [['currency', 'llm.provider'], ['llm.timeout', 'mail.host'], ['mail.port']]
+
+    async def test_pages_without_cache(self):
+        option_cache.conf.enabled = False
+        try:
+            assert await self.pages(limit=2, prefix='mail.') == [['mail.host', 'mail.port']]
+            assert await self.pages(limit=3) == [['currency', 'llm.provider', 'llm.timeout'], ['mail.host', 'mail.port']]
+        finally:
+            option_cache.conf.enabled = True
+
+    async def test_prefix(self):
+        assert await self.pages(limit=1, prefix='llm.') == [['llm.provider'], ['llm.timeout']]
+
+    async def test_pages_by_created(self):
+        pages: list = await self.pages(limit=2, order='created')
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert sorted(key for page in pages for key in page) == ['currency', 'llm.provider', 'llm.timeout', 'mail.host', 'mail.port']
+
+    async def test_invalid_cursor(self):
+        response = await self.api('GET', '/api/options?after=invalid')
+        assert response.status_code == 400
+
+    async def test_without_limit(self):
+        for order in ('key', 'created'):
+            response = await self.api('GET', f'/api/options?order={order}')
+
+            assert len(response.json()['options']) == 5
+            assert response.json()['next'] is None
+
+    async def test_invalid_limit(self):
+        for limit in (0, 1001):
+            response = await self.api('GET', f'/api/options?limit={limit}')
+            assert response.status_code == 400
+
+    async def test_ndjson_export(self):
+        response = await self.api('GET', '/api/options?format=ndjson&prefix=mail.')
+
+        assert response.headers['content-type'].startswith('application/x-ndjson')
+        assert [json.loads(line) for line in response.text.splitlines()] == [
+            {'key': 'mail.host', 'value': {'name': 'mail.host'}},
+            {'key': 'mail.port', 'value': {'name': 'mail.port'}}
+        ]
+
+    async def test_bulk_upsert(self):
+        response = await self.api('POST', '/api/options/bulk', _body={'options': [
+            {'key': 'currency', 'value': {'name': 'currency'}},
+            {'key': 'mail.host', 'value': {'name': 'smtp.example.com'}},
+            {'key': 'language', 'value': {'name': 'en'}}
+        ]})
+
+        assert response.status_code == 200
+        assert response.json()['results'] == {'currency': 'unchanged', 'mail.host': 'updated', 'language': 'created'}
+
+        options = (await self.api('GET', '/api/options?prefix=la')).json()['options']
+        assert options == [{'key': 'language', 'value': {'name': 'en'}}]
+        assert (await self.api('GET', '/api/options/mail.host')).json()['value'] == {'name': 'smtp.example.com'}
+
+    async def test_changes_keep_created(self):
+        before: Option = await Option.get(key='mail.host')
+
+        await self.api('POST', '/api/options/bulk', _body={'options': [{'key': 'mail.host', 'value': {'name': 'smtp.example.com'}}]})
+        await self.api('PATCH', '/api/options/mail.host', _body={'value': {'name': 'mail.example.com'}})
+
+        after: Option = await Option.get(key='mail.host')
+        assert after.value == {'name': 'mail.example.com'}
+        assert after.created == before.created
+        assert after.last_updated > before.last_updated
+
+    async def test_bulk_delete(self):
+        response = await self.api('POST', '/api/options/bulk/delete', _body={'keys': ['mail.host', 'mail.port', 'unknown']})
+
+        assert response.status_code == 200
+        assert response.json()['results'] == {'mail.host': 'deleted', 'mail.port': 'deleted', 'unknown': 'not_found'}
+        assert await self.pages(prefix='mail.') == [[]]
+
+    async def test_bulk_limit(self):
+        response = await self.api('POST', '/api/options/bulk/delete', _body={'keys': [str(key) for key in range(1001)]})
+        assert response.status_code == 422
@@ -0,0 +1,47 @@
+from utils.cache import data_cache
+from utils.partners import PartnerIndex, partner_index
+
+from .assets import partners, transports
+
+
+class TestPartnerIndex:
+
+    def test_partners_context_matches_history(self):
+        index: PartnerIndex = PartnerIndex(partners, transports)
+        context = index.partners_context()
+
+        for partner in partners:
+            expected = [
+                {
+                    'load_city': transport['loadingAddress']['city'],
+                    'load_country': transport['loadingAddress']['country'],
+                    'unload_city': transport['unloadingAddress']['city'],
+                    'unload_country': transport['unloadingAddress']['country'],
+                    'price': transport['price'],
+                    'performance_score': transport['performanceScore']
+                } for transport in transports if transport['supplierId'] == partner['id']
+            ]
+            assert context[partner['id']]['transports'] == expected
+
+    def test_secondary_indexes(self):
+        index: PartnerIndex = PartnerIndex(partners, transports)
+
+        assert list(index.rows_by('load_city', 'bolzano')) == [1, 4]
+        assert list(index.rows_by('unload_country', 'Germany')) == [0, 1, 4, 5]
+        assert list(index.route_rows('Innsbruck', 'Munich')) == [0]
+        assert len(index.route_rows('Munich', 'Bolzano')) == 0
+        assert len(index.supplier_rows(99)) == 0
+
+    async def test_rebuilds_only_when_data_changes(self):
+        data_cache.set('/Supplier/GetAllSuppliers', partners, 1)
+        data_cache.set('/Transport/GetTransportHistory', transports, 1)
+
+        first: PartnerIndex = await partner_index.get()
+        assert await partner_index.get() is first
+
+        data_cache.set('/Transport/GetTransportHistory', transports[:2], 1)
+        second: PartnerIndex = await partner_index.get()
+        data_cache.invalidate()
+
+        assert second is not first
+        assert len(second) == 2
@@ -0,0 +1,43 @@
+from schemas.conf import PricingConfig
+from utils.partners import PartnerIndex
+from utils.pricing import LaneStatistics
+
+from .assets import partners, transports
+
+
+class TestLaneStatistics:
+
+    def test_lane_statistics(self):
+        lanes: LaneStatistics = LaneStatistics(PartnerIndex(partners, transports), PricingConfig(min_samples=2))
+
+        statistics = lanes.lookup('Bolzano', 'Italy', 'Munich', 'Germany')
+        assert statistics['level'] == 'lane'
+        assert statistics['count'] == 2
+        assert statistics['mean'] == 1050.0
+        assert statistics['median'] == 1050.0
+        assert statistics['weighted'] == round((1100 * 9 + 1000 * 8.5) / 17.5, 2)
+
+    def test_falls_back_to_country_pair_and_global(self):
+        lanes: LaneStatistics = LaneStatistics(PartnerIndex(partners, transports), PricingConfig(min_samples=2))
+
+        assert lanes.lookup('Verona', 'Italy', 'Munich', 'Germany')['level'] == 'country'
+        assert lanes.lookup('Verona', 'Italy', 'Munich', 'Germany')['count'] == 3
+        assert lanes.lookup('Munich', 'Germany', 'Innsbruck', 'Austria')['level'] == 'global'
+
+    def test_prices_and_query(self):
+        lanes: LaneStatistics = LaneStatistics(PartnerIndex(partners, transports), PricingConfig(min_samples=2))
+
+        prices = lanes.prices(500.0, 'Bolzano', 'Italy', 'Munich', 'Germany')
+        assert prices['minimal_price'] == 1010.0
+        assert prices['target_price'] == 1010.0
+
+        rows = lanes.query(unload_country='germany')
+        assert [(row['load_city'], row['count']) for row in rows] == [('Bolzano', 2), ('Innsbruck', 1), ('Verona', 1)]
+
+    def test_missing_prices_are_ignored(self):
+        history: list = transports + [{**transports[1], 'price': None}, {**transports[1], 'price': None}]
+        lanes: LaneStatistics = LaneStatistics(PartnerIndex(partners, history), PricingConfig(min_samples=2))
+
+        statistics = lanes.lookup('Bolzano', 'Italy', 'Munich', 'Germany')
+        assert statistics['count'] == 2
+        assert lanes.prices(500.0, 'Bolzano', 'Italy', 'Munich', 'Germany')['minimal_price'] == 1010.0
@@ -0,0 +1,60 @@
+from schemas.conf import PromptConfig
+from utils.partners import PartnerIndex
+from utils.prompts import PromptBuilder
+from utils.ranking import ranker
+
+from .assets import conversation_context, partners, transports
+
+
+class TestPromptBuilder:
+
+    def dispatch(self, builder: PromptBuilder) -> str:
+        index: PartnerIndex = PartnerIndex(partners, transports)
+        order = {
+            'load_city': 'Bolzano',
+            'load_country': 'Italy',
+            'unload_city': 'Munich',
+            'unload_country': 'Germany'
+        }
+
+        return builder.dispatch(
+            index=index,
+            candidates=ranker.rank(index=index, **order),
+            target_price=1200.0,
+            **order
+        )
+
+    def test_tabular_encoding(self):
+        builder: PromptBuilder = PromptBuilder(PromptConfig(token_budget=10000))
+        prompt: str = self.dispatch(builder)
+
+        assert '0=Bolzano, Italy;1=Innsbruck, Austria;2=Munich, Germany' in prompt
+        assert '2|Trasporti Rossi|0|Italian|' in prompt
+        assert '\n2|0|2|1100|9\n' in prompt
+        assert 'omitted' not in prompt
+        assert builder.stats()['dispatch']['last_tokens'] == builder.estimate_tokens(prompt)
+
+    def test_token_budget(self):
+        full: PromptBuilder = PromptBuilder(PromptConfig(token_budget=10000))
+        tokens: int = full.estimate_tokens(self.dispatch(full))
+
+        builder: PromptBuilder = PromptBuilder(PromptConfig(token_budget=tokens - 10))
+        prompt: str = self.dispatch(builder)
+
+        assert builder.estimate_tokens(prompt) <= builder.conf.token_budget
+        assert 'less relevant rows omitted' in prompt
+        assert '2|Trasporti Rossi' in prompt
+        assert builder.stats()['dispatch']['omitted_rows'] > 0
+
+    def test_negotiation_budget(self):
+        builder: PromptBuilder = PromptBuilder()
+        history = [('partner' if i % 2 else 'dispatcher', f'Message {i} ' + 'x' * 400) for i in range(10)]
+
+        prompt: str = builder.negotiation(conversation_context, history, summary='Partner asked for 1.400 Euro.', budget=600)
+
+        assert builder.estimate_tokens(prompt) <= 600
+        assert 'Summary of the earlier conversation: Partner asked for 1.400 Euro.' in prompt
+        assert 'Message 0 ' not in prompt
+        assert 'Partner: Message 9 ' in prompt
+        assert 'not lower than 1414 Euros' in prompt
+        assert builder.stats()['negotiation']['omitted_rows'] > 0
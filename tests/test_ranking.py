@@ -0,0 +1,84 @@
+from schemas.conf import RankingConfig
+from utils.cache import data_cache
+from utils.partners import PartnerIndex
+from utils.ranking import PartnerRanker
+
+from .assets import partners, transports
+from .test_base import TestBase
+
+
+class TestPartnerRanker:
+
+    def rank(self, **kwargs):
+        return PartnerRanker(RankingConfig(**kwargs)).rank(
+            index=PartnerIndex(partners, transports),
+            load_city='Bolzano',
+            load_country='Italy',
+            unload_city='Munich',
+            unload_country='Germany'
+        )
+
+    def test_prefers_local_partner_with_lane_history(self):
+        candidates = self.rank()
+
+        assert [candidate['id'] for candidate in candidates] == [2, 1, 3]
+        assert candidates[0]['route_transports'] == 2
+        assert candidates[0]['lane_average_price'] == 1050.0
+
+    def test_top_k_and_weights_are_configurable(self):
+        weights = {'same_city': 0, 'same_country': 0, 'lane': 0, 'price': 1, 'performance': 0}
+        candidates = self.rank(top_k=1, weights=weights)
+
+        assert len(candidates) == 1
+        assert candidates[0]['id'] == 1
+
+    def test_missing_prices_are_ignored(self):
+        history: list = transports + [{**transports[1], 'price': None}]
+        candidates = PartnerRanker().rank(
+            index=PartnerIndex(partners, history),
+            load_city='Bolzano',
+            load_country='Italy',
+            unload_city='Munich',
+            unload_country='Germany'
+        )
+
+        assert candidates[0]['id'] == 2
+        assert candidates[0]['lane_average_price'] == 1050.0
+        assert candidates[0]['average_price'] == 1050.0
+
+    def test_is_deterministic(self):
+        assert self.rank() == self.rank()
+
+    def test_rank_many_matches_rank(self):
+        index: PartnerIndex = PartnerIndex(partners, transports)
+        orders = [
+            {'load_city': 'Bolzano', 'load_country': 'Italy', 'unload_city': 'Munich', 'unload_country': 'Germany'},
+            {'load_city': 'Munich', 'load_country': 'Germany', 'unload_city': 'Innsbruck', 'unload_country': 'Austria'},
+            {'load_city': 'Paris', 'load_country': 'France', 'unload_city': 'Lyon', 'unload_country': 'France'},
+        ]
+        ranker: PartnerRanker = PartnerRanker()
+
+        assert ranker.rank_many(index, orders) == [ranker.rank(index=index, **order) for order in orders]
+        assert ranker.rank_many(index, []) == []
+
+
+class TestRankingAPI(TestBase):
+
+    async def test_top_k_is_validated(self):
+        data_cache.set('/Supplier/GetAllSuppliers', partners, 60)
+        data_cache.set('/Transport/GetTransportHistory', transports, 60)
+        payload: dict = {
+            'load_address': {'city': 'Bolzano', 'country': 'Italy'},
+            'unload_address': {'city': 'Munich', 'country': 'Germany'},
+            'price': 1200.0
+        }
+
+        ranked = await self.api('POST', '/api/dispatcher/ranking?top_k=1', _body=payload)
+        rejected: list = [
+            await self.api('POST', f'/api/dispatcher/ranking?top_k={top_k}', _body=payload)
+            for top_k in (0, -1)
+        ]
+        data_cache.invalidate()
+
+        assert [candidate['id'] for candidate in ranked.json()] == [2]
+        assert [response.status_code for response in rejected] == [422, 422]
@@ -0,0 +1,154 @@
+import asyncio
+import copy
+
+import httpx
+
+import utils.dispatcher
+from models import City, Supplier, SyncState, Transport
+from schemas.conf import DataSourceConfig, SyncConfig
+from utils.dispatcher import get_partners, get_transport_history
+from utils.http import DataSourceClient
+from utils.partners import partner_index
+from utils.sync import DataSync
+
+from .assets import partners, transports
+from .test_base import TestBase
+
+cities: list = [{'city': 'Bolzano', 'country': 'Italy'}, {'city': 'Munich', 'country': 'Germany'}]
+
+
+class UpstreamAPI:
+
+    def __init__(self):
+        self.data: dict = {
+            '/Supplier/GetAllSuppliers': copy.deepcopy(partners),
+            '/Transport/GetTransportHistory': copy.deepcopy(transports),
+            '/Helper/GetAvailableCities': copy.deepcopy(cities)
+        }
+        self.requests: list = []
+        self.since: list = []
+
+    def etag(self, path: str) -> str:
+        return f'"{hash(repr(self.data[path]))}"'
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path: str = request.url.path
+        self.requests.append(request)
+
+        if 'since' in request.url.params:
+            if path == '/Supplier/GetAllSuppliers':
+                return httpx.Response(400)
+            return httpx.Response(200, json=self.since)
+
+        if request.headers.get('If-None-Match') == self.etag(path):
+            return httpx.Response(304)
+        return httpx.Response(200, json=self.data[path], headers={'ETag': self.etag(path)})
+
+    def client(self) -> DataSourceClient:
+        conf: DataSourceConfig = DataSourceConfig(base_url='https://source', http2=False, retries=0, backoff=0)
+        return DataSourceClient(conf=conf, transport=httpx.MockTransport(self.handler))
+
+
+class TestDataSync(TestBase):
+
+    async def data_sync(self, upstream: UpstreamAPI, **conf) -> DataSync:
+        sync: DataSync = DataSync(SyncConfig(interval=0, **conf), source=upstream.client())
+        await sync.open()
+        return sync
+
+    async def test_full_sync(self):
+        upstream: UpstreamAPI = UpstreamAPI()
+        sync: DataSync = await self.data_sync(upstream)
+        await sync.sync_all()
+        stats: dict = sync.stats()['sources']['transports']
+        await sync.close()
+
+        assert await Supplier.all().count() == len(partners)
+        assert await Transport.filter(load_city='Bolzano', unload_city='Munich').count() == 2
+        assert await City.all().count() == len(cities)
+
+        assert stats['rows_transferred'] == len(transports)
+        assert stats['lag'] is not None
+
+    async def test_conditional_requests(self):
+        upstream: UpstreamAPI = UpstreamAPI()
+        sync: DataSync = await self.data_sync(upstream)
+        await sync.sync_all()
+        records: list = sync.records('/Supplier/GetAllSuppliers')
+
+        assert await sync.sync('suppliers') == 0
+        assert upstream.requests[-1].headers['If-None-Match'] == upstream.etag('/Supplier/GetAllSuppliers')
+        assert sync.records('/Supplier/GetAllSuppliers') is records
+
+        upstream.data['/Supplier/GetAllSuppliers'] = upstream.data['/Supplier/GetAllSuppliers'][:2]
+        assert await sync.sync('suppliers') == 2
+        await sync.close()
+
+        assert await Supplier.all().count() == 2
+        assert sync.stats()['sources']['suppliers']['rows_deleted'] == 1
+        assert sync.stats()['sources']['suppliers']['not_modified'] == 1
+
+    async def test_since_watermark(self):
+        upstream: UpstreamAPI = UpstreamAPI()
+        sync: DataSync = await self.data_sync(upstream, mode='since')
+        await sync.sync_all()
+
+        upstream.since = [{**transports[0], 'price': 950.0, 'id': 'new'}]
+        assert await sync.sync('transports') == 1
+        assert 'since' in upstream.requests[-1].url.params
+        assert await Transport.all().count() == len(transports) + 1
+
+        assert await sync.sync('suppliers') == len(partners)
+        assert sync.stats()['fallbacks'] == 1
+
+        state: SyncState = await SyncState.get(source='transports')
+        assert state.rows == len(transports) + 1
+        await sync.close()
+
+    async def test_deltas_are_merged_in_memory(self):
+        upstream: UpstreamAPI = UpstreamAPI()
+        sync: DataSync = await self.data_sync(upstream, mode='since')
+        other: DataSync = await self.data_sync(upstream, mode='since')
+        await sync.sync_all()
+        await other.reload('transports')
+        reloads: int = sync.stats()['reloads']
+
+        upstream.since = [{**transports[0], 'id': 'new'}]
+        assert await sync.sync('transports') == 1
+        changed: dict = {**transports[0], 'id': 'new', 'price': 950.0}
+        upstream.since = [changed]
+        assert await sync.sync('transports') == 1
+        await asyncio.sleep(0.05)
+
+        for worker in (sync, other):
+            records: list = worker.records('/Transport/GetTransportHistory')
+            assert len(records) == len(transports) + 1
+            assert changed in records
+            assert worker.stats()['deltas'] == 2
+
+        await sync.reload('transports')
+        assert sync.records('/Transport/GetTransportHistory') == other.records('/Transport/GetTransportHistory')
+        assert sync.stats()['reloads'] == reloads + 1
+        await sync.close()
+        await other.close()
+
+    async def test_dispatcher_reads_local_store(self):
+        upstream: UpstreamAPI = UpstreamAPI()
+        sync: DataSync = await self.data_sync(upstream)
+        await sync.sync_all()
+        await sync.close()
+
+        restarted: DataSync = await self.data_sync(UpstreamAPI())
+        assert restarted.ready('/Transport/GetTransportHistory')
+        assert len(restarted.records('/Transport/GetTransportHistory')) == len(transports)
+        await restarted.close()
+
+    async def test_get_partners(self, monkeypatch):
+        sync: DataSync = await self.data_sync(UpstreamAPI())
+        await sync.sync_all()
+        monkeypatch.setattr(utils.dispatcher, 'data_sync', sync)
+
+        assert await get_partners() == partners
+        assert len(await get_transport_history()) == len(transports)
+        assert len((await partner_index.get()).suppliers) == len(partners)
+        await sync.close()
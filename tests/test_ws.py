@@ -1,8 +1,16 @@
+import asyncio
+import json
+
 import pytest
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.testclient import TestClient
 
 from config.application import manager, service as app
+from schemas.conf import WebSocketConfig
+from utils.events import EventBus
+from utils.websocket import ConnectionManager
+
+from .assets import FakeWebSocket
 
 
 client = TestClient(app)
@@ -15,3 +23,144 @@ def test_websocket():
 
         response = websocket.receive_text()
         assert response == "Client #123 says: Hello, WebSocket!"
+
+
+class TestConnectionManager:
+
+    async def test_slow_client_does_not_block_others(self):
+        manager: ConnectionManager = ConnectionManager(WebSocketConfig(queue_size=10))
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+        await manager.connect(fast)
+        await manager.connect(slow)
+
+        for message in range(5):
+            await manager.broadcast(str(message))
+        await asyncio.sleep(0.01)
+
+        assert fast.received == ['0', '1', '2', '3', '4']
+        assert slow.received == []
+        assert manager.stats()['max_queue_depth'] == 4
+
+        manager.disconnect(fast)
+        manager.disconnect(slow)
+        await asyncio.sleep(0.01)
+        assert manager.stats()['connections'] == 0
+
+    async def test_drop_oldest_policy(self):
+        manager: ConnectionManager = ConnectionManager(WebSocketConfig(queue_size=2))
+        slow = FakeWebSocket(delay=10)
+        await manager.connect(slow)
+
+        for message in range(5):
+            await manager.broadcast(str(message))
+
+        assert list(manager.active_connections[slow].queue._queue) == ['3', '4']
+        assert manager.stats()['dropped'] == 3
+
+        manager.disconnect(slow)
+        await asyncio.sleep(0.01)
+
+    async def test_disconnect_policy(self):
+        manager: ConnectionManager = ConnectionManager(WebSocketConfig(queue_size=1, slow_consumer_policy='disconnect'))
+        slow = FakeWebSocket(delay=10)
+        await manager.connect(slow)
+
+        for message in range(3):
+            await manager.broadcast(str(message))
+        await asyncio.sleep(0.01)
+
+        assert slow.closed == 1013
+        assert manager.stats()['connections'] == 0
+        assert manager.stats()['slow_disconnects'] == 1
+        await asyncio.sleep(0.01)
+
+    async def test_send_timeout(self):
+        manager: ConnectionManager = ConnectionManager(WebSocketConfig(send_timeout=0.01))
+        stalled = FakeWebSocket(delay=10)
+        await manager.connect(stalled)
+
+        await manager.send_personal_message('hello', stalled)
+        await asyncio.sleep(0.05)
+
+        assert stalled.closed == 1013
+        assert manager.stats()['connections'] == 0
+
+    async def test_broadcast_through_event_bus(self):
+        bus: EventBus = EventBus()
+        await bus.open()
+        workers = [ConnectionManager(WebSocketConfig(batch_bytes=40), bus=bus) for _ in range(2)]
+        clients = [FakeWebSocket(), FakeWebSocket()]
+        for worker, client in zip(workers, clients):
+            await worker.open()
+            await worker.connect(client)
+
+        for message in ('first', 'second', 'third'):
+            await workers[0].broadcast(message)
+        await asyncio.sleep(0.05)
+
+        assert clients[0].received == clients[1].received == ['first', 'second', 'third']
+        assert workers[0].stats()['published_batches'] == 2
+        assert workers[1].stats()['received_batches'] == 2
+
+        for worker, client in zip(workers, clients):
+            worker.disconnect(client)
+            await worker.close()
+        await asyncio.sleep(0.01)
+
+    async def test_broadcasts_during_publish_are_not_lost(self):
+        bus: EventBus = EventBus()
+        await bus.open()
+        publish = bus.publish
+
+        async def slow_publish(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            await publish(*args, **kwargs)
+
+        bus.publish = slow_publish
+        sender, receiver = ConnectionManager(bus=bus), ConnectionManager(bus=bus)
+        client: FakeWebSocket = FakeWebSocket()
+        await sender.open()
+        await receiver.open()
+        await receiver.connect(client)
+
+        await sender.broadcast('first')
+        await asyncio.sleep(0.03)
+        await sender.broadcast('second')
+        await sender.close()
+        await asyncio.sleep(0.01)
+
+        assert client.received == ['first', 'second']
+        assert sender.stats()['published_messages'] == 2
+
+        receiver.disconnect(client)
+        await receiver.close()
+        await asyncio.sleep(0.01)
+
+    async def test_topics(self):
+        manager: ConnectionManager = ConnectionManager()
+        subscriber, other = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(subscriber)
+        await manager.connect(other)
+
+        assert await manager.control(subscriber, json.dumps({'action': 'subscribe', 'topic': 'conversation-1'}))
+        assert not await manager.control(subscriber, 'Hello')
+        await manager.publish('conversation-1', 'offer accepted')
+        await manager.publish('conversation-2', 'offer rejected')
+        await asyncio.sleep(0.01)
+
+        assert subscriber.received == ['{"action": "subscribed", "topic": "conversation-1"}', 'offer accepted']
+        assert other.received == []
+        assert manager.stats()['subscriptions'] == 1
+
+        await manager.control(subscriber, json.dumps({'action': 'unsubscribe', 'topic': 'conversation-1'}))
+        await manager.publish('conversation-1', 'too late')
+        await asyncio.sleep(0.01)
+
+        assert subscriber.received[-1] == '{"action": "unsubscribed", "topic": "conversation-1"}'
+        assert manager.stats()['topics'] == 0
+
+        manager.subscribe(other, 'conversation-1')
+        manager.disconnect(other)
+        manager.disconnect(subscriber)
+        assert manager.topics == {}
+        await asyncio.sleep(0.01)